@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+"""
+Benchmark do Script de Atualização de Versão
+Cria repositórios sintéticos locais (remotos bare via file://) e mede a latência
+e a quantidade de processos git de cada etapa do version_updater
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import version_updater as vu
+
+# Versões antigas do version_updater não têm alvos (Target), métricas de processos
+# (METRICS) nem relatório de ciclo (CycleReport): nesse caso o benchmark usa as
+# configurações globais do módulo e conta os processos pelo próprio subprocess
+HAS_TARGETS = hasattr(vu, "Target")  # Funções recebem o alvo como argumento
+HAS_METRICS = hasattr(vu, "METRICS")  # Contagem de processos pelas métricas do updater
+HAS_CYCLE_REPORT = hasattr(vu, "CycleReport")  # run_check recebe um CycleReport
+
+BENCH_ENV = {
+    "GIT_AUTHOR_NAME": "Benchmark", "GIT_AUTHOR_EMAIL": "benchmark@example.com",
+    "GIT_COMMITTER_NAME": "Benchmark", "GIT_COMMITTER_EMAIL": "benchmark@example.com",
+}
+BENCH_EPOCH = 1700000000  # Data do primeiro commit sintético
+VERSION_FILE = "hype_maps"
+MANIFEST_REL_PATH = os.path.join("resources", "[hype-maps]", "hype_maps_updater", "fxmanifest.lua")
+
+def git(args, cwd, stdin=None):
+    """Executa git com uma lista de argumentos (sem shell) e retorna o stdout"""
+    result = subprocess.run(["git"] + args, cwd=cwd, input=stdin, capture_output=True,
+                            env=dict(os.environ, **BENCH_ENV), check=True)
+    return result.stdout.decode("utf-8", "replace").strip()
+
+def fast_import_commits(repo, branch, start, count, tree_files, file_size, rng, initial_tree=False):
+    """Grava `count` commits em `branch` via git fast-import; cada commit altera um arquivo do mapa"""
+    stream = io.BytesIO()
+    for i in range(start, start + count):
+        message = f"Commit sintético {i}".encode("utf-8")
+        stream.write(f"commit refs/heads/{branch}\n".encode())
+        stream.write(f"committer Benchmark <benchmark@example.com> {BENCH_EPOCH + i * 60} +0000\n".encode())
+        stream.write(b"data %d\n%s\n" % (len(message), message))
+        if i == start and not initial_tree:
+            stream.write(f"from refs/heads/{branch}^0\n".encode())
+        paths = range(tree_files) if initial_tree and i == start else [i % tree_files]
+        for index in paths:
+            content = rng.getrandbits(8 * file_size).to_bytes(file_size, "little")
+            stream.write(f"M 100644 inline maps/arquivo_{index:05d}.bin\n".encode())
+            stream.write(b"data %d\n%s\n" % (len(content), content))
+    git(["fast-import", "--quiet"], repo, stdin=stream.getvalue())
+
+class SpawnCounter:
+    """Substitui o módulo subprocess do version_updater contando os processos criados"""
+
+    def __init__(self, module):
+        self._module = module
+        self.count = 0
+
+    def __getattr__(self, name):
+        return getattr(self._module, name)
+
+    def _counted(self, func, *args, **kwargs):
+        self.count += 1
+        return func(*args, **kwargs)
+
+    def run(self, *args, **kwargs):
+        return self._counted(self._module.run, *args, **kwargs)
+
+    def Popen(self, *args, **kwargs):
+        return self._counted(self._module.Popen, *args, **kwargs)
+
+    def check_output(self, *args, **kwargs):
+        return self._counted(self._module.check_output, *args, **kwargs)
+
+    def call(self, *args, **kwargs):
+        return self._counted(self._module.call, *args, **kwargs)
+
+SPAWN_COUNTER = None if HAS_METRICS else SpawnCounter(subprocess)  # Contador usado sem METRICS
+
+def build_sandbox(workdir, args):
+    """Cria os repositórios sintéticos e retorna o alvo configurado para eles"""
+    rng = random.Random(args.seed)
+    maps_origin = os.path.join(workdir, "maps_origin.git")
+    git(["init", "-q", "--bare", maps_origin], workdir)
+    fast_import_commits(maps_origin, "development", 0, args.history, args.tree_files, args.file_size, rng,
+                        initial_tree=True)
+    merged = args.history - args.divergence
+    git(["update-ref", "refs/heads/main", f"refs/heads/development~{args.divergence}"], maps_origin)
+    git(["symbolic-ref", "HEAD", "refs/heads/main"], maps_origin)
+    maps = os.path.join(workdir, "maps")
+    git(["clone", "-q", "--no-tags", f"file://{maps_origin}", maps], workdir)
+    git(["branch", "-q", "--track", "development", "origin/development"], maps)
+
+    # Repositório dos recursos: fxmanifest.lua principal + manifests extras para o modo em massa
+    studio_origin = os.path.join(workdir, "studio_origin.git")
+    studio = os.path.join(workdir, "studio")
+    git(["init", "-q", "--bare", studio_origin], workdir)
+    git(["init", "-q", studio], workdir)
+    manifest = "fx_version 'cerulean'\ngame 'gta5'\nversion 'HYPE-01.01-00.00-AAAAAAA'\n"
+    for index in range(args.manifests):
+        rel_path = MANIFEST_REL_PATH if index == 0 else os.path.join("resources", f"recurso_{index:04d}", "fxmanifest.lua")
+        os.makedirs(os.path.dirname(os.path.join(studio, rel_path)), exist_ok=True)
+        with open(os.path.join(studio, rel_path), "w", encoding="utf-8") as f:
+            f.write(manifest)
+    git(["checkout", "-q", "-b", "main"], studio)
+    git(["add", "."], studio)
+    git(["commit", "-q", "-m", "Recursos iniciais"], studio)
+    git(["remote", "add", "origin", f"file://{studio_origin}"], studio)
+    git(["push", "-q", "-u", "origin", "main"], studio)
+
+    versions_origin = os.path.join(workdir, "versions_origin.git")
+    versions = os.path.join(workdir, "versions")
+    git(["init", "-q", "--bare", versions_origin], workdir)
+    git(["init", "-q", versions], workdir)
+    with open(os.path.join(versions, VERSION_FILE), "w", encoding="utf-8") as f:
+        f.write("HYPE-01.01-00.00-AAAAAAA")
+    git(["checkout", "-q", "-b", "main"], versions)
+    git(["add", "."], versions)
+    git(["commit", "-q", "-m", "Versão inicial"], versions)
+    git(["remote", "add", "origin", f"file://{versions_origin}"], versions)
+    git(["push", "-q", "-u", "origin", "main"], versions)
+
+    print(f"Repositórios criados em {workdir}: {args.history} commits ({merged} na main), "
+          f"{args.tree_files} arquivos de {args.file_size} bytes, {args.manifests} fxmanifest.lua")
+    if HAS_TARGETS:
+        target = vu.Target("benchmark", maps, VERSION_FILE, os.path.join(studio, MANIFEST_REL_PATH),
+                           versions_repo=versions,
+                           fxmanifest_root=os.path.join(studio, "resources") if args.manifests > 1 else None)
+    else:
+        # Versão sem alvos: o updater lê as configurações globais (e o cwd para o arquivo de versão)
+        if args.manifests > 1:
+            print("Aviso: Esta versão do version_updater não tem modo em massa; --manifests ignorado")
+        vu.REPO_PATH = maps
+        vu.VERSION_FILE = VERSION_FILE
+        vu.FXMANIFEST_PATH = os.path.join(studio, MANIFEST_REL_PATH)
+        target = None
+    return {
+        "maps_origin": maps_origin, "maps": maps, "studio": studio, "versions": versions,
+        "versions_origin": versions_origin, "rng": rng, "next_commit": args.history, "target": target,
+    }
+
+def configure_updater(workdir):
+    """Aponta os arquivos de estado do version_updater para a pasta do benchmark"""
+    vu.STATE_CACHE_FILE = os.path.join(workdir, "state.json")
+    vu.MANIFEST_INDEX_FILE = os.path.join(workdir, "manifests.json")
+    vu.HISTORY_FILE = os.path.join(workdir, "history.jsonl")
+    vu.METRICS_ENABLED = False
+    vu.PUSH_QUEUE_ENABLED = False  # O push entra na latência medida
+    vu._state_cache = None
+    vu._manifest_index = None
+    reset_version_history()
+    if SPAWN_COUNTER is not None:
+        vu.subprocess = SPAWN_COUNTER
+
+def reset_version_history():
+    """Começa um histórico de versões vazio (cada cenário parte do mesmo estado)"""
+    if os.path.exists(vu.HISTORY_FILE):
+        os.remove(vu.HISTORY_FILE)
+    vu._version_history = None
+
+def spawn_total():
+    """Total de processos git criados pelo version_updater até agora"""
+    if SPAWN_COUNTER is not None:
+        return SPAWN_COUNTER.count
+    with vu.METRICS._lock:
+        return sum(vu.METRICS.spawns.values())
+
+def call(func, sandbox, *args):
+    """Chama uma função do version_updater, passando o alvo quando a versão tem alvos"""
+    if HAS_TARGETS:
+        args += (sandbox["target"],)
+    return func(*args)
+
+def measure(func, verbose=False):
+    """Executa func e retorna (segundos, processos git, resultado)"""
+    spawns = spawn_total()
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    with output:
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+    return elapsed, spawn_total() - spawns, result
+
+def push_dev_commit(sandbox, args):
+    """Simula um novo commit enviado para development no remoto"""
+    fast_import_commits(sandbox["maps_origin"], "development", sandbox["next_commit"], 1,
+                        args.tree_files, args.file_size, sandbox["rng"])
+    sandbox["next_commit"] += 1
+
+def merge_to_main(sandbox, args):
+    """Simula o merge de development na main no remoto (novo commit + fast-forward da main)"""
+    push_dev_commit(sandbox, args)
+    git(["update-ref", "refs/heads/main", "refs/heads/development"], sandbox["maps_origin"])
+
+def merge_old_branch(sandbox, args):
+    """Simula um merge --no-ff em development de um branch com commits mais antigos que a janela"""
+    origin = sandbox["maps_origin"]
+    base = git(["rev-parse", f"refs/heads/development~{args.divergence + 2}"], origin)
+    old_time = int(git(["log", "-1", "--format=%ct", base], origin))
+    stream = io.BytesIO()
+    for i in range(3):
+        message = f"Commit antigo {sandbox['next_commit']}.{i}".encode("utf-8")
+        stream.write(b"commit refs/heads/feature\n")
+        stream.write(f"committer Benchmark <benchmark@example.com> {old_time + i + 1} +0000\n".encode())
+        stream.write(b"data %d\n%s\n" % (len(message), message))
+        if i == 0:
+            stream.write(f"from {base}\n".encode())
+    message = b"Merge do branch antigo"
+    stream.write(b"commit refs/heads/development\n")
+    stream.write(f"committer Benchmark <benchmark@example.com> {BENCH_EPOCH + sandbox['next_commit'] * 60} +0000\n".encode())
+    stream.write(b"data %d\n%s\n" % (len(message), message))
+    stream.write(b"from refs/heads/development^0\nmerge refs/heads/feature\n")
+    git(["fast-import", "--quiet"], origin, stdin=stream.getvalue())
+    git(["update-ref", "-d", "refs/heads/feature"], origin)
+    sandbox["next_commit"] += 1
+
+def check_incremental_window(sandbox):
+    """Confere a janela incremental de development contra a consulta completa; retorna o erro ou None"""
+    target = sandbox["target"]
+    with contextlib.redirect_stdout(io.StringIO()):
+        incremental = vu.find_dev_commits_missing_from_main(target=target)
+        snapshot = vu.get_ref_snapshot(target)
+        full = vu._query_dev_commits_missing(target, vu.DEV_COMMITS_WINDOW, snapshot.dev_ref, snapshot.main_ref)
+    if list(incremental) != list(full):
+        return (f"janela incremental diverge da consulta completa: {len(incremental[1] or [])} "
+                f"faltando (incremental) vs {len(full[1] or [])} (completa)")
+    return None
+
+def advance_versions_origin(sandbox):
+    """Outro host envia um commit para o repositório de versões (o próximo push será rejeitado)"""
+    origin = sandbox["versions_origin"]
+    commit = git(["commit-tree", "main^{tree}", "-p", "main", "-m", "Commit de outro host"], origin)
+    git(["update-ref", "refs/heads/main", commit], origin)
+
+def resync_versions(sandbox):
+    """Descarta commits locais rejeitados e volta a acompanhar o remoto de versões"""
+    git(["fetch", "-q", "origin"], sandbox["versions"])
+    git(["reset", "-q", "--hard", "origin/main"], sandbox["versions"])
+
+def run_scenarios(sandbox, args):
+    """Executa todos os cenários e retorna {cenário: [(segundos, processos), ...]}"""
+    results = {}
+    errors = []
+    counter = [0]
+
+    def next_version():
+        counter[0] += 1
+        return f"HYPE-01.01-00.00-B{counter[0]:06d}"
+
+    def scenario(name, func, prepare=None, cleanup=None):
+        reset_version_history()
+        samples = []
+        for _ in range(args.repeat):
+            if prepare:
+                prepare()
+            elapsed, spawns, _ = measure(func, args.verbose)
+            samples.append((elapsed, spawns))
+            if cleanup:
+                cleanup()
+        results[name] = samples
+        print(f"  {name}: {summarize(samples)['mediana_ms']} ms (mediana)")
+
+    def check():
+        if HAS_CYCLE_REPORT:
+            return vu.run_check(vu.CycleReport(), sandbox["target"])
+        return call(vu.run_check, sandbox)
+
+    def commit_version():
+        version = next_version()
+        call(vu.update_version_file, sandbox, version)
+        return call(vu.commit_and_push, sandbox, version)
+
+    def commit_manifest_checkout():
+        version = next_version()
+        call(vu.update_fxmanifest, sandbox, version)
+        return call(vu.commit_fxmanifest_in_repo, sandbox, version)
+
+    def commit_manifest_plumbing():
+        return call(vu.commit_fxmanifest_to_main, sandbox, next_version())
+
+    # Ciclo de aquecimento: fetch inicial, cache de estado e sessões cat-file
+    measure(check, args.verbose)
+
+    print("Executando cenários...")
+    scenario("run_check/sem_mudanca", check)
+    scenario("run_check/novo_commit_development", check, prepare=lambda: push_dev_commit(sandbox, args))
+    scenario("run_check/merge_na_main", check, prepare=lambda: merge_to_main(sandbox, args))
+    scenario("are_last_15_dev_commits_in_main", lambda: call(vu.are_last_15_dev_commits_in_main, sandbox))
+    if hasattr(vu, "find_dev_commits_missing_from_main"):
+        # Regressão: merge de commits antigos muda a janela (ordenada por data) fora da ordem de chegada
+        scenario("are_last_15_dev_commits_in_main/merge_antigo",
+                 lambda: call(vu.are_last_15_dev_commits_in_main, sandbox),
+                 prepare=lambda: merge_old_branch(sandbox, args),
+                 cleanup=lambda: errors.append(check_incremental_window(sandbox)))
+        failures = [error for error in errors if error]
+        if failures:
+            raise SystemExit(f"Erro: {failures[0]}")
+    scenario("commit_and_push", commit_version)
+    scenario("commit_and_push/push_rejeitado", commit_version,
+             prepare=lambda: advance_versions_origin(sandbox), cleanup=lambda: resync_versions(sandbox))
+    if not hasattr(vu, "FXMANIFEST_PLUMBING_COMMIT"):
+        scenario("commit_fxmanifest_in_repo", commit_manifest_checkout)
+        return results
+    saved_plumbing = vu.FXMANIFEST_PLUMBING_COMMIT
+    try:
+        vu.FXMANIFEST_PLUMBING_COMMIT = False
+        scenario("commit_fxmanifest_in_repo", commit_manifest_checkout)
+        vu.FXMANIFEST_PLUMBING_COMMIT = True
+        scenario("commit_fxmanifest_to_main/plumbing", commit_manifest_plumbing)
+    finally:
+        vu.FXMANIFEST_PLUMBING_COMMIT = saved_plumbing
+    return results
+
+def percentile(values, fraction):
+    """Percentil por interpolação linear de uma lista já ordenada"""
+    if len(values) == 1:
+        return values[0]
+    position = (len(values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+def summarize(samples):
+    """Resumo das amostras de um cenário (latências em ms)"""
+    times = sorted(elapsed * 1000 for elapsed, _ in samples)
+    spawns = [count for _, count in samples]
+    return {
+        "amostras": len(samples),
+        "mediana_ms": round(percentile(times, 0.5), 2),
+        "p95_ms": round(percentile(times, 0.95), 2),
+        "min_ms": round(times[0], 2),
+        "max_ms": round(times[-1], 2),
+        "processos_git": round(sum(spawns) / len(spawns), 1),
+    }
+
+def print_report(summary, baseline=None):
+    """Imprime a tabela de resultados (e a variação em relação à linha de base, se houver)"""
+    print()
+    header = f"{'cenário':<40} {'mediana':>10} {'p95':>10} {'máx':>10} {'procs':>7}"
+    if baseline:
+        header += f" {'Δ mediana':>11} {'Δ procs':>8}"
+    print(header)
+    print("-" * len(header))
+    for name, stats in summary.items():
+        line = (f"{name:<40} {stats['mediana_ms']:>8.2f}ms {stats['p95_ms']:>8.2f}ms "
+                f"{stats['max_ms']:>8.2f}ms {stats['processos_git']:>7}")
+        base = (baseline or {}).get(name)
+        if base:
+            delta = (stats["mediana_ms"] - base["mediana_ms"]) / base["mediana_ms"] * 100 if base["mediana_ms"] else 0.0
+            line += f" {delta:>+10.1f}% {stats['processos_git'] - base['processos_git']:>+8.1f}"
+        print(line)
+
+def parse_args(argv=None):
+    """Lê as opções de linha de comando"""
+    parser = argparse.ArgumentParser(description="Benchmark do Script de Atualização de Versão")
+    parser.add_argument("--history", type=int, default=200, help="commits em development")
+    parser.add_argument("--divergence", type=int, default=3, help="commits de development que ainda não estão na main")
+    parser.add_argument("--tree-files", type=int, default=200, help="arquivos na árvore do repositório de mapas")
+    parser.add_argument("--file-size", type=int, default=4096, help="tamanho em bytes de cada arquivo de mapa")
+    parser.add_argument("--manifests", type=int, default=1, help="quantidade de fxmanifest.lua (>1 ativa o modo em massa)")
+    parser.add_argument("--repeat", type=int, default=5, help="repetições de cada cenário")
+    parser.add_argument("--seed", type=int, default=1, help="semente do conteúdo sintético")
+    parser.add_argument("--workdir", help="pasta dos repositórios (padrão: pasta temporária)")
+    parser.add_argument("--keep", action="store_true", help="mantém os repositórios ao terminar")
+    parser.add_argument("--output", help="grava o resultado em JSON (use como --baseline depois)")
+    parser.add_argument("--baseline", help="JSON de uma execução anterior para comparação")
+    parser.add_argument("--verbose", action="store_true", help="mostra a saída do version_updater")
+    args = parser.parse_args(argv)
+    if not 0 < args.divergence < args.history:
+        parser.error("--divergence deve ser maior que 0 e menor que --history")
+    if args.tree_files < 1 or args.manifests < 1 or args.repeat < 1:
+        parser.error("--tree-files, --manifests e --repeat devem ser positivos")
+    return args
+
+def main():
+    """Monta os repositórios, executa os cenários e imprime o relatório"""
+    args = parse_args()
+    workdir = os.path.abspath(args.workdir) if args.workdir else tempfile.mkdtemp(prefix="version_updater_bench_")
+    os.makedirs(workdir, exist_ok=True)
+    previous_dir = os.getcwd()
+    try:
+        configure_updater(workdir)
+        sandbox = build_sandbox(workdir, args)
+        os.chdir(sandbox["versions"])
+        summary = {name: summarize(samples) for name, samples in run_scenarios(sandbox, args).items()}
+    finally:
+        if hasattr(vu, "close_git_sessions"):
+            vu.close_git_sessions()
+        os.chdir(previous_dir)
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["resultados"]
+    print_report(summary, baseline)
+
+    if args.output:
+        config = {key: getattr(args, key) for key in ("history", "divergence", "tree_files", "file_size", "manifests", "repeat", "seed")}
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"configuracao": config, "python": sys.version.split()[0],
+                       "git": git(["--version"], previous_dir), "resultados": summary}, f, indent=2, ensure_ascii=False)
+        print(f"\nResultado gravado em {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,133 @@
 Param(
     [string]$VersionRepoPath = "D:\GitHub\versions",
-    [string]$FxManifestPath = "D:\GitHub\HypeMapas2025\[hype-maps]\hype_maps_updater\fxmanifest.lua"
+    [string]$FxManifestPath = "D:\GitHub\HypeMapas2025\[hype-maps]\hype_maps_updater\fxmanifest.lua",
+    [string]$TargetName = "hype_maps",
+    [int]$LeaseWaitSeconds = 120,
+    [int]$LeaseTtlSeconds = 60
 )
 
 $ErrorActionPreference = "Stop"
 
+# Lease compartilhado com o version_updater.py (mesmos arquivos no .git do repositório de versões):
+# só uma instância por vez atualiza e faz push do alvo; as demais esperam e reaproveitam a versão
+$leaseDir = Join-Path $VersionRepoPath ".git"
+$safeName = $TargetName -replace '[^A-Za-z0-9_.-]', '_'
+$lockPath = Join-Path $leaseDir "version_updater-$safeName.lock"
+$leasePath = Join-Path $leaseDir "version_updater-$safeName.lease"
+$ownerId = "${env:COMPUTERNAME}:${PID}:ps1"
+$leaseHeld = $false
+$publishedVersion = $null
+
+function Get-UnixTime {
+    return [DateTimeOffset]::UtcNow.ToUnixTimeMilliseconds() / 1000.0
+}
+
+function Invoke-LeaseLocked([scriptblock]$Action) {
+    # Abre o arquivo de lock sem compartilhamento: o version_updater.py não consegue o lock enquanto isso
+    $deadline = (Get-Date).AddSeconds(10)
+    while ($true) {
+        try {
+            $lock = [System.IO.File]::Open($lockPath, [System.IO.FileMode]::OpenOrCreate, [System.IO.FileAccess]::ReadWrite, [System.IO.FileShare]::None)
+            break
+        }
+        catch [System.IO.IOException] {
+            if ((Get-Date) -gt $deadline) {
+                throw "Lock $lockPath ocupado há mais de 10s"
+            }
+            Start-Sleep -Milliseconds 50
+        }
+    }
+    try {
+        return & $Action
+    }
+    finally {
+        $lock.Dispose()
+    }
+}
+
+function Read-Lease {
+    if (-not [System.IO.File]::Exists($leasePath)) {
+        return [pscustomobject]@{}
+    }
+    try {
+        return ([System.IO.File]::ReadAllText($leasePath) | ConvertFrom-Json)
+    }
+    catch {
+        return [pscustomobject]@{}
+    }
+}
+
+function Write-Lease($Lease) {
+    $utf8NoBom = New-Object System.Text.UTF8Encoding($false)
+    [System.IO.File]::WriteAllText($leasePath, ($Lease | ConvertTo-Json -Depth 5), $utf8NoBom)
+}
+
+function Set-LeaseField($Lease, [string]$Name, $Value) {
+    $Lease | Add-Member -NotePropertyName $Name -NotePropertyValue $Value -Force
+}
+
+function Enter-Lease {
+    # Retorna $null se o lease foi assumido, ou o dono atual se outra instância está ativa
+    return Invoke-LeaseLocked {
+        $lease = Read-Lease
+        $now = Get-UnixTime
+        $age = $now - [double]$lease.heartbeat_at
+        if ($lease.owner -and $lease.owner -ne $ownerId -and $age -le $LeaseTtlSeconds) {
+            return $lease.owner
+        }
+        if ($lease.owner -and $lease.owner -ne $ownerId) {
+            Write-Host "Lease de $TargetName abandonado por $($lease.owner) (sem heartbeat há $([int]$age)s) - reassumindo"
+        }
+        Set-LeaseField $lease "owner" $ownerId
+        Set-LeaseField $lease "host" $env:COMPUTERNAME
+        Set-LeaseField $lease "pid" $PID
+        Set-LeaseField $lease "acquired_at" $now
+        Set-LeaseField $lease "heartbeat_at" $now
+        Write-Lease $lease
+        return $null
+    }
+}
+
+function Update-Lease([string]$Version, [switch]$Release) {
+    # Renova o heartbeat (e grava a versão publicada); com -Release, libera o lease
+    Invoke-LeaseLocked {
+        $lease = Read-Lease
+        if ($lease.owner -ne $ownerId) {
+            return
+        }
+        if ($Version) {
+            if ($null -eq $lease.results) {
+                Set-LeaseField $lease "results" ([pscustomobject]@{})
+            }
+            Set-LeaseField $lease.results "hype_maps" ([pscustomobject]@{ version = $Version; commit = $null; published_at = (Get-UnixTime) })
+        }
+        Set-LeaseField $lease "heartbeat_at" (Get-UnixTime)
+        if ($Release) {
+            Set-LeaseField $lease "owner" $null
+        }
+        Write-Lease $lease
+    } | Out-Null
+}
+
+if (Test-Path -LiteralPath $leaseDir -PathType Container) {
+    $waitDeadline = (Get-Date).AddSeconds($LeaseWaitSeconds)
+    while ($true) {
+        $holder = Enter-Lease
+        if ($null -eq $holder) {
+            $leaseHeld = $true
+            break
+        }
+        if ((Get-Date) -gt $waitDeadline) {
+            $currentVersionPath = Join-Path $VersionRepoPath "hype_maps"
+            $currentVersion = if (Test-Path -LiteralPath $currentVersionPath) { [System.IO.File]::ReadAllText($currentVersionPath).Trim() } else { "?" }
+            Write-Host "$TargetName está sendo atualizado por $holder; reaproveitando a versão atual: $currentVersion"
+            exit 0
+        }
+        Write-Host "$TargetName está sendo atualizado por $holder; aguardando..."
+        Start-Sleep -Seconds 5
+    }
+}
+
 try {
     $timestamp = Get-Date -Format "vyyyy.MM.dd-HHmmss"
     Write-Host "Nova versão gerada: $timestamp"
@@ -23,10 +146,14 @@ try {
             git add "hype_maps"
             git commit -m "Update version to $timestamp"
             git push
+            $publishedVersion = $timestamp
         }
         finally {
             Pop-Location
         }
+        if ($leaseHeld) {
+            Update-Lease -Version $publishedVersion
+        }
     }
     else {
         Write-Warning "Diretório $VersionRepoPath não contém um repositório Git (.git não encontrado). Pulando etapa de push."
@@ -103,3 +230,13 @@ catch {
     Write-Error "Erro ao atualizar versão: $_"
     exit 1
 }
+finally {
+    if ($leaseHeld) {
+        try {
+            Update-Lease -Version $publishedVersion -Release
+        }
+        catch {
+            Write-Warning "Não foi possível liberar o lease de ${TargetName}: $_"
+        }
+    }
+}
@@ -6,32 +6,290 @@ Verifica atualizações no repositório Git e atualiza arquivo de versão
 
 import subprocess
 import os
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import sys
 import time
 import re
+import threading
+import argparse
+import queue
+import random
+import json
+import tempfile
+import cProfile
+import tracemalloc
+import zlib
+import copy
+import struct
+import hashlib
+import hmac
+import bisect
+import socket
+import socketserver
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import urlsplit, parse_qs, unquote
+from urllib.request import Request, urlopen
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+
+try:
+    # Opcional: observação nativa de arquivos; sem ela o modo watch usa polling
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+# Lock de arquivo entre processos: msvcrt no Windows, fcntl nos demais sistemas
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 # Configurações
 VERSION_FILE = "hype_maps"  # Arquivo onde a versão será salva
 REPO_PATH = r"C:\Users\Administrator\Documents\GitHub\Hype-Creative-2025\resources\[maps]"  # Caminho do repositório a ser monitorado
 FXMANIFEST_PATH = r"C:\Users\Administrator\Documents\GitHub\Hype-Studio-2025\resources\[maps]\[hype-maps]\hype_maps_updater\fxmanifest.lua"  # Caminho do fxmanifest.lua
 REFERENCE_BRANCH = "development"  # Branch de referência para geração do hash
+CHANNELS = {}  # Canais extras gerados no mesmo ciclo: branch -> arquivo de versão (ex: {"main": "hype_maps_release"})
 CHECK_INTERVAL = 10  # Intervalo em segundos entre verificações
+DEV_COMMITS_WINDOW = 15  # Quantidade de commits recentes de development que precisam estar na main
+SCHEDULER_MIN_INTERVAL = 3  # Intervalo logo após uma mudança detectada (polling mais frequente)
+SCHEDULER_HOT_CYCLES = 5  # Quantos ciclos seguidos ficam no intervalo mínimo após uma mudança
+SCHEDULER_MAX_IDLE_INTERVAL = 120  # Teto do backoff exponencial em períodos ociosos
+SCHEDULER_MAX_ERROR_INTERVAL = 600  # Teto do backoff após falhas de remoto/autenticação
+SCHEDULER_BACKOFF = 2.0  # Fator de multiplicação do backoff exponencial
+SCHEDULER_JITTER = 0.2  # Variação aleatória (±20%) para hosts não consultarem o GitHub juntos
+QUIET_HOURS = None  # Ex: (1, 7) para 01:00-07:00; None desativa
+QUIET_HOURS_INTERVAL = 300  # Intervalo mínimo durante o horário silencioso
+WATCH_MODE = False  # Executa ciclos apenas quando refs/arquivo de versão mudarem (também via --watch)
+WATCH_DEBOUNCE = 2.0  # Segundos sem novas mudanças antes de disparar o ciclo
+WATCH_POLL_INTERVAL = 1.0  # Intervalo do polling de fallback quando o watchdog não está instalado
+WATCH_SAFETY_INTERVAL = 300  # Ciclo de segurança mesmo sem mudanças locais (detecta pushes remotos)
+FETCH_BRANCHES = (REFERENCE_BRANCH, "main")  # Únicas branches buscadas do remoto (sem tags)
+METADATA_ONLY_MODE = False  # Usa um clone parcial/raso gerenciado (só commits) em vez de REPO_PATH
+METADATA_CLONE_DIR = ".version_updater_clones"  # Onde os clones de metadados são criados
+METADATA_CLONE_FILTER = "tree:0"  # Filtro do clone parcial (tree:0 = sem árvores nem blobs)
+METADATA_CLONE_DEPTH = 50  # Profundidade inicial do clone raso
+METADATA_DEEPEN_STEP = 50  # Quantos commits aprofundar por vez quando a janela precisar de mais histórico
+METADATA_MAX_DEPTH = 2000  # Limite de profundidade do histórico aprofundado sob demanda
+FXMANIFEST_PLUMBING_COMMIT = True  # Commita o fxmanifest.lua na main sem checkout (índice temporário)
+PUSH_QUEUE_ENABLED = True  # Envia pushes por uma fila em segundo plano (False = push no próprio ciclo)
+PUSH_COALESCE_WINDOW = 5.0  # Segundos aguardando outros commits antes de fazer um único push
+PUSH_RETRY_BASE = 5.0  # Primeiro intervalo de retentativa após falha de push
+PUSH_RETRY_MAX = 300.0  # Teto do backoff exponencial de retentativa
+PUSH_FLUSH_TIMEOUT = 30.0  # Tempo máximo esperando a fila ao encerrar o script
+FXMANIFEST_ROOT = None  # Raiz com vários recursos (ex: resources/[maps]); atualiza todos os fxmanifest.lua em disco
+MANIFEST_INDEX_FILE = ".version_updater_manifests.json"  # Índice de offsets/mtime dos fxmanifest.lua
+MANIFEST_RESCAN_INTERVAL = 600  # Segundos entre novas varreduras da árvore em busca de fxmanifest.lua
+MANIFEST_WORKERS = 8  # Arquivos reescritos em paralelo no modo em massa
+METRICS_ENABLED = True  # Exporta tempos de comandos git e latência de ciclos
+METRICS_PROM_FILE = "version_updater.prom"  # Arquivo texto no formato Prometheus (textfile collector)
+METRICS_LOG_FILE = "version_updater_metrics.jsonl"  # Log JSON (uma linha por ciclo) com rotação
+METRICS_LOG_MAX_BYTES = 5 * 1024 * 1024  # Tamanho máximo do log JSON antes da rotação
+METRICS_LOG_BACKUPS = 3  # Quantos arquivos antigos do log JSON são mantidos
+CYCLE_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)  # Limites (s) do histograma de ciclos
+PROFILE_CYCLE = None  # Número do ciclo (por alvo) a perfilar com cProfile/tracemalloc (também via --profile-cycle)
+PROFILE_DIR = ".version_updater_profiles"  # Onde os perfis e snapshots de memória são gravados
+NATIVE_GIT_READER = True  # Lê refs e objetos direto do .git, sem processos (False = sempre git cat-file)
+VERSION_SERVER_PORT = None  # Porta do serviço HTTP de versões para os servidores FiveM (None desativa; também via --http-port)
+VERSION_SERVER_HOST = "127.0.0.1"  # Interface do serviço HTTP ("0.0.0.0" para aceitar outros hosts)
+VERSION_LONGPOLL_MAX = 60  # Tempo máximo (s) que uma requisição ?wait= fica aguardando uma nova versão
+WEBHOOK_PORT = None  # Porta do receptor de webhooks de push do GitHub (None desativa; também via --webhook-port)
+WEBHOOK_HOST = "127.0.0.1"  # Interface do receptor de webhooks (use um túnel/proxy reverso para expor)
+WEBHOOK_SECRET = None  # Segredo HMAC configurado no webhook (ou variável de ambiente VERSION_UPDATER_WEBHOOK_SECRET)
+WEBHOOK_SAFETY_INTERVAL = 600  # Intervalo mínimo do polling de segurança enquanto o receptor está ativo
+WEBHOOK_MAX_BODY = 25 * 1024 * 1024  # Tamanho máximo aceito de um payload (limite do próprio GitHub)
+HISTORY_FILE = ".version_updater_history.jsonl"  # Histórico (somente acréscimo) de versão -> commit
+HISTORY_COMPACT_MIN_GARBAGE = 500  # Linhas substituídas no histórico antes de reescrevê-lo compactado
+GIT_COMMAND_TIMEOUT = 60  # Tempo máximo (s) de um comando git local
+GIT_NETWORK_TIMEOUT = 300  # Tempo máximo (s) de comandos de rede (fetch, push, ls-remote)
+GIT_QUERY_WORKERS = 4  # Consultas git independentes executadas em paralelo
+PIPELINE_ENABLED = True  # Daemon em estágios (detecção -> versão -> publicação) ligados por filas; False = ciclo sequencial
+PIPELINE_QUEUE_SIZE = 8  # Capacidade de cada fila entre estágios (cheia, segura a detecção)
+VERSION_LATENCY_BUCKETS = (5, 15, 30, 60, 120, 300, 600, 1800, 3600, 7200)  # Limites (s) do histograma commit -> versão
+LEASE_ENABLED = True  # Lease por alvo entre instâncias/hosts que compartilham o repositório de versões
+LEASE_DIR = None  # Pasta dos leases (None = .git do repositório de versões; use uma pasta compartilhada entre hosts)
+LEASE_TTL = 60  # Segundos sem heartbeat até o lease ser considerado abandonado e reassumido
+LEASE_HEARTBEAT_INTERVAL = 15  # Intervalo de renovação do lease pela instância dona
+LEASE_LOCK_TIMEOUT = 10  # Tempo máximo esperando o lock do arquivo de lease
+MAINTENANCE_ENABLED = True  # Manutenção dos repositórios (commit-graph, multi-pack-index, repack) em janelas ociosas
+MAINTENANCE_IDLE_SECONDS = 300  # Tempo sem mudanças detectadas antes de iniciar uma manutenção
+MAINTENANCE_INTERVAL = 6 * 3600  # Intervalo mínimo entre manutenções do mesmo repositório
+MAINTENANCE_REPACK_BATCH_SIZE = None  # Lote do repack incremental em bytes (None = 1 byte a mais que o 2º maior pack, como o git maintenance)
+MAINTENANCE_PRUNE_EXPIRE = "2.weeks.ago"  # Objetos soltos inalcançáveis mais antigos que isso são removidos
+MAINTENANCE_STEP_TIMEOUT = 1800  # Tempo máximo (s) de cada etapa da manutenção
+MAINTENANCE_TIMING_RUNS = 3  # Execuções de cada consulta medida antes/depois (vale a mais rápida)
+FAST_STATUS_CONFIG = True  # Ativa core.untrackedCache e core.fsmonitor (se suportados) nos repositórios onde o script commita
+STATE_CACHE_FILE = ".version_updater_state.json"  # Último estado observado de cada alvo (pula ciclos sem mudança)
+TARGETS_CONFIG = "targets.json"  # Lista de alvos monitorados (se não existir, usa as configurações acima)
+MAX_WORKERS = 4  # Máximo de alvos verificados em paralelo
+
+# Estatísticas de fetch do repositório monitorado (realizados, pulados pela sonda e falhas)
+FETCH_STATS = {"fetches": 0, "skipped": 0, "failures": 0}
+_fetch_stats_lock = threading.Lock()
+
+# Linha de versão do fxmanifest.lua: version 'HYPE-...' ou version "HYPE-..." (compilado uma única vez)
+FXMANIFEST_VERSION_PATTERN = re.compile(r"(version\s+['\"])(HYPE-[^'\"]+)(['\"])")
+FXMANIFEST_VERSION_BYTES_PATTERN = re.compile(rb"(version\s+['\"])(HYPE-[^'\"]+)(['\"])")
+
+class Target:
+    """Alvo monitorado: repositório de origem, arquivo de versão e fxmanifest.lua"""
+
+    def __init__(self, name, repo_path, version_file, fxmanifest_path=None,
+                 reference_branch="development", versions_repo=None,
+                 metadata_only=False, remote_url=None, metadata_clone_path=None,
+                 fxmanifest_root=None, channels=None):
+        self.name = name
+        self.repo_path = repo_path  # Repositório monitorado
+        self.version_file = version_file  # Caminho do arquivo de versão relativo a versions_repo
+        self.fxmanifest_path = fxmanifest_path  # fxmanifest.lua atualizado na branch main (opcional)
+        self.reference_branch = reference_branch
+        self.versions_repo = versions_repo or os.getcwd()  # Repositório onde o arquivo de versão é commitado
+        self.fxmanifest_root = fxmanifest_root  # Raiz com vários fxmanifest.lua atualizados em massa (opcional)
+        self.channels = dict(channels or {})  # Canais extras: branch -> arquivo de versão em versions_repo
+        self.metadata_only = metadata_only
+        self.source_path = repo_path  # Clone completo original (de onde vem a URL do remoto)
+        self.remote_url = remote_url
+        if metadata_only:
+            # As consultas passam a ser feitas no clone de metadados gerenciado pelo script
+            self.repo_path = metadata_clone_path or os.path.abspath(os.path.join(METADATA_CLONE_DIR, f"{name}.git"))
+
+    @property
+    def git_dir(self):
+        """Diretório Git do repositório consultado (o clone de metadados é bare)"""
+        if self.metadata_only:
+            return self.repo_path
+        return os.path.join(self.repo_path, ".git")
+
+    @property
+    def version_path(self):
+        """Caminho completo do arquivo de versão"""
+        return os.path.join(self.versions_repo, self.version_file)
+
+    @property
+    def fetch_branches(self):
+        """Branches buscadas do remoto para este alvo (incluindo as dos canais extras)"""
+        if self.reference_branch == REFERENCE_BRANCH:
+            branches = FETCH_BRANCHES
+        else:
+            branches = (self.reference_branch, "main")
+        return branches + tuple(branch for branch in self.channels if branch not in branches)
+
+    def channel(self, branch):
+        """Alvo derivado de um canal extra: mesmo repositório, outra branch e outro arquivo de versão"""
+        channel_target = copy.copy(self)
+        channel_target.name = f"{self.name}:{branch}"
+        channel_target.reference_branch = branch
+        channel_target.version_file = self.channels[branch]
+        channel_target.fxmanifest_path = None
+        channel_target.fxmanifest_root = None
+        channel_target.channels = {}
+        return channel_target
+
+def default_target():
+    """Alvo único montado a partir das configurações do topo do script"""
+    return Target(VERSION_FILE, REPO_PATH, VERSION_FILE, FXMANIFEST_PATH, REFERENCE_BRANCH, os.getcwd(),
+                  metadata_only=METADATA_ONLY_MODE, fxmanifest_root=FXMANIFEST_ROOT, channels=CHANNELS)
+
+def load_targets(config_path=None):
+    """Carrega a lista de alvos do arquivo de configuração JSON
 
-def run_git_command(command, check=True, cwd=None):
-    """Executa um comando Git e retorna o resultado (stdout, returncode, stderr)"""
+    Formato:
+        {"max_workers": 4,
+         "targets": [{"name": "hype_maps", "repo_path": "...", "version_file": "hype_maps",
+                      "fxmanifest_path": "...", "reference_branch": "development",
+                      "versions_repo": ".", "metadata_only": false, "remote_url": "...",
+                      "fxmanifest_root": "...", "channels": {"main": "hype_maps_release"}}]}
+
+    Caminhos relativos de versions_repo são resolvidos a partir da pasta do arquivo.
+    Se o arquivo não existir, retorna apenas o alvo padrão.
+    """
+    config_path = config_path or TARGETS_CONFIG
+    if not os.path.exists(config_path):
+        return [default_target()], MAX_WORKERS
+
+    with open(config_path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+
+    base_dir = os.path.dirname(os.path.abspath(config_path))
+    targets = []
+    for entry in config.get("targets", []):
+        versions_repo = os.path.join(base_dir, entry.get("versions_repo", "."))
+        targets.append(Target(
+            name=entry.get("name") or entry["version_file"],
+            repo_path=entry["repo_path"],
+            version_file=entry["version_file"],
+            fxmanifest_path=entry.get("fxmanifest_path"),
+            reference_branch=entry.get("reference_branch", REFERENCE_BRANCH),
+            versions_repo=os.path.normpath(versions_repo),
+            metadata_only=entry.get("metadata_only", METADATA_ONLY_MODE),
+            remote_url=entry.get("remote_url"),
+            metadata_clone_path=entry.get("metadata_clone_path"),
+            fxmanifest_root=entry.get("fxmanifest_root", FXMANIFEST_ROOT),
+            channels=entry.get("channels", CHANNELS)
+        ))
+    if not targets:
+        raise ValueError(f"Nenhum alvo definido em {config_path}")
+    return targets, int(config.get("max_workers", MAX_WORKERS))
+
+_repo_locks = {}
+_repo_locks_lock = threading.Lock()
+
+def repo_lock(path):
+    """Retorna o lock do repositório (serializa escritas de alvos que compartilham o mesmo repo)"""
+    key = os.path.normcase(os.path.abspath(path))
+    with _repo_locks_lock:
+        lock = _repo_locks.get(key)
+        if lock is None:
+            lock = threading.RLock()
+            _repo_locks[key] = lock
+        return lock
+
+def find_git_repo_root(path):
+    """Procura o diretório .git subindo na hierarquia a partir de path e retorna a raiz do repositório"""
+    search_path = path
+    while search_path and search_path != os.path.dirname(search_path):
+        if os.path.exists(os.path.join(search_path, ".git")):
+            return search_path
+        search_path = os.path.dirname(search_path)
+    return None
+
+GIT_NETWORK_SUBCOMMANDS = {"fetch", "push", "pull", "ls-remote", "clone"}
+
+def run_git_command(args, check=True, cwd=None, env=None, timeout=None):
+    """Executa git com uma lista de argumentos (sem shell) e retorna (stdout, returncode, stderr)
+
+    Os argumentos vão direto para o processo, então caminhos como [hype-maps] e
+    mensagens de commit não precisam de aspas. `env` acrescenta variáveis de ambiente
+    (ex: GIT_INDEX_FILE). Sem `timeout`, usa GIT_NETWORK_TIMEOUT para comandos de rede
+    e GIT_COMMAND_TIMEOUT para os demais; ao estourar, o processo é encerrado.
+    """
     if cwd is None:
         cwd = REPO_PATH
+    command = ["git"] + list(args)
+    subcommand = git_subcommand(command)
+    if timeout is None:
+        timeout = GIT_NETWORK_TIMEOUT if subcommand in GIT_NETWORK_SUBCOMMANDS else GIT_COMMAND_TIMEOUT
+    started = time.monotonic()
     try:
         result = subprocess.run(
             command,
-            shell=True,
             capture_output=True,
             text=True,
             check=check,
-            cwd=cwd
+            cwd=cwd,
+            env=dict(os.environ, **env) if env else None,
+            timeout=timeout
         )
         return result.stdout.strip(), result.returncode, result.stderr.strip()
+    except subprocess.TimeoutExpired:
+        print(f"Erro: git {subcommand} excedeu {timeout}s e foi encerrado")
+        return None, -1, f"tempo esgotado após {timeout}s"
     except subprocess.CalledProcessError as e:
         print(f"Erro ao executar comando Git: {e}")
         if e.stderr:
@@ -39,17 +297,1657 @@ def run_git_command(command, check=True, cwd=None):
         if e.stdout:
             print(f"Saída: {e.stdout}")
         return None, e.returncode, e.stderr.strip() if e.stderr else ""
+    except OSError as e:
+        print(f"Erro: Não foi possível executar o git: {e}")
+        return None, -1, str(e)
+    finally:
+        METRICS.record_git(subcommand, time.monotonic() - started)
+
+def git_subcommand(command):
+    """Extrai o subcomando de uma linha de comando git (ex: ["git", "-c", "x=y", "fetch"] -> "fetch")"""
+    tokens = list(command)
+    index = 1
+    while index < len(tokens) and tokens[index].startswith("-"):
+        # Opções globais com valor separado (-c chave=valor, -C caminho)
+        index += 2 if tokens[index] in ("-c", "-C") else 1
+    return tokens[index] if index < len(tokens) else "git"
+
+_git_query_pool = None
+_git_query_pool_lock = threading.Lock()
+
+def run_git_queries(**queries):
+    """Executa consultas independentes (funções sem argumentos) em paralelo e retorna {nome: resultado}
+
+    Usa um pool pequeno e compartilhado (GIT_QUERY_WORKERS). O contexto do ciclo
+    (relatório, alvo e contadores) acompanha cada consulta, então métricas e logs
+    continuam atribuídos ao ciclo que as pediu.
+    """
+    global _git_query_pool
+    with _git_query_pool_lock:
+        if _git_query_pool is None:
+            _git_query_pool = ThreadPoolExecutor(max_workers=GIT_QUERY_WORKERS, thread_name_prefix="git-query")
+    context = {key: getattr(_cycle_local, key, None) for key in ("report", "target", "stats", "snapshot")}
+
+    def call(func):
+        for key, value in context.items():
+            setattr(_cycle_local, key, value)
+        try:
+            return func()
+        finally:
+            for key in context:
+                setattr(_cycle_local, key, None)
+
+    futures = {name: _git_query_pool.submit(call, func) for name, func in queries.items()}
+    return {name: future.result() for name, future in futures.items()}
+
+class NativeGitError(Exception):
+    """O leitor em Python encontrou algo que não sabe interpretar; a consulta vai para o git"""
+
+GIT_PACK_TYPES = {1: "commit", 2: "tree", 3: "blob", 4: "tag"}
+GIT_OFS_DELTA = 6
+GIT_REF_DELTA = 7
+HEX_OID_PATTERN = re.compile(r"[0-9a-f]{40}")
+
+def apply_git_delta(base, delta):
+    """Aplica um delta de packfile (instruções de cópia/inserção) sobre o objeto base"""
+    pos = 0
+
+    def varint():
+        nonlocal pos
+        value = shift = 0
+        while True:
+            byte = delta[pos]
+            pos += 1
+            value |= (byte & 0x7f) << shift
+            shift += 7
+            if not byte & 0x80:
+                return value
+
+    if varint() != len(base):
+        raise NativeGitError("delta com tamanho de base inválido")
+    result_size = varint()
+    out = bytearray()
+    while pos < len(delta):
+        op = delta[pos]
+        pos += 1
+        if op & 0x80:
+            offset = size = 0
+            for i in range(4):
+                if op & (1 << i):
+                    offset |= delta[pos] << (8 * i)
+                    pos += 1
+            for i in range(3):
+                if op & (1 << (4 + i)):
+                    size |= delta[pos] << (8 * i)
+                    pos += 1
+            out += base[offset:offset + (size or 0x10000)]
+        elif op:
+            out += delta[pos:pos + op]
+            pos += op
+        else:
+            raise NativeGitError("instrução de delta inválida")
+    if len(out) != result_size:
+        raise NativeGitError("delta gerou tamanho inesperado")
+    return bytes(out)
+
+class _PackIndex:
+    """Índice (.idx versão 2) de um packfile, lido uma única vez para a memória"""
+
+    def __init__(self, idx_path):
+        with open(idx_path, 'rb') as f:
+            data = f.read()
+        if data[:4] != b'\xfftOc' or struct.unpack('>I', data[4:8])[0] != 2:
+            raise NativeGitError(f"índice de pack não suportado: {idx_path}")
+        self.pack_path = idx_path[:-4] + ".pack"
+        self.fanout = struct.unpack('>256I', data[8:1032])
+        count = self.fanout[255]
+        self._names = data[1032:1032 + 20 * count]
+        offsets_start = 1032 + 24 * count  # Pula os CRC32
+        self._offsets = data[offsets_start:offsets_start + 4 * count]
+        self._large_offsets = data[offsets_start + 4 * count:-40]
+
+    def find(self, binsha):
+        """Offset do objeto dentro do .pack, ou None se ele não estiver neste pack"""
+        first = binsha[0]
+        lo = self.fanout[first - 1] if first else 0
+        hi = self.fanout[first]
+        names = self._names
+        while lo < hi:
+            mid = (lo + hi) // 2
+            name = names[mid * 20:mid * 20 + 20]
+            if name < binsha:
+                lo = mid + 1
+            elif name > binsha:
+                hi = mid
+            else:
+                offset = struct.unpack_from('>I', self._offsets, mid * 4)[0]
+                if offset & 0x80000000:
+                    offset = struct.unpack_from('>Q', self._large_offsets, (offset & 0x7fffffff) * 8)[0]
+                return offset
+        return None
+
+class GitObjectReader:
+    """Leitor de refs e objetos Git em Python puro, sem criar processos
+
+    Resolve refs soltas e packed-refs e lê objetos soltos ou empacotados (índice v2,
+    deltas OFS/REF) direto do diretório .git. Índices de pack ficam em cache e os
+    .pack não ficam abertos entre leituras (no Windows isso impediria o git gc de
+    removê-los). Qualquer formato desconhecido gera NativeGitError.
+    """
+
+    OBJECT_CACHE_SIZE = 256  # Objetos pequenos (commits, árvores, tags) mantidos em memória
+    OBJECT_CACHE_MAX_BYTES = 1024 * 1024
+
+    def __init__(self, git_dir, common_dir):
+        self.git_dir = git_dir
+        self.common_dir = common_dir
+        self._lock = threading.RLock()
+        self._packed_refs = {}
+        self._packed_refs_key = None
+        self._object_dirs = self._find_object_dirs(os.path.join(common_dir, "objects"))
+        self._packs = {}  # caminho do .idx -> _PackIndex
+        self._pack_dirs_key = None
+        self._cache = OrderedDict()  # hash -> (tipo, conteúdo); objetos Git são imutáveis
+
+    @classmethod
+    def open(cls, path):
+        """Cria o leitor para o repositório em path (bare ou com .git), ou None se não for suportado"""
+        path = os.path.abspath(path)
+        if os.path.isfile(os.path.join(path, "HEAD")) and os.path.isdir(os.path.join(path, "objects")):
+            git_dir = path
+        else:
+            root = find_git_repo_root(path)
+            if not root:
+                return None
+            git_dir = os.path.join(root, ".git")
+            if os.path.isfile(git_dir):
+                # Worktree ou submódulo: o .git é um arquivo "gitdir: <caminho>"
+                with open(git_dir, 'r', encoding='utf-8') as f:
+                    content = f.read().strip()
+                if not content.startswith("gitdir:"):
+                    return None
+                git_dir = os.path.normpath(os.path.join(root, content[len("gitdir:"):].strip()))
+        common_dir = git_dir
+        commondir_file = os.path.join(git_dir, "commondir")
+        if os.path.isfile(commondir_file):
+            with open(commondir_file, 'r', encoding='utf-8') as f:
+                common_dir = os.path.normpath(os.path.join(git_dir, f.read().strip()))
+        try:
+            with open(os.path.join(common_dir, "config"), 'r', encoding='utf-8', errors='replace') as f:
+                config = f.read().lower()
+        except OSError:
+            return None
+        # Repositórios SHA-256 ou com reftable ficam com o git
+        if re.search(r"objectformat\s*=\s*sha256", config) or re.search(r"refstorage\s*=\s*reftable", config):
+            return None
+        return cls(git_dir, common_dir)
+
+    @staticmethod
+    def _find_object_dirs(objects_dir):
+        """Diretório de objetos do repositório mais os de objects/info/alternates"""
+        dirs = [objects_dir]
+        try:
+            with open(os.path.join(objects_dir, "info", "alternates"), 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if line and not line.startswith('#'):
+                        dirs.append(os.path.normpath(os.path.join(objects_dir, line)))
+        except OSError:
+            pass
+        return dirs
+
+    # --- Refs ---
+
+    def _packed_refs_map(self):
+        """Conteúdo de packed-refs ({ref: hash}), relido apenas quando o arquivo muda"""
+        path = os.path.join(self.common_dir, "packed-refs")
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return {}
+        key = (st.st_mtime_ns, st.st_size, st.st_ino)
+        if key != self._packed_refs_key:
+            refs = {}
+            with open(path, 'rb') as f:
+                for line in f.read().decode('utf-8', errors='replace').splitlines():
+                    if not line or line[0] in "#^":
+                        continue
+                    oid, _, name = line.partition(' ')
+                    refs[name] = oid
+            self._packed_refs, self._packed_refs_key = refs, key
+        return self._packed_refs
+
+    def _read_ref_file(self, name):
+        """Conteúdo da ref solta (texto) ou None se ela não existir como arquivo"""
+        base = self.git_dir if name == "HEAD" else self.common_dir
+        path = os.path.join(base, *name.split('/'))
+        if not os.path.isfile(path):
+            return None
+        with open(path, 'rb') as f:
+            return f.read().decode('utf-8', errors='replace').strip()
+
+    def read_ref(self, name, depth=0):
+        """Resolve uma ref completa (ex: refs/heads/main, HEAD) para o hash, ou None se não existir"""
+        if depth > 5:
+            raise NativeGitError(f"refs simbólicas em ciclo: {name}")
+        with self._lock:
+            value = self._read_ref_file(name)
+            if value is None:
+                return self._packed_refs_map().get(name)
+        if value.startswith("ref:"):
+            return self.read_ref(value[4:].strip(), depth + 1)
+        if HEX_OID_PATTERN.fullmatch(value):
+            return value
+        raise NativeGitError(f"conteúdo de ref desconhecido em {name}")
+
+    def symbolic_ref(self, name="HEAD"):
+        """Ref para a qual a ref simbólica aponta (ex: refs/heads/main), ou None se não for simbólica"""
+        value = self._read_ref_file(name)
+        if value and value.startswith("ref:"):
+            return value[4:].strip()
+        return None
+
+    def resolve_name(self, name):
+        """Resolve um nome curto como o git (main, origin/main, refs/heads/main...), ou None"""
+        if name.startswith("refs/") or re.fullmatch(r"[A-Z_]+", name):
+            candidates = [name]
+        else:
+            candidates = [f"refs/{name}", f"refs/tags/{name}", f"refs/heads/{name}",
+                          f"refs/remotes/{name}", f"refs/remotes/{name}/HEAD"]
+        for candidate in candidates:
+            oid = self.read_ref(candidate)
+            if oid:
+                return oid
+        return None
+
+    def rev_parse(self, rev):
+        """Resolve rev (ref, hash completo, rev^{commit} ou rev:caminho) para um hash, ou None"""
+        path = None
+        if ':' in rev:
+            rev, _, path = rev.partition(':')
+            if not rev:
+                raise NativeGitError("consulta ao índice (:caminho)")
+        peel_commit = rev.endswith("^{commit}")
+        if peel_commit:
+            rev = rev[:-len("^{commit}")]
+        if not rev or any(c in rev for c in "^~@{}"):
+            raise NativeGitError(f"expressão de revisão não suportada: {rev}")
+        if HEX_OID_PATTERN.fullmatch(rev):
+            # Hash completo só vale se o objeto existir (ausente pode estar no promisor: o git decide)
+            if not self.has_object(rev):
+                raise NativeGitError(f"objeto {rev} não encontrado localmente")
+            oid = rev
+        else:
+            oid = self.resolve_name(rev)
+        if oid is None:
+            if re.fullmatch(r"[0-9a-fA-F]{4,39}", rev):
+                # Hash abreviado: a desambiguação fica com o git
+                raise NativeGitError(f"hash abreviado: {rev}")
+            return None
+        if peel_commit or path is not None:
+            oid = self.peel(oid, "commit")
+            if oid is None:
+                return None
+        if path is not None:
+            oid = self.tree_lookup(self.read_object(oid)[1], path)
+        return oid
+
+    # --- Objetos ---
+
+    def peel(self, oid, wanted):
+        """Segue tags anotadas até um objeto do tipo wanted; None se o tipo final for outro"""
+        for _ in range(10):
+            obj_type, content = self.read_object(oid)
+            if obj_type == wanted:
+                return oid
+            if obj_type != "tag":
+                return None
+            oid = content.split(b'\n', 1)[0].split(b' ', 1)[1].decode('ascii')
+        raise NativeGitError("cadeia de tags longa demais")
+
+    def tree_lookup(self, commit_content, path):
+        """Hash do caminho dentro da árvore do commit, ou None se o caminho não existir"""
+        oid = commit_content.split(b'\n', 1)[0].split(b' ', 1)[1].decode('ascii')
+        for part in path.replace('\\', '/').strip('/').split('/'):
+            obj_type, data = self.read_object(oid)
+            if obj_type != "tree":
+                return None
+            wanted = part.encode('utf-8')
+            pos = 0
+            oid = None
+            while pos < len(data):
+                space = data.index(b' ', pos)
+                nul = data.index(b'\0', space)
+                if data[space + 1:nul] == wanted:
+                    oid = data[nul + 1:nul + 21].hex()
+                    break
+                pos = nul + 21
+            if oid is None:
+                return None
+        return oid
+
+    def has_object(self, oid):
+        """Indica se o objeto está no repositório local (cache, packs ou objeto solto), sem lê-lo"""
+        with self._lock:
+            if oid in self._cache:
+                return True
+            self._refresh_packs()
+            binsha = bytes.fromhex(oid)
+            if any(index.find(binsha) is not None for index in list(self._packs.values())):
+                return True
+            if any(os.path.isfile(os.path.join(objects_dir, oid[:2], oid[2:])) for objects_dir in self._object_dirs):
+                return True
+            return self._refresh_packs(force=True) and any(
+                index.find(binsha) is not None for index in list(self._packs.values()))
+
+    def read_object(self, oid):
+        """Retorna (tipo, conteúdo) do objeto; NativeGitError se ele não puder ser lido sem o git"""
+        with self._lock:
+            cached = self._cache.get(oid)
+            if cached is not None:
+                self._cache.move_to_end(oid)
+                return cached
+            result = self._read_packed(oid)
+            if result is None:
+                result = self._read_loose(oid)
+            if result is None and self._refresh_packs(force=True):
+                result = self._read_packed(oid)
+            if result is None:
+                # Objeto ausente (ex: clone parcial): o git sabe buscá-lo no promisor
+                raise NativeGitError(f"objeto {oid} não encontrado localmente")
+            if len(result[1]) <= self.OBJECT_CACHE_MAX_BYTES:
+                self._cache[oid] = result
+                if len(self._cache) > self.OBJECT_CACHE_SIZE:
+                    self._cache.popitem(last=False)
+            return result
+
+    def _read_loose(self, oid):
+        """Lê um objeto solto (objects/xx/yyyy...), ou None se não existir"""
+        for objects_dir in self._object_dirs:
+            try:
+                with open(os.path.join(objects_dir, oid[:2], oid[2:]), 'rb') as f:
+                    raw = zlib.decompress(f.read())
+            except FileNotFoundError:
+                continue
+            header, _, content = raw.partition(b'\0')
+            obj_type, _, size = header.decode('ascii').partition(' ')
+            if int(size) != len(content):
+                raise NativeGitError(f"objeto solto corrompido: {oid}")
+            return obj_type, content
+        return None
+
+    def _refresh_packs(self, force=False):
+        """Relê a lista de packs se as pastas de pack mudaram; retorna True se algo mudou"""
+        pack_dirs = [os.path.join(objects_dir, "pack") for objects_dir in self._object_dirs]
+        key = []
+        for pack_dir in pack_dirs:
+            try:
+                key.append(os.stat(pack_dir).st_mtime_ns)
+            except FileNotFoundError:
+                key.append(None)
+        if key == self._pack_dirs_key and not force:
+            return False
+        self._pack_dirs_key = key
+        packs = {}
+        for pack_dir in pack_dirs:
+            try:
+                names = sorted(os.listdir(pack_dir))
+            except FileNotFoundError:
+                continue
+            for name in names:
+                idx_path = os.path.join(pack_dir, name)
+                if name.endswith(".idx") and os.path.exists(idx_path[:-4] + ".pack"):
+                    packs[idx_path] = self._packs.get(idx_path) or _PackIndex(idx_path)
+        changed = set(packs) != set(self._packs)
+        self._packs = packs
+        return changed
+
+    def _read_packed(self, oid):
+        """Lê o objeto de um dos packfiles, ou None se nenhum índice o contém"""
+        self._refresh_packs()
+        binsha = bytes.fromhex(oid)
+        for index in list(self._packs.values()):
+            offset = index.find(binsha)
+            if offset is not None:
+                try:
+                    with open(index.pack_path, 'rb') as f:
+                        return self._read_pack_entry(f, index, offset)
+                except FileNotFoundError:
+                    # Pack removido por um repack entre a listagem e a leitura
+                    self._refresh_packs(force=True)
+                    return None
+        return None
+
+    def _read_pack_entry(self, f, index, offset):
+        """Lê a entrada do pack no offset, resolvendo a cadeia de deltas"""
+        deltas = []
+        while True:
+            f.seek(offset)
+            buf = f.read(64)
+            byte = buf[0]
+            entry_type = (byte >> 4) & 7
+            size = byte & 0x0f
+            shift, pos = 4, 1
+            while byte & 0x80:
+                byte = buf[pos]
+                pos += 1
+                size |= (byte & 0x7f) << shift
+                shift += 7
+            if entry_type == GIT_OFS_DELTA:
+                byte = buf[pos]
+                pos += 1
+                distance = byte & 0x7f
+                while byte & 0x80:
+                    byte = buf[pos]
+                    pos += 1
+                    distance = ((distance + 1) << 7) | (byte & 0x7f)
+                deltas.append(self._inflate(f, offset + pos, size))
+                offset -= distance
+                continue
+            if entry_type == GIT_REF_DELTA:
+                base_oid = buf[pos:pos + 20].hex()
+                delta = self._inflate(f, offset + pos + 20, size)
+                base_offset = index.find(buf[pos:pos + 20])
+                if base_offset is None:
+                    obj_type, content = self.read_object(base_oid)
+                    break
+                deltas.append(delta)
+                offset = base_offset
+                continue
+            if entry_type not in GIT_PACK_TYPES:
+                raise NativeGitError(f"tipo de entrada de pack desconhecido: {entry_type}")
+            obj_type, content = GIT_PACK_TYPES[entry_type], self._inflate(f, offset + pos, size)
+            break
+        for delta in reversed(deltas):
+            content = apply_git_delta(content, delta)
+        return obj_type, content
+
+    @staticmethod
+    def _inflate(f, offset, size):
+        """Descomprime os dados zlib de uma entrada do pack"""
+        f.seek(offset)
+        decompressor = zlib.decompressobj()
+        chunks = []
+        while not decompressor.eof:
+            data = f.read(65536)
+            if not data:
+                raise NativeGitError("packfile truncado")
+            chunks.append(decompressor.decompress(data))
+        content = b"".join(chunks)
+        if len(content) != size:
+            raise NativeGitError("tamanho de objeto empacotado inválido")
+        return content
+
+def parse_commit(oid, content):
+    """Extrai os metadados de um commit (hash, tree, parents, committer_time, committer_tz, message)"""
+    headers, _, message = content.decode('utf-8', errors='replace').partition('\n\n')
+    info = {"hash": oid, "tree": None, "parents": [], "committer_time": None,
+            "committer_tz": timezone.utc, "message": message}
+    for line in headers.split('\n'):
+        key, _, value = line.partition(' ')
+        if key == "tree":
+            info["tree"] = value
+        elif key == "parent":
+            info["parents"].append(value)
+        elif key == "committer":
+            # Formato: Nome <email> 1700000000 -0300
+            fields = value.rsplit(' ', 2)
+            if len(fields) == 3:
+                info["committer_time"] = int(fields[1])
+                info["committer_tz"] = parse_git_tz(fields[2])
+    return info
+
+class GitQuerySession:
+    """Sessão de consulta Git de longa duração sobre `git cat-file --batch`/`--batch-check`
+
+    Mantém os processos abertos e responde resoluções de refs, conteúdo de arquivos
+    (ex: HEAD:fxmanifest.lua) e metadados de commits por pipe, sem criar um processo
+    novo a cada leitura. Se o processo filho morrer, ele é reiniciado automaticamente.
+    Com NATIVE_GIT_READER, as consultas são respondidas primeiro pelo GitObjectReader
+    e o cat-file só é iniciado quando ele não consegue interpretar o repositório.
+    """
+
+    def __init__(self, cwd):
+        self.cwd = cwd
+        self._procs = {}
+        self._lock = threading.Lock()
+        self._reader = GitObjectReader.open(cwd) if NATIVE_GIT_READER else None
+        self.native_fallbacks = 0
+
+    def _start(self, mode):
+        """Inicia (ou reinicia) o processo `git cat-file` do modo informado"""
+        self._stop(mode)
+        proc = subprocess.Popen(
+            ["git", "cat-file", mode],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            cwd=self.cwd
+        )
+        METRICS.record_spawn("cat-file")
+        self._procs[mode] = proc
+        return proc
+
+    def _stop(self, mode):
+        """Encerra o processo do modo informado, se existir"""
+        proc = self._procs.pop(mode, None)
+        if proc is None:
+            return
+        try:
+            proc.stdin.close()
+        except OSError:
+            pass
+        try:
+            proc.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+
+    def _request(self, mode, spec):
+        """Envia uma consulta e retorna (cabeçalho, conteúdo) ou (None, None) se o objeto não existir"""
+        if '\n' in spec:
+            return None, None
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    proc = self._procs.get(mode)
+                    if proc is None or proc.poll() is not None:
+                        proc = self._start(mode)
+                    proc.stdin.write(spec.encode('utf-8') + b'\n')
+                    proc.stdin.flush()
+                    header = proc.stdout.readline()
+                    if not header:
+                        raise EOFError("git cat-file encerrou inesperadamente")
+                    header = header.decode('utf-8', errors='replace').rstrip('\n')
+                    if header.endswith((" missing", " ambiguous")):
+                        # "<spec> missing" ou "<spec> ambiguous" (o spec pode conter espaços)
+                        return None, None
+                    parts = header.split(' ')
+                    if len(parts) != 3:
+                        raise ValueError(f"resposta inesperada do git cat-file: {header}")
+                    content = None
+                    if mode == "--batch":
+                        size = int(parts[2])
+                        content = proc.stdout.read(size + 1)
+                        if len(content) != size + 1:
+                            raise EOFError("resposta incompleta do git cat-file")
+                        content = content[:-1]
+                    return parts, content
+                except (OSError, EOFError, ValueError) as e:
+                    print(f"Aviso: sessão git cat-file em {self.cwd} falhou ({e}), reiniciando...")
+                    self._stop(mode)
+        return self._request_once(mode, spec)
+
+    def _request_once(self, mode, spec):
+        """Consulta sem a sessão (processos avulsos), usada quando o git cat-file não inicia
+
+        Só o cabeçalho (hash, tipo, tamanho) é obtido assim: o conteúdo de --batch
+        precisa dos bytes exatos, então nesse modo a consulta falha (None, None).
+        """
+        if mode != "--batch-check":
+            return None, None
+        # Sequencial: a sessão também é consultada de dentro do pool de run_git_queries
+        oid, code, _ = run_git_command(["rev-parse", "--verify", "--quiet", spec], check=False, cwd=self.cwd)
+        if code != 0 or not oid:
+            return None, None
+        obj_type, _, _ = run_git_command(["cat-file", "-t", oid], check=False, cwd=self.cwd)
+        size, _, _ = run_git_command(["cat-file", "-s", oid], check=False, cwd=self.cwd)
+        if not obj_type or not (size or "").isdigit():
+            return None, None
+        return [oid, obj_type, size], None
+
+    def _native(self, rev, read=True):
+        """Consulta rev pelo leitor em Python: (hash, tipo, conteúdo), só o hash se read=False,
+        ou None se não existir. Gera NativeGitError quando a consulta precisa ir para o git."""
+        if self._reader is None:
+            raise NativeGitError("leitor em Python desativado")
+        try:
+            oid = self._reader.rev_parse(rev)
+            if oid is None or not read:
+                return oid
+            obj_type, content = self._reader.read_object(oid)
+            return oid, obj_type, content
+        except (NativeGitError, OSError, zlib.error, struct.error, ValueError, IndexError) as e:
+            if not self.native_fallbacks:
+                print(f"Aviso: Leitor Git em Python não resolveu '{rev}' em {self.cwd} ({e}); usando git cat-file")
+            self.native_fallbacks += 1
+            raise NativeGitError(str(e))
+
+    def object_info(self, rev):
+        """Retorna (hash, tipo, tamanho) do objeto apontado por rev, ou None"""
+        try:
+            found = self._native(rev)
+            return (found[0], found[1], len(found[2])) if found else None
+        except NativeGitError:
+            pass
+        parts, _ = self._request("--batch-check", rev)
+        if not parts:
+            return None
+        return parts[0], parts[1], int(parts[2])
+
+    def resolve(self, rev):
+        """Resolve uma ref/revisão para o hash completo, ou None se não existir"""
+        try:
+            return self._native(rev, read=False)
+        except NativeGitError:
+            pass
+        parts, _ = self._request("--batch-check", rev)
+        return parts[0] if parts else None
+
+    def read_object(self, rev):
+        """Retorna o conteúdo bruto (bytes) do objeto apontado por rev, ou None"""
+        try:
+            found = self._native(rev)
+            return found[2] if found else None
+        except NativeGitError:
+            pass
+        _, content = self._request("--batch", rev)
+        return content
+
+    def current_branch(self):
+        """Nome da branch em checkout, ou None se o HEAD estiver destacado"""
+        if self._reader is not None:
+            ref = self._reader.symbolic_ref("HEAD")
+            return ref[len("refs/heads/"):] if ref and ref.startswith("refs/heads/") else None
+        result, code, _ = run_git_command(["symbolic-ref", "--quiet", "--short", "HEAD"], check=False, cwd=self.cwd)
+        return result if code == 0 and result else None
+
+    def read_file(self, rev, path):
+        """Retorna o conteúdo de um arquivo em uma revisão (ex: HEAD:fxmanifest.lua), ou None"""
+        content = self.read_object(f"{rev}:{path.replace(chr(92), '/')}")
+        if content is None:
+            return None
+        return content.decode('utf-8', errors='replace')
+
+    def commit_info(self, rev):
+        """Retorna os metadados de um commit (hash, tree, parents, committer_time, committer_tz, message)"""
+        try:
+            found = self._native(f"{rev}^{{commit}}")
+            return parse_commit(found[0], found[2]) if found else None
+        except NativeGitError:
+            pass
+        parts, content = self._request("--batch", f"{rev}^{{commit}}")
+        if not parts or parts[1] != "commit":
+            return None
+        return parse_commit(parts[0], content)
+
+    def close(self):
+        """Encerra todos os processos da sessão"""
+        with self._lock:
+            for mode in list(self._procs):
+                self._stop(mode)
+
+def parse_git_tz(offset):
+    """Converte um fuso no formato do Git (ex: -0300) para datetime.timezone"""
+    try:
+        sign = -1 if offset.startswith('-') else 1
+        minutes = int(offset[1:3]) * 60 + int(offset[3:5])
+        return timezone(sign * timedelta(minutes=minutes))
+    except (ValueError, IndexError):
+        return timezone.utc
+
+_git_sessions = {}
+_git_sessions_lock = threading.Lock()
+
+def get_git_session(cwd=None):
+    """Retorna a sessão de consulta Git do repositório (criada sob demanda e reutilizada)"""
+    if cwd is None:
+        cwd = REPO_PATH
+    key = os.path.abspath(cwd)
+    with _git_sessions_lock:
+        session = _git_sessions.get(key)
+        if session is None:
+            session = GitQuerySession(cwd)
+            _git_sessions[key] = session
+        return session
+
+def close_git_sessions():
+    """Encerra todas as sessões de consulta Git abertas"""
+    with _git_sessions_lock:
+        for session in _git_sessions.values():
+            session.close()
+        _git_sessions.clear()
+
+class CycleReport:
+    """Resumo de um ciclo de verificação, usado pelo agendador para escolher o próximo intervalo"""
+
+    def __init__(self):
+        self.changed = False  # Algo novo foi detectado (remoto, arquivo de versão ou fxmanifest)
+        self.remote_error = False  # Falha de remoto ou de autenticação (fetch, ls-remote, push)
+
+_cycle_local = threading.local()
+
+def mark_cycle(changed=False, remote_error=False):
+    """Registra eventos no relatório do ciclo em execução na thread atual (se houver)"""
+    report = getattr(_cycle_local, "report", None)
+    if report is None:
+        return
+    if changed:
+        report.changed = True
+        MAINTENANCE.notify_change()
+    if remote_error:
+        report.remote_error = True
+
+# Linha final de progresso do git com o volume transferido (ex: "Writing objects: 100% (3/3), 1.20 KiB | ...")
+GIT_TRANSFER_PATTERN = re.compile(r"(?:Receiving|Unpacking|Writing) objects:\s+100%[^,\n\r]*,\s*([\d.]+)\s*(bytes|KiB|MiB|GiB)")
+GIT_TRANSFER_UNITS = {"bytes": 1, "KiB": 1024, "MiB": 1024 ** 2, "GiB": 1024 ** 3}
+
+def new_cycle_stats():
+    """Contadores de um único ciclo (processos, tempo por subcomando git, bytes transferidos)"""
+    return {"spawns": 0, "git_seconds": {}, "git_calls": {}, "transfer_bytes": {}}
+
+def _prom_label(value):
+    """Escapa um valor de label no formato texto do Prometheus"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class Metrics:
+    """Métricas acumuladas do processo: comandos git, processos criados, ciclos e bytes transferidos
+
+    Os mesmos eventos também são somados no ciclo em execução na thread atual
+    (_cycle_local.stats), que vai para o log JSON ao final de cada ciclo.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.git_seconds = {}  # subcomando -> [soma dos tempos, quantidade]
+        self.spawns = {}  # subcomando -> processos criados
+        self.transfer_bytes = {"fetch": 0, "push": 0}
+        self.cycles = {}  # alvo -> {"buckets": [...], "sum": s, "count": n, "last": s}
+        self.version_latency = {}  # (alvo, estágio) -> {"buckets": [...], "sum": s, "count": n}
+        self.pipeline_dropped = {}  # estágio -> versões superadas descartadas
+        self.maintenance_seconds = {}  # (repositório, etapa) -> [soma dos tempos, quantidade]
+        self.maintenance_queries = {}  # (repositório, consulta, fase) -> segundos da última medição
+
+    def record_spawn(self, subcommand):
+        """Conta um processo git criado"""
+        with self._lock:
+            self.spawns[subcommand] = self.spawns.get(subcommand, 0) + 1
+        stats = getattr(_cycle_local, "stats", None)
+        if stats is not None:
+            stats["spawns"] += 1
+
+    def record_git(self, subcommand, seconds):
+        """Registra a execução (e o tempo de parede) de um comando git"""
+        self.record_spawn(subcommand)
+        with self._lock:
+            entry = self.git_seconds.setdefault(subcommand, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += 1
+        stats = getattr(_cycle_local, "stats", None)
+        if stats is not None:
+            stats["git_seconds"][subcommand] = stats["git_seconds"].get(subcommand, 0.0) + seconds
+            stats["git_calls"][subcommand] = stats["git_calls"].get(subcommand, 0) + 1
+
+    def record_transfer(self, direction, stderr):
+        """Soma os bytes informados pelo progresso do git (fetch/push com --progress), se houver"""
+        matches = GIT_TRANSFER_PATTERN.findall(stderr or "")
+        if not matches:
+            return 0
+        amount, unit = matches[-1]
+        transferred = int(float(amount) * GIT_TRANSFER_UNITS[unit])
+        with self._lock:
+            self.transfer_bytes[direction] = self.transfer_bytes.get(direction, 0) + transferred
+        stats = getattr(_cycle_local, "stats", None)
+        if stats is not None:
+            stats["transfer_bytes"][direction] = stats["transfer_bytes"].get(direction, 0) + transferred
+        return transferred
+
+    def observe_cycle(self, target_name, seconds):
+        """Registra a latência de um ciclo no histograma do alvo e retorna o número do ciclo"""
+        with self._lock:
+            cycle = self.cycles.setdefault(target_name, {
+                "buckets": [0] * len(CYCLE_LATENCY_BUCKETS), "sum": 0.0, "count": 0, "last": 0.0})
+            for i, bound in enumerate(CYCLE_LATENCY_BUCKETS):
+                if seconds <= bound:
+                    cycle["buckets"][i] += 1
+            cycle["sum"] += seconds
+            cycle["count"] += 1
+            cycle["last"] = seconds
+            return cycle["count"]
+
+    def observe_version_latency(self, target_name, stage, seconds):
+        """Registra o tempo entre o commit e uma etapa da versão (deteccao, versao, fxmanifest)"""
+        if seconds is None:
+            return
+        with self._lock:
+            latency = self.version_latency.setdefault((target_name, stage), {
+                "buckets": [0] * len(VERSION_LATENCY_BUCKETS), "sum": 0.0, "count": 0})
+            for i, bound in enumerate(VERSION_LATENCY_BUCKETS):
+                if seconds <= bound:
+                    latency["buckets"][i] += 1
+            latency["sum"] += seconds
+            latency["count"] += 1
+
+    def record_pipeline_drop(self, stage):
+        """Conta uma versão descartada no pipeline por ter sido superada por outra mais nova"""
+        with self._lock:
+            self.pipeline_dropped[stage] = self.pipeline_dropped.get(stage, 0) + 1
+
+    def record_maintenance_step(self, repo, step, seconds):
+        """Registra o tempo de uma etapa de manutenção de um repositório"""
+        with self._lock:
+            entry = self.maintenance_seconds.setdefault((repo, step), [0.0, 0])
+            entry[0] += seconds
+            entry[1] += 1
+
+    def record_maintenance_timings(self, repo, phase, timings):
+        """Guarda os tempos das consultas medidas antes ou depois de uma manutenção"""
+        with self._lock:
+            for query, seconds in timings.items():
+                self.maintenance_queries[(repo, query, phase)] = seconds
+
+    def cycle_count(self, target_name):
+        """Quantos ciclos do alvo já terminaram"""
+        with self._lock:
+            cycle = self.cycles.get(target_name)
+            return cycle["count"] if cycle else 0
+
+    def render_prometheus(self):
+        """Gera o texto no formato de exposição do Prometheus"""
+        lines = []
+        with self._lock:
+            lines.append("# HELP version_updater_git_command_seconds Tempo de parede dos comandos git por subcomando")
+            lines.append("# TYPE version_updater_git_command_seconds summary")
+            for subcommand, (total, count) in sorted(self.git_seconds.items()):
+                label = _prom_label(subcommand)
+                lines.append(f'version_updater_git_command_seconds_sum{{subcommand="{label}"}} {total:.6f}')
+                lines.append(f'version_updater_git_command_seconds_count{{subcommand="{label}"}} {count}')
+            lines.append("# HELP version_updater_git_spawns_total Processos git criados")
+            lines.append("# TYPE version_updater_git_spawns_total counter")
+            for subcommand, count in sorted(self.spawns.items()):
+                lines.append(f'version_updater_git_spawns_total{{subcommand="{_prom_label(subcommand)}"}} {count}')
+            lines.append("# HELP version_updater_transfer_bytes_total Bytes transferidos informados pelo git")
+            lines.append("# TYPE version_updater_transfer_bytes_total counter")
+            for direction, total in sorted(self.transfer_bytes.items()):
+                lines.append(f'version_updater_transfer_bytes_total{{direction="{direction}"}} {total}')
+            lines.append("# HELP version_updater_cycle_seconds Latência dos ciclos de verificação")
+            lines.append("# TYPE version_updater_cycle_seconds histogram")
+            for name, cycle in sorted(self.cycles.items()):
+                label = _prom_label(name)
+                for bound, count in zip(CYCLE_LATENCY_BUCKETS, cycle["buckets"]):
+                    lines.append(f'version_updater_cycle_seconds_bucket{{target="{label}",le="{bound}"}} {count}')
+                lines.append(f'version_updater_cycle_seconds_bucket{{target="{label}",le="+Inf"}} {cycle["count"]}')
+                lines.append(f'version_updater_cycle_seconds_sum{{target="{label}"}} {cycle["sum"]:.6f}')
+                lines.append(f'version_updater_cycle_seconds_count{{target="{label}"}} {cycle["count"]}')
+            lines.append("# HELP version_updater_version_latency_seconds Tempo entre o commit e cada etapa da versão")
+            lines.append("# TYPE version_updater_version_latency_seconds histogram")
+            for (name, stage), latency in sorted(self.version_latency.items()):
+                labels = f'target="{_prom_label(name)}",stage="{stage}"'
+                for bound, count in zip(VERSION_LATENCY_BUCKETS, latency["buckets"]):
+                    lines.append(f'version_updater_version_latency_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'version_updater_version_latency_seconds_bucket{{{labels},le="+Inf"}} {latency["count"]}')
+                lines.append(f'version_updater_version_latency_seconds_sum{{{labels}}} {latency["sum"]:.6f}')
+                lines.append(f'version_updater_version_latency_seconds_count{{{labels}}} {latency["count"]}')
+            lines.append("# HELP version_updater_pipeline_dropped_total Versões superadas descartadas antes de um estágio")
+            lines.append("# TYPE version_updater_pipeline_dropped_total counter")
+            for stage, count in sorted(self.pipeline_dropped.items()):
+                lines.append(f'version_updater_pipeline_dropped_total{{stage="{stage}"}} {count}')
+            lines.append("# HELP version_updater_maintenance_seconds Tempo das etapas de manutenção dos repositórios")
+            lines.append("# TYPE version_updater_maintenance_seconds summary")
+            for (repo, step), (total, count) in sorted(self.maintenance_seconds.items()):
+                labels = f'repo="{_prom_label(repo)}",step="{step}"'
+                lines.append(f'version_updater_maintenance_seconds_sum{{{labels}}} {total:.6f}')
+                lines.append(f'version_updater_maintenance_seconds_count{{{labels}}} {count}')
+            lines.append("# HELP version_updater_maintenance_query_seconds Tempo das consultas antes e depois da última manutenção")
+            lines.append("# TYPE version_updater_maintenance_query_seconds gauge")
+            for (repo, query, phase), seconds in sorted(self.maintenance_queries.items()):
+                labels = f'repo="{_prom_label(repo)}",query="{query}",phase="{phase}"'
+                lines.append(f'version_updater_maintenance_query_seconds{{{labels}}} {seconds:.6f}')
+        with _fetch_stats_lock:
+            fetch_stats = dict(FETCH_STATS)
+        lines.append("# HELP version_updater_fetch_total Fetches por resultado")
+        lines.append("# TYPE version_updater_fetch_total counter")
+        for result, count in sorted(fetch_stats.items()):
+            lines.append(f'version_updater_fetch_total{{result="{result}"}} {count}')
+        lines.append("# HELP version_updater_push_queue_depth Commits aguardando push")
+        lines.append("# TYPE version_updater_push_queue_depth gauge")
+        lines.append(f"version_updater_push_queue_depth {PUSH_QUEUE.depth()}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, record):
+        """Grava o arquivo Prometheus e acrescenta o registro do ciclo ao log JSON"""
+        try:
+            write_file_atomic(METRICS_PROM_FILE, self.render_prometheus().encode('utf-8'))
+        except OSError as e:
+            print(f"Aviso: Não foi possível gravar as métricas em {METRICS_PROM_FILE}: {e}")
+        with self._lock:
+            try:
+                rotate_log_file(METRICS_LOG_FILE, METRICS_LOG_MAX_BYTES, METRICS_LOG_BACKUPS)
+                with open(METRICS_LOG_FILE, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            except OSError as e:
+                print(f"Aviso: Não foi possível gravar o log de métricas em {METRICS_LOG_FILE}: {e}")
+
+METRICS = Metrics()
+
+def rotate_log_file(path, max_bytes, backups):
+    """Rotaciona path -> path.1 -> ... -> path.N quando o arquivo passa de max_bytes"""
+    try:
+        if os.path.getsize(path) < max_bytes:
+            return
+    except OSError:
+        return
+    for i in range(backups - 1, 0, -1):
+        if os.path.exists(f"{path}.{i}"):
+            os.replace(f"{path}.{i}", f"{path}.{i + 1}")
+    if backups > 0:
+        os.replace(path, f"{path}.1")
+    else:
+        os.remove(path)
+
+_profile_lock = threading.Lock()
+_profile_deferred = set()  # Alvos cujo ciclo a perfilar coincidiu com o perfil de outro alvo
+
+def is_shallow_repo(git_dir):
+    """Indica se o repositório é raso (possui o arquivo shallow)"""
+    return os.path.exists(os.path.join(git_dir, "shallow"))
+
+def ensure_metadata_clone(target):
+    """Cria (se necessário) o clone de metadados do alvo: bare, parcial, raso e sem tags
+
+    O clone guarda apenas commits de development e main (filtro METADATA_CLONE_FILTER,
+    profundidade METADATA_CLONE_DEPTH); os binários dos mapas nunca são baixados.
+    Retorna True se o clone está pronto.
+    """
+    if os.path.exists(os.path.join(target.repo_path, "HEAD")):
+        return True
+
+    url = target.remote_url
+    if not url:
+        url, code, _ = run_git_command(["remote", "get-url", "origin"], check=False, cwd=target.source_path)
+        if code != 0 or not url:
+            print(f"Erro: Não foi possível descobrir a URL do remoto de {target.source_path} (configure remote_url)")
+            return False
+
+    print(f"Criando clone de metadados em {target.repo_path} (filtro {METADATA_CLONE_FILTER}, profundidade {METADATA_CLONE_DEPTH})...")
+    os.makedirs(os.path.dirname(target.repo_path), exist_ok=True)
+    _, code, stderr = run_git_command(["init", "--bare", target.repo_path], check=False,
+                                      cwd=os.path.dirname(target.repo_path))
+    if code != 0:
+        print(f"Erro ao criar o clone de metadados: {stderr}")
+        return False
+    for command in (
+        ["remote", "add", "origin", url],
+        ["config", "remote.origin.promisor", "true"],
+        ["config", "remote.origin.partialclonefilter", METADATA_CLONE_FILTER],
+        ["config", "remote.origin.tagOpt", "--no-tags"],
+    ):
+        run_git_command(command, check=False, cwd=target.repo_path)
+
+    refspecs = [f"+refs/heads/{branch}:refs/remotes/origin/{branch}" for branch in target.fetch_branches]
+    _, code, stderr = run_git_command(
+        ["fetch", "--no-tags", f"--filter={METADATA_CLONE_FILTER}", f"--depth={METADATA_CLONE_DEPTH}", "origin"] + refspecs,
+        check=False, cwd=target.repo_path
+    )
+    if code != 0:
+        print(f"Erro ao buscar o histórico inicial do clone de metadados: {stderr}")
+        mark_cycle(remote_error=True)
+        return False
+    return True
+
+def deepen_metadata_clone(target, dev_ref):
+    """Aprofunda o clone de metadados em METADATA_DEEPEN_STEP commits; retorna False se já está no limite"""
+    available, _, _ = run_git_command(["rev-list", "--count", dev_ref], check=False, cwd=target.repo_path)
+    if available and int(available) >= METADATA_MAX_DEPTH:
+        print(f"Aviso: Clone de metadados já tem {available} commits (limite METADATA_MAX_DEPTH)")
+        return False
+
+    print(f"Aprofundando o clone de metadados em {METADATA_DEEPEN_STEP} commits...")
+    refspecs = [f"+refs/heads/{branch}:refs/remotes/origin/{branch}" for branch in target.fetch_branches]
+    with repo_lock(target.repo_path):
+        _, code, stderr = run_git_command(
+            ["fetch", "--no-tags", f"--deepen={METADATA_DEEPEN_STEP}", "origin"] + refspecs,
+            check=False, cwd=target.repo_path
+        )
+    if code != 0:
+        print(f"Aviso: Não foi possível aprofundar o clone de metadados: {stderr}")
+        mark_cycle(remote_error=True)
+        return False
+    return True
+
+def probe_remote_tips(cwd=None, branches=FETCH_BRANCHES):
+    """Consulta as pontas remotas das branches com git ls-remote (sem baixar objetos)
+
+    Retorna {branch: hash} ou None se o remoto não puder ser consultado.
+    """
+    refs = [f"refs/heads/{branch}" for branch in branches]
+    result, code, stderr = run_git_command(["ls-remote", "origin"] + refs, check=False, cwd=cwd)
+    if result is None or code != 0:
+        print(f"Aviso: Não foi possível consultar o remoto (ls-remote): {stderr}")
+        mark_cycle(remote_error=True)
+        return None
+    tips = {}
+    for line in result.split('\n'):
+        parts = line.split()
+        # Os padrões do ls-remote casam pelo final do nome (ex: refs/heads/x/main): só os exatos contam
+        if len(parts) == 2 and parts[1] in refs:
+            tips[parts[1][len("refs/heads/"):]] = parts[0]
+    return tips
+
+def fetch_monitored_repo(target=None):
+    """Faz um único fetch restrito (development e main, sem tags) do repositório monitorado
+
+    Antes do fetch, compara as pontas remotas (ls-remote) com as últimas vistas, que são
+    as refs origin/<branch> locais. Se nada mudou, o fetch é pulado. Retorna False
+    apenas quando o fetch foi necessário e falhou.
+    """
+    target = target or default_target()
+    cwd = target.repo_path
+    fetch_branches = target.fetch_branches
+
+    # Alvos que monitoram o mesmo repositório não buscam ao mesmo tempo
+    with repo_lock(cwd):
+        return _fetch_monitored_repo(cwd, fetch_branches)
+
+def _fetch_monitored_repo(cwd, fetch_branches):
+    """Corpo de fetch_monitored_repo()"""
+    remote_tips = probe_remote_tips(cwd, fetch_branches)
+    if remote_tips is not None:
+        session = get_git_session(cwd)
+        last_seen = {}
+        for branch in fetch_branches:
+            local_tip = session.resolve(f"refs/remotes/origin/{branch}")
+            if local_tip:
+                last_seen[branch] = local_tip
+        for branch in sorted(set(last_seen) - set(remote_tips)):
+            # Branch apagada no remoto: remove a ref de acompanhamento (como fetch --prune),
+            # senão as pontas nunca coincidem e o fetch roda em todo ciclo
+            _, code, _ = run_git_command(["update-ref", "-d", f"refs/remotes/origin/{branch}", last_seen.pop(branch)],
+                                         check=False, cwd=cwd)
+            if code == 0:
+                print(f"Branch {branch} não existe mais no remoto: origin/{branch} removida")
+        if remote_tips == last_seen:
+            with _fetch_stats_lock:
+                FETCH_STATS["skipped"] += 1
+            print(f"Remoto sem mudanças, fetch pulado (pulados: {FETCH_STATS['skipped']}, realizados: {FETCH_STATS['fetches']})")
+            return True
+        branches = [branch for branch in fetch_branches if branch in remote_tips]
+    else:
+        branches = list(fetch_branches)
+
+    if not branches:
+        print("Aviso: Nenhuma das branches monitoradas existe no remoto")
+        return True
+
+    refspecs = [f"+refs/heads/{branch}:refs/remotes/origin/{branch}" for branch in branches]
+    _, code, stderr = run_git_command(["fetch", "--progress", "--no-tags", "origin"] + refspecs, check=False, cwd=cwd)
+    METRICS.record_transfer("fetch", stderr)
+    if code != 0:
+        with _fetch_stats_lock:
+            FETCH_STATS["failures"] += 1
+        print(f"Aviso: Falha ao buscar atualizações do remoto: {stderr}")
+        mark_cycle(remote_error=True)
+        return False
+
+    with _fetch_stats_lock:
+        FETCH_STATS["fetches"] += 1
+    mark_cycle(changed=True)
+    print(f"Fetch realizado: {', '.join(branches)} (pulados: {FETCH_STATS['skipped']}, realizados: {FETCH_STATS['fetches']})")
+    return True
+
+class StateCache:
+    """Cache persistente do último estado observado de cada alvo
+
+    Guarda, por alvo, a impressão digital (ponta de development, ponta de main,
+    conteúdo do arquivo de versão e versão do fxmanifest.lua) do último ciclo
+    concluído sem falhas, a última versão publicada na main e a janela de commits
+    de development já comparada com a main (verificação incremental).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = {}
+        try:
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    self._data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Aviso: Cache de estado inválido em {path}, ignorando: {e}")
+            self._data = {}
+
+    def get(self, name):
+        """Retorna o estado salvo do alvo (dict vazio se não houver)"""
+        with self._lock:
+            return dict(self._data.get(name, {}))
+
+    def update(self, name, **values):
+        """Atualiza o estado do alvo e grava o arquivo"""
+        with self._lock:
+            self._data.setdefault(name, {}).update(values)
+            try:
+                tmp_path = self.path + ".tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self._data, f, indent=2)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"Aviso: Não foi possível gravar o cache de estado: {e}")
+
+_state_cache = None
+_state_cache_lock = threading.Lock()
+
+def get_state_cache():
+    """Retorna o cache de estado (carregado do disco na primeira chamada)"""
+    global _state_cache
+    with _state_cache_lock:
+        if _state_cache is None:
+            _state_cache = StateCache(STATE_CACHE_FILE)
+        return _state_cache
+
+class VersionHistory:
+    """Índice somente-acréscimo das versões geradas (versão -> commit, datas de commit e publicação)
+
+    Cada alteração vira uma linha JSON no fim de HISTORY_FILE; ao carregar, linhas
+    do mesmo recurso e versão são mescladas. Os registros são chaveados por
+    (recurso, versão): um canal na mesma ponta da branch de referência gera a mesma
+    string de versão sem sobrescrever o registro do recurso principal. Em memória há
+    um dict por chave, um índice versão -> recursos (consulta O(1)) e uma lista
+    ordenada por data de publicação (consultas por intervalo). Quando há
+    HISTORY_COMPACT_MIN_GARBAGE linhas substituídas, o arquivo é reescrito com uma
+    linha por registro.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._records = {}  # (recurso, versão) -> registro
+        self._resources = {}  # versão -> recursos com essa versão, em ordem de registro
+        self._by_date = []  # (published_at, versão, recurso), ordenada
+        self._lines = 0
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Linha incompleta (ex: processo encerrado durante a escrita)
+                        print(f"Aviso: Linha inválida ignorada no histórico de versões {path}")
+                        continue
+                    self._merge(entry)
+                    self._lines += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Aviso: Não foi possível ler o histórico de versões {path}: {e}")
+
+    def _key(self, version, resource):
+        """Chave do registro; sem recurso (linhas antigas), usa o primeiro registro da versão"""
+        if resource is None:
+            resources = self._resources.get(version)
+            resource = resources[0] if resources else ""
+        return resource, version
+
+    def _merge(self, entry):
+        """Aplica uma linha do histórico ao índice em memória"""
+        version = entry.get("version")
+        if not version:
+            return
+        key = self._key(version, entry.get("resource"))
+        record = self._records.get(key)
+        if record is None:
+            record = self._records[key] = {"version": version}
+            if key[0]:
+                record["resource"] = key[0]
+            self._resources.setdefault(version, []).append(key[0])
+        elif "published_at" in entry and "published_at" in record:
+            entry = {k: v for k, v in entry.items() if k != "published_at"}
+        record.update(entry)
+        if "published_at" in entry:
+            bisect.insort(self._by_date, (entry["published_at"], version, key[0]))
+
+    def record(self, version, resource=None, **fields):
+        """Registra (ou completa) a versão de um recurso; só grava os campos que mudaram"""
+        with self._lock:
+            key = self._key(version, resource)
+            current = self._records.get(key, {})
+            changes = {k: v for k, v in fields.items() if v is not None and current.get(k) != v}
+            if key not in self._records:
+                changes.setdefault("published_at", round(time.time(), 3))
+            elif not changes:
+                return False
+            entry = dict(changes, version=version)
+            if key[0]:
+                entry["resource"] = key[0]
+            self._merge(entry)
+            try:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                self._lines += 1
+            except OSError as e:
+                print(f"Aviso: Não foi possível gravar o histórico de versões: {e}")
+                return True
+            if self._lines - len(self._records) >= HISTORY_COMPACT_MIN_GARBAGE:
+                self._compact()
+            return True
+
+    def lookup(self, version, resource=None):
+        """Registro da versão (commit, committed_at, published_at...), ou None
+
+        Sem `resource`, retorna o primeiro registro da versão (o do recurso principal).
+        """
+        with self._lock:
+            record = self._records.get(self._key(version, resource))
+            return dict(record) if record else None
+
+    def lookup_all(self, version):
+        """Todos os registros da versão (um por recurso), em ordem de registro"""
+        with self._lock:
+            return [dict(self._records[(resource, version)]) for resource in self._resources.get(version, [])]
+
+    def latest(self, resource=None, manifest_published=False, exclude=None):
+        """Último registro publicado, ou None
+
+        Opcionalmente só de um recurso, só com o fxmanifest.lua publicado
+        (`manifest_published`) e ignorando a versão `exclude`.
+        """
+        with self._lock:
+            for _, version, key_resource in reversed(self._by_date):
+                record = self._records[(key_resource, version)]
+                if resource is not None and record.get("resource") != resource:
+                    continue
+                if manifest_published and not record.get("manifest_published_at"):
+                    continue
+                if version != exclude:
+                    return dict(record)
+        return None
 
-def check_git_updates():
+    def between(self, start, end, resource=None):
+        """Registros publicados entre start e end (timestamps Unix), em ordem de publicação"""
+        with self._lock:
+            lo = bisect.bisect_left(self._by_date, (start,))
+            hi = bisect.bisect_right(self._by_date, (end, "\uffff", "\uffff"))
+            records = [dict(self._records[(key_resource, version)]) for _, version, key_resource in self._by_date[lo:hi]]
+        return [r for r in records if resource is None or r.get("resource") == resource]
+
+    def _compact(self):
+        """Reescreve o arquivo com uma linha por versão (gravação atômica)"""
+        lines = [json.dumps(self._records[(resource, version)], ensure_ascii=False)
+                 for _, version, resource in self._by_date]
+        try:
+            write_file_atomic(self.path, ("\n".join(lines) + "\n").encode('utf-8') if lines else b"")
+            self._lines = len(lines)
+        except OSError as e:
+            print(f"Aviso: Não foi possível compactar o histórico de versões: {e}")
+
+_version_history = None
+_version_history_lock = threading.Lock()
+
+def get_version_history():
+    """Retorna o histórico de versões (carregado do disco na primeira chamada)"""
+    global _version_history
+    with _version_history_lock:
+        if _version_history is None:
+            _version_history = VersionHistory(HISTORY_FILE)
+        return _version_history
+
+class FileLock:
+    """Lock exclusivo entre processos sobre um arquivo, mantido só enquanto o lease é lido/gravado
+
+    O update_version.ps1 abre o mesmo arquivo sem compartilhamento (FileShare.None),
+    o que também impede este lock de ser obtido enquanto ele grava o lease.
+    """
+
+    def __init__(self, path, timeout=None):
+        self.path = path
+        self.timeout = LEASE_LOCK_TIMEOUT if timeout is None else timeout
+        self._file = None
+
+    def __enter__(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                self._file = open(self.path, 'a+b')
+                if msvcrt is not None:
+                    self._file.seek(0)
+                    msvcrt.locking(self._file.fileno(), msvcrt.LK_NBLCK, 1)
+                elif fcntl is not None:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return self
+            except OSError:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"lock {self.path} ocupado há mais de {self.timeout}s")
+                time.sleep(0.05)
+
+    def __exit__(self, *exc_info):
+        try:
+            if msvcrt is not None:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            elif fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._file.close()
+            self._file = None
+
+class LeaseManager:
+    """Leases por alvo entre instâncias (processos ou hosts) que usam o mesmo repositório de versões
+
+    Cada alvo tem um arquivo de lease (JSON com dono, heartbeat e as últimas versões
+    publicadas) protegido por um arquivo de lock. A instância dona faz fetch, commits e
+    pushes do alvo e renova o heartbeat em segundo plano enquanto os ciclos avançam: um
+    ciclo (ou estágio do pipeline) em andamento há mais de LEASE_TTL segundos suspende
+    a renovação. As demais ficam em espera e só reaproveitam as versões publicadas pela
+    dona. Um lease sem heartbeat há mais de LEASE_TTL segundos (instância encerrada ou
+    travada) é reassumido pela próxima que tentar.
+    """
+
+    def __init__(self):
+        self.owner_id = f"{socket.gethostname()}:{os.getpid()}:{random.getrandbits(32):08x}"
+        self._lock = threading.Lock()
+        self._held = {}  # alvo -> (caminho do lock, caminho do lease)
+        self._working = {}  # alvo -> {id do trabalho: início (monotonic)} dos ciclos/estágios em andamento
+        self._stalled = set()  # Alvos com o heartbeat suspenso (já avisados)
+        self._heartbeat_thread = None
+
+    def paths(self, target):
+        """(arquivo de lock, arquivo de lease) do alvo"""
+        directory = LEASE_DIR
+        if not directory:
+            git_dir = os.path.join(target.versions_repo, ".git")
+            directory = git_dir if os.path.isdir(git_dir) else target.versions_repo
+        base = os.path.join(directory, "version_updater-" + re.sub(r'[^A-Za-z0-9_.-]', '_', target.name))
+        return base + ".lock", base + ".lease"
+
+    def _read(self, lease_path):
+        """Conteúdo do lease (vazio se não existir ou estiver corrompido)"""
+        try:
+            with open(lease_path, 'r', encoding='utf-8') as f:
+                lease = json.load(f)
+            return lease if isinstance(lease, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, lease_path, lease):
+        write_file_atomic(lease_path, json.dumps(lease, ensure_ascii=False, indent=2).encode('utf-8'))
+
+    def acquire(self, target):
+        """Assume (ou renova) o lease do alvo; retorna (True, lease) se esta instância é a dona"""
+        lock_path, lease_path = self.paths(target)
+        try:
+            with FileLock(lock_path):
+                lease = self._read(lease_path)
+                now = time.time()
+                owner = lease.get("owner")
+                age = now - float(lease.get("heartbeat_at") or 0)
+                if owner not in (None, self.owner_id) and age <= LEASE_TTL:
+                    return False, lease
+                if owner not in (None, self.owner_id):
+                    print(f"Lease de {target.name} abandonado por {owner} (sem heartbeat há {age:.0f}s) - reassumindo")
+                if owner != self.owner_id:
+                    lease["acquired_at"] = round(now, 3)
+                lease.update(owner=self.owner_id, host=socket.gethostname(), pid=os.getpid(),
+                             heartbeat_at=round(now, 3))
+                self._write(lease_path, lease)
+        except OSError as e:
+            print(f"Aviso: Não foi possível obter o lease de {target.name}: {e}")
+            return False, {}
+        with self._lock:
+            self._held[target.name] = (lock_path, lease_path)
+            if self._heartbeat_thread is None:
+                self._heartbeat_thread = threading.Thread(target=self._heartbeat, name="lease-heartbeat", daemon=True)
+                self._heartbeat_thread.start()
+        return True, lease
+
+    def begin_work(self, target):
+        """Marca o início de um ciclo/estágio do alvo; retorna o identificador para end_work()"""
+        token = object()
+        with self._lock:
+            self._working.setdefault(target.name, {})[token] = time.monotonic()
+        return token
+
+    def end_work(self, target, token):
+        """Marca o fim do ciclo/estágio iniciado com begin_work()"""
+        with self._lock:
+            work = self._working.get(target.name, {})
+            work.pop(token, None)
+            if not work:
+                self._working.pop(target.name, None)
+
+    def _stalled_for(self, name):
+        """Segundos do trabalho mais antigo em andamento do alvo, se passou de LEASE_TTL (senão None)"""
+        with self._lock:
+            started = list(self._working.get(name, {}).values())
+        elapsed = time.monotonic() - min(started) if started else 0
+        return elapsed if elapsed > LEASE_TTL else None
+
+    def _heartbeat(self):
+        """Renova periodicamente os leases desta instância; percebe quando um deles foi reassumido"""
+        while True:
+            time.sleep(LEASE_HEARTBEAT_INTERVAL)
+            with self._lock:
+                held = dict(self._held)
+            for name, (lock_path, lease_path) in held.items():
+                stalled = self._stalled_for(name)
+                if stalled is not None:
+                    # Ciclo travado (push preso, lock bloqueado): deixa o lease expirar para outra instância
+                    if name not in self._stalled:
+                        self._stalled.add(name)
+                        print(f"Aviso: Ciclo de {name} sem progresso há {stalled:.0f}s - heartbeat do lease suspenso")
+                    continue
+                self._stalled.discard(name)
+                try:
+                    with FileLock(lock_path):
+                        lease = self._read(lease_path)
+                        if lease.get("owner") != self.owner_id:
+                            print(f"Aviso: Lease de {name} foi assumido por {lease.get('owner')}")
+                            with self._lock:
+                                self._held.pop(name, None)
+                            continue
+                        lease["heartbeat_at"] = round(time.time(), 3)
+                        self._write(lease_path, lease)
+                except OSError as e:
+                    print(f"Aviso: Não foi possível renovar o lease de {name}: {e}")
+
+    def record_result(self, target, resource, version, commit=None):
+        """Grava no lease a versão publicada de um recurso, para as instâncias em espera reaproveitarem"""
+        with self._lock:
+            paths = self._held.get(target.name)
+        if paths is None:
+            return
+        lock_path, lease_path = paths
+        try:
+            with FileLock(lock_path):
+                lease = self._read(lease_path)
+                if lease.get("owner") != self.owner_id:
+                    return
+                lease.setdefault("results", {})[resource] = {
+                    "version": version, "commit": commit, "published_at": round(time.time(), 3)}
+                self._write(lease_path, lease)
+        except OSError as e:
+            print(f"Aviso: Não foi possível gravar o resultado no lease de {target.name}: {e}")
+
+    def release_all(self):
+        """Libera os leases desta instância (ao encerrar), mantendo as últimas versões publicadas"""
+        with self._lock:
+            held = dict(self._held)
+            self._held.clear()
+        for name, (lock_path, lease_path) in held.items():
+            try:
+                with FileLock(lock_path):
+                    lease = self._read(lease_path)
+                    if lease.get("owner") == self.owner_id:
+                        lease["owner"] = None
+                        self._write(lease_path, lease)
+            except OSError as e:
+                print(f"Aviso: Não foi possível liberar o lease de {name}: {e}")
+
+LEASES = LeaseManager()
+
+def reuse_lease_result(target, lease):
+    """Instância em espera: anuncia as versões publicadas pela dona do lease em vez de refazer o ciclo"""
+    age = time.time() - float(lease.get("heartbeat_at") or 0)
+    print(f"{target.name} está com {lease.get('owner')} (heartbeat há {age:.0f}s) - aguardando e reaproveitando o resultado")
+    for resource, result in sorted((lease.get("results") or {}).items()):
+        if result.get("version") and VERSION_REGISTRY.publish(resource, result["version"]):
+            print(f"Versão de {resource} publicada pela outra instância: {result['version']}")
+
+def read_fxmanifest_version(target):
+    """Lê a versão HYPE-... do fxmanifest.lua em disco, ou None"""
+    if not target.fxmanifest_path or not os.path.exists(target.fxmanifest_path):
+        return None
+    try:
+        with open(target.fxmanifest_path, 'r', encoding='utf-8') as f:
+            match = FXMANIFEST_VERSION_PATTERN.search(f.read())
+        return match.group(2) if match else None
+    except OSError:
+        return None
+
+class RefSnapshot:
+    """Retrato das refs do repositório monitorado, montado uma vez por ciclo
+
+    Guarda as pontas local e remota da branch de referência e da main. Os metadados
+    do commit de referência e as contagens ahead/behind entre referência e main são
+    consultados na primeira leitura e reaproveitados. Impressão digital, hash, data,
+    comparação local/remoto e verificação de ancestralidade leem daqui, então cada
+    consulta é feita uma única vez por ciclo. As pontas dos canais extras do alvo
+    são lidas no mesmo momento, então todos os canais saem do mesmo fetch.
+    """
+
+    def __init__(self, target):
+        self.target = target
+        self.branch = target.reference_branch
+        self._session = get_git_session(target.repo_path)
+        self.dev_local = self._session.resolve(f"refs/heads/{self.branch}")
+        self.dev_remote = self._session.resolve(f"refs/remotes/origin/{self.branch}")
+        self.main_local = self._session.resolve("refs/heads/main")
+        self.main_remote = self._session.resolve("refs/remotes/origin/main")
+        self._dev_commit = None
+        self._counts = None
+        self._channel_tips = {}
+        self._channel_commits = {}
+        for branch in target.channels:
+            self._channel_tips[branch] = self._resolve_branch(branch)
+
+    def _resolve_branch(self, branch):
+        """Ponta de uma branch qualquer (remota, ou local se não houver remota)"""
+        if branch == self.branch:
+            return self.dev_tip
+        if branch == "main":
+            return self.main_tip
+        return (self._session.resolve(f"refs/remotes/origin/{branch}")
+                or self._session.resolve(f"refs/heads/{branch}"))
+
+    @property
+    def dev_tip(self):
+        """Ponta da branch de referência (remota, ou local se não houver remota)"""
+        return self.dev_remote or self.dev_local
+
+    @property
+    def main_tip(self):
+        """Ponta da main (remota, ou local se não houver remota)"""
+        return self.main_remote or self.main_local
+
+    @property
+    def dev_ref(self):
+        """Nome da ref usada para a branch de referência (origin/<branch> ou <branch>), ou None"""
+        if self.dev_remote:
+            return f"origin/{self.branch}"
+        return self.branch if self.dev_local else None
+
+    @property
+    def main_ref(self):
+        """Nome da ref usada para a main (origin/main ou main), ou None"""
+        if self.main_remote:
+            return "origin/main"
+        return "main" if self.main_local else None
+
+    @property
+    def dev_commit(self):
+        """Metadados do commit na ponta da branch de referência (hash, committer_time...), ou None"""
+        if self._dev_commit is None and self.dev_tip:
+            self._dev_commit = self._session.commit_info(self.dev_tip)
+        return self._dev_commit
+
+    def ahead_behind(self):
+        """(commits da referência fora da main, commits da main fora da referência), ou None
+
+        A contagem fica no cache de estado junto com as pontas, então só é refeita
+        quando development ou main mudam.
+        """
+        if self._counts is None and self.dev_tip and self.main_tip:
+            tips = [self.dev_tip, self.main_tip]
+            cached = get_state_cache().get(self.target.name).get("ahead_behind")
+            if self.dev_tip == self.main_tip:
+                self._counts = (0, 0)
+            elif cached and cached.get("tips") == tips:
+                self._counts = tuple(cached["counts"])
+            else:
+                result, code, _ = run_git_command(
+                    ["rev-list", "--left-right", "--count", f"{self.dev_tip}...{self.main_tip}"],
+                    check=False, cwd=self.target.repo_path
+                )
+                parts = (result or "").split()
+                if code == 0 and len(parts) == 2:
+                    self._counts = (int(parts[0]), int(parts[1]))
+                    get_state_cache().update(self.target.name, ahead_behind={"tips": tips,
+                                                                             "counts": list(self._counts)})
+        return self._counts
+
+    def channel_tip(self, branch):
+        """Ponta da branch de um canal (lida junto com as demais refs do retrato)"""
+        if branch not in self._channel_tips:
+            self._channel_tips[branch] = self._resolve_branch(branch)
+        return self._channel_tips[branch]
+
+    def channel_commit(self, branch):
+        """Metadados do commit na ponta da branch de um canal, ou None"""
+        if branch == self.branch:
+            return self.dev_commit
+        if branch not in self._channel_commits:
+            tip = self.channel_tip(branch)
+            self._channel_commits[branch] = self._session.commit_info(tip) if tip else None
+        return self._channel_commits[branch]
+
+def get_ref_snapshot(target):
+    """Retrato das refs do ciclo em execução (ou um novo, fora de um ciclo)"""
+    snapshot = getattr(_cycle_local, "snapshot", None)
+    if snapshot is not None and snapshot.target is target:
+        return snapshot
+    return RefSnapshot(target)
+
+def compute_fingerprint(target):
+    """Impressão digital do estado atual do alvo (lida do retrato de refs do ciclo)"""
+    snapshot = get_ref_snapshot(target)
+    return {
+        "dev_tip": snapshot.dev_tip,
+        "main_tip": snapshot.main_tip,
+        "channels": {branch: [snapshot.channel_tip(branch), get_current_version(target.channel(branch))]
+                     for branch in sorted(target.channels)},
+        "version_file": get_current_version(target),
+        "manifest_version": read_fxmanifest_version(target),
+        "window": DEV_COMMITS_WINDOW,
+    }
+
+def pipeline_key(fingerprint, version_string):
+    """Identidade de uma mudança no pipeline: pontas das branches e versão gerada
+
+    Ignora o conteúdo dos arquivos de versão e do fxmanifest.lua, que os próprios
+    estágios reescrevem enquanto o job está a caminho.
+    """
+    return {
+        "dev_tip": fingerprint["dev_tip"],
+        "main_tip": fingerprint["main_tip"],
+        "channels": {branch: tip for branch, (tip, _) in fingerprint["channels"].items()},
+        "version": version_string,
+    }
+
+def check_git_updates(target=None):
     """Verifica se há atualizações no repositório remoto"""
-    print(f"Verificando atualizações no repositório (branch: {REFERENCE_BRANCH})...")
-    
-    # Busca atualizações do remoto
-    run_git_command("git fetch origin", check=False)
+    target = target or default_target()
+    print(f"Verificando atualizações no repositório (branch: {target.reference_branch})...")
     
     # Compara branch de referência local com remoto
-    local_commit, _, _ = run_git_command(f"git rev-parse {REFERENCE_BRANCH}")
-    remote_commit, _, _ = run_git_command(f"git rev-parse origin/{REFERENCE_BRANCH}")
+    snapshot = get_ref_snapshot(target)
+    local_commit = snapshot.dev_local
+    remote_commit = snapshot.dev_remote
+    
+    # O clone de metadados só tem as refs remotas, não há branch local para comparar
+    if target.metadata_only and remote_commit:
+        return True, remote_commit
     
     if local_commit and remote_commit:
         if local_commit != remote_commit:
@@ -70,107 +1968,295 @@ def check_git_updates():
         # Tenta pegar o último commit local
         return True, local_commit
 
-def get_commit_hash():
+def get_commit_hash(target=None):
     """Obtém o hash do último commit da branch de referência"""
-    # Tenta pegar da branch remota primeiro, depois local
-    commit_hash, _, _ = run_git_command(f"git rev-parse origin/{REFERENCE_BRANCH}")
-    if not commit_hash:
-        # Se não encontrar no remoto, tenta local
-        commit_hash, _, _ = run_git_command(f"git rev-parse {REFERENCE_BRANCH}")
+    target = target or default_target()
+    # Branch remota primeiro, depois local
+    commit_hash = get_ref_snapshot(target).dev_tip
     if commit_hash:
         # Retorna primeiros 7 caracteres em maiúsculas
         return commit_hash[:7].upper()
     return None
 
-def get_commit_date():
+def get_commit_date(target=None):
     """Obtém a data do último commit da branch de referência"""
-    # Tenta pegar da branch remota primeiro, depois local
-    date_str, _, _ = run_git_command(f"git log -1 origin/{REFERENCE_BRANCH} --format=%cd --date=format:%d.%m-%H.%M")
-    if not date_str:
-        # Se não encontrar no remoto, tenta local
-        date_str, _, _ = run_git_command(f"git log -1 {REFERENCE_BRANCH} --format=%cd --date=format:%d.%m-%H.%M")
-    return date_str if date_str else datetime.now().strftime("%d.%m-%H.%M")
+    target = target or default_target()
+    # Branch remota primeiro, depois local
+    return format_commit_date(get_ref_snapshot(target).dev_commit)
+
+def format_commit_date(info):
+    """Data do commit no formato da versão (DD.MM-HH.MM); sem commit, usa a data atual"""
+    if info and info["committer_time"] is not None:
+        # Mesmo resultado de --date=format:%d.%m-%H.%M (fuso horário do próprio commit)
+        commit_date = datetime.fromtimestamp(info["committer_time"], info["committer_tz"])
+        return commit_date.strftime("%d.%m-%H.%M")
+    return datetime.now().strftime("%d.%m-%H.%M")
 
 def create_version_string(commit_hash, date_str):
     """Cria a string de versão no formato: HYPE-DD.MM-HH.MM-COMMIT"""
     return f"HYPE-{date_str}-{commit_hash}"
 
-def get_current_version():
+def update_channel_versions(target):
+    """Gera e grava a versão de cada canal extra do alvo a partir do retrato do ciclo
+
+    Cada canal custa apenas leituras do retrato (ponta e metadados do commit); só há
+    processos git quando um arquivo de versão muda e precisa ser commitado.
+    Retorna False se algum commit de canal falhou.
+    """
+    snapshot = get_ref_snapshot(target)
+    success = True
+    for branch in sorted(target.channels):
+        channel_target = target.channel(branch)
+        tip = snapshot.channel_tip(branch)
+        if not tip:
+            print(f"Aviso: Branch {branch} não encontrada, canal {channel_target.version_file} ignorado")
+            continue
+        info = snapshot.channel_commit(branch)
+        version_string = create_version_string(tip[:7].upper(), format_commit_date(info))
+        print(f"Canal {branch}: versão {version_string} ({channel_target.version_file})")
+        with repo_lock(target.versions_repo):
+            file_changed = update_version_file(version_string, channel_target)
+            if file_changed:
+                mark_cycle(changed=True)
+                if not commit_and_push(version_string, channel_target):
+                    print(f"Aviso: Problema ao fazer commit do {channel_target.version_file}")
+                    success = False
+        if file_changed or get_current_version(channel_target) == version_string:
+            resource = os.path.basename(channel_target.version_file)
+            VERSION_REGISTRY.publish(resource, version_string)
+            LEASES.record_result(target, resource, version_string, info["hash"] if info else None)
+            get_version_history().record(version_string, resource=resource,
+                                         commit=info["hash"] if info else None,
+                                         committed_at=info["committer_time"] if info else None,
+                                         main=snapshot.main_tip)
+    return success
+
+def get_current_version(target=None):
     """Lê a versão atual do arquivo"""
+    target = target or default_target()
     try:
-        if os.path.exists(VERSION_FILE):
-            with open(VERSION_FILE, 'r', encoding='utf-8') as f:
+        if os.path.exists(target.version_path):
+            with open(target.version_path, 'r', encoding='utf-8') as f:
                 return f.read().strip()
         return None
     except Exception as e:
         print(f"Erro ao ler arquivo de versão: {e}")
         return None
 
-def update_version_file(version_string):
+def update_version_file(version_string, target=None):
     """Atualiza o arquivo de versão e retorna True se houve mudança"""
+    target = target or default_target()
     try:
         # Verifica se a versão já é a mesma
-        current_version = get_current_version()
+        current_version = get_current_version(target)
         if current_version == version_string:
             print(f"Versão já está atualizada: {version_string}")
             return False  # Não houve mudança
         
-        with open(VERSION_FILE, 'w', encoding='utf-8') as f:
+        with open(target.version_path, 'w', encoding='utf-8') as f:
             f.write(version_string)
-        print(f"Arquivo {VERSION_FILE} atualizado com: {version_string}")
+        print(f"Arquivo {target.version_file} atualizado com: {version_string}")
         return True  # Houve mudança
     except Exception as e:
         print(f"Erro ao atualizar arquivo de versão: {e}")
         return False
 
-def update_fxmanifest(version_string):
+def write_file_atomic(path, data):
+    """Grava o arquivo de forma atômica (arquivo temporário na mesma pasta + rename)"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.basename(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        try:
+            os.chmod(tmp_path, os.stat(path).st_mode)
+        except OSError:
+            pass
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def update_fxmanifest(version_string, target=None):
     """Atualiza a versão no arquivo fxmanifest.lua e retorna True se houve mudança"""
+    target = target or default_target()
+    fxmanifest_path = target.fxmanifest_path
     try:
-        if not os.path.exists(FXMANIFEST_PATH):
-            print(f"Aviso: Arquivo fxmanifest.lua não encontrado em {FXMANIFEST_PATH}")
+        if not fxmanifest_path or not os.path.exists(fxmanifest_path):
+            print(f"Aviso: Arquivo fxmanifest.lua não encontrado em {fxmanifest_path}")
             return False
         
-        # Lê o arquivo
-        with open(FXMANIFEST_PATH, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
+        # Lê o arquivo em bytes (preserva as quebras de linha originais)
+        with open(fxmanifest_path, 'rb') as f:
+            content = f.read()
         
-        # Procura pela linha com version e atualiza
-        updated = False
-        old_version = None
-        for i, line in enumerate(lines):
-            # Procura por padrões como: version 'HYPE-...' ou version "HYPE-..."
-            # Padrão para encontrar version 'HYPE-...' ou version "HYPE-..."
-            pattern = r"(version\s+['\"])(HYPE-[^'\"]+)(['\"])"
-            match = re.search(pattern, line)
-            if match:
-                old_version = match.group(2)
-                # Verifica se a versão já é a mesma
-                if old_version == version_string:
-                    print(f"Versão no fxmanifest.lua já está atualizada: {version_string}")
-                    return False
-                quote_char = match.group(1)[-1]  # Pega a aspas usada
-                # Substitui apenas a versão, mantendo as aspas
-                new_line = re.sub(pattern, f"version {quote_char}{version_string}{quote_char}", line)
-                if new_line != line:
-                    lines[i] = new_line
-                    updated = True
-                    print(f"Arquivo fxmanifest.lua atualizado: {old_version} -> {version_string}")
-                    break
+        # Procura pela linha com version 'HYPE-...' ou version "HYPE-..."
+        match = FXMANIFEST_VERSION_BYTES_PATTERN.search(content)
+        if not match:
+            print(f"Aviso: Não foi possível encontrar a linha 'version' no fxmanifest.lua")
+            return False
         
-        if updated:
-            # Salva o arquivo
-            with open(FXMANIFEST_PATH, 'w', encoding='utf-8') as f:
-                f.writelines(lines)
-            return True
-        else:
-            if old_version is None:
-                print(f"Aviso: Não foi possível encontrar a linha 'version' no fxmanifest.lua")
+        old_version = match.group(2).decode('utf-8')
+        # Verifica se a versão já é a mesma
+        if old_version == version_string:
+            print(f"Versão no fxmanifest.lua já está atualizada: {version_string}")
             return False
+        
+        # Substitui apenas a versão, mantendo as aspas, e salva o arquivo
+        new_content = content[:match.start(2)] + version_string.encode('utf-8') + content[match.end(2):]
+        write_file_atomic(fxmanifest_path, new_content)
+        print(f"Arquivo fxmanifest.lua atualizado: {old_version} -> {version_string}")
+        return True
             
     except Exception as e:
         print(f"Erro ao atualizar fxmanifest.lua: {e}")
         return False
 
+class ManifestIndex:
+    """Índice persistente dos fxmanifest.lua de uma árvore de recursos
+
+    Para cada arquivo guarda mtime, tamanho, offset e tamanho em bytes da versão e a
+    própria versão. Enquanto mtime e tamanho não mudam, o arquivo nem é lido; manifests
+    sem linha de versão também ficam registrados (versão None) para não serem relidos
+    a cada ciclo. A lista de manifests só é refeita (os.walk) a cada
+    MANIFEST_RESCAN_INTERVAL segundos, e o índice só é gravado quando algo mudou.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._dirty = False  # Há alterações ainda não gravadas em disco
+        self._data = {"roots": {}, "files": {}}
+        try:
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    self._data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Aviso: Índice de fxmanifest inválido em {path}, recriando: {e}")
+
+    def manifests(self, root):
+        """Lista os fxmanifest.lua sob root (usa a última varredura enquanto ela for recente)"""
+        root = os.path.abspath(root)
+        with self._lock:
+            cached = self._data["roots"].get(root)
+        if cached and time.time() - cached["scanned_at"] < MANIFEST_RESCAN_INTERVAL:
+            return cached["paths"]
+
+        paths = []
+        for current, dirs, files in os.walk(root):
+            dirs[:] = [d for d in dirs if d != ".git"]
+            if "fxmanifest.lua" in files:
+                paths.append(os.path.join(current, "fxmanifest.lua"))
+        paths.sort()
+        with self._lock:
+            self._data["roots"][root] = {"scanned_at": time.time(), "paths": paths}
+            self._dirty = True
+        return paths
+
+    def entry(self, manifest_path):
+        """Retorna a entrada do arquivo, relendo-o apenas se mtime/tamanho mudaram (None se não tem versão)"""
+        try:
+            st = os.stat(manifest_path)
+        except OSError:
+            return None
+        with self._lock:
+            entry = self._data["files"].get(manifest_path)
+        if entry and entry["mtime_ns"] == st.st_mtime_ns and entry["size"] == st.st_size:
+            return entry if entry["version"] is not None else None
+        with open(manifest_path, 'rb') as f:
+            content = f.read()
+        return self._store(manifest_path, content, os.stat(manifest_path))
+
+    def _store(self, manifest_path, content, st):
+        """Registra o offset da versão encontrada em content (None se não há versão)"""
+        match = FXMANIFEST_VERSION_BYTES_PATTERN.search(content)
+        if match:
+            entry = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "offset": match.start(2),
+                     "length": match.end(2) - match.start(2), "version": match.group(2).decode('utf-8')}
+        else:
+            # Entrada negativa: só volta a ler o arquivo quando mtime/tamanho mudarem
+            entry = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "version": None}
+        with self._lock:
+            if self._data["files"].get(manifest_path) != entry:
+                self._data["files"][manifest_path] = entry
+                self._dirty = True
+        return entry if match else None
+
+    def rewrite(self, manifest_path, entry, version_string):
+        """Troca a versão no offset indexado e grava o arquivo de forma atômica"""
+        with open(manifest_path, 'rb') as f:
+            content = f.read()
+        start, end = entry["offset"], entry["offset"] + entry["length"]
+        if content[start:end] != entry["version"].encode('utf-8'):
+            # O arquivo mudou desde a indexação: localiza a versão novamente
+            entry = self._store(manifest_path, content, os.stat(manifest_path))
+            if entry is None:
+                return False
+            start, end = entry["offset"], entry["offset"] + entry["length"]
+        new_content = content[:start] + version_string.encode('utf-8') + content[end:]
+        write_file_atomic(manifest_path, new_content)
+        self._store(manifest_path, new_content, os.stat(manifest_path))
+        return True
+
+    def save(self):
+        """Grava o índice em disco, se houve alterações desde a última gravação"""
+        with self._lock:
+            if not self._dirty:
+                return
+            try:
+                write_file_atomic(self.path, json.dumps(self._data).encode('utf-8'))
+                self._dirty = False
+            except OSError as e:
+                print(f"Aviso: Não foi possível gravar o índice de fxmanifest: {e}")
+
+_manifest_index = None
+_manifest_index_lock = threading.Lock()
+
+def get_manifest_index():
+    """Retorna o índice de fxmanifest.lua (carregado do disco na primeira chamada)"""
+    global _manifest_index
+    with _manifest_index_lock:
+        if _manifest_index is None:
+            _manifest_index = ManifestIndex(MANIFEST_INDEX_FILE)
+        return _manifest_index
+
+def update_fxmanifests_bulk(version_string, root):
+    """Atualiza a versão de todos os fxmanifest.lua sob root e retorna a lista dos alterados
+
+    Arquivos cujo mtime/tamanho não mudaram e que já têm a versão não são lidos;
+    apenas os desatualizados são reescritos, em paralelo e de forma atômica.
+    """
+    index = get_manifest_index()
+    manifests = index.manifests(root)
+    outdated = []
+    for manifest_path in manifests:
+        try:
+            entry = index.entry(manifest_path)
+        except OSError as e:
+            print(f"Aviso: Não foi possível ler {manifest_path}: {e}")
+            continue
+        if entry and entry["version"] != version_string:
+            outdated.append((manifest_path, entry))
+
+    changed = []
+    if outdated:
+        with ThreadPoolExecutor(max_workers=MANIFEST_WORKERS) as executor:
+            futures = {executor.submit(index.rewrite, path, entry, version_string): path for path, entry in outdated}
+            for future in futures:
+                path = futures[future]
+                try:
+                    if future.result():
+                        changed.append(path)
+                except OSError as e:
+                    print(f"Erro ao atualizar {path}: {e}")
+    index.save()
+
+    print(f"fxmanifest.lua em massa: {len(changed)} de {len(manifests)} atualizado(s) para {version_string}")
+    return changed
+
 def diagnose_auth_issue(current_dir):
     """Diagnostica problemas de autenticação do Git"""
     print("\n" + "=" * 50)
@@ -178,13 +2264,17 @@ def diagnose_auth_issue(current_dir):
     print("=" * 50)
     
     # Verifica configuração do remote
-    remote_result, _, _ = run_git_command("git remote -v", check=False, cwd=current_dir)
+    # As três consultas são independentes e rodam em paralelo
+    results = run_git_queries(
+        remote=lambda: run_git_command(["remote", "-v"], check=False, cwd=current_dir)[0],
+        user=lambda: run_git_command(["config", "user.name"], check=False, cwd=current_dir)[0],
+        email=lambda: run_git_command(["config", "user.email"], check=False, cwd=current_dir)[0],
+    )
+    remote_result, user_result, email_result = results["remote"], results["user"], results["email"]
     print(f"\nRemote configurado:")
     print(remote_result if remote_result else "Nenhum remote encontrado")
     
     # Verifica usuário Git configurado
-    user_result, _, _ = run_git_command("git config user.name", check=False, cwd=current_dir)
-    email_result, _, _ = run_git_command("git config user.email", check=False, cwd=current_dir)
     print(f"\nUsuário Git configurado:")
     print(f"  Nome: {user_result if user_result else 'Não configurado'}")
     print(f"  Email: {email_result if email_result else 'Não configurado'}")
@@ -200,142 +2290,313 @@ def diagnose_auth_issue(current_dir):
     
     print("\n" + "=" * 50)
 
-def are_last_15_dev_commits_in_main():
-    """Verifica se os 15 últimos commits da branch development estão presentes na branch main"""
+def resolve_branch_ref(branch, cwd=None):
+    """Retorna a ref (origin/<branch> ou <branch> local) que existe no repositório, ou None"""
+    session = get_git_session(cwd)
+    for ref in (f"origin/{branch}", branch):
+        if session.resolve(f"{ref}^{{commit}}"):
+            return ref
+    return None
+
+def find_dev_commits_missing_from_main(window=None, target=None):
+    """Retorna (commits_verificados, commits_faltando) dos últimos `window` commits de development
+
+    A janela e os commits faltando da última verificação ficam no cache de estado,
+    junto com as pontas de development e main daquele momento. A janela é sempre
+    relida da ponta de development (o rev-list ordena por data, então um merge de
+    commits antigos muda a janela de forma imprevisível), mas a presença na main só é
+    consultada para os commits novos e, se a main andou, para os que ainda faltavam:
+    um commit que já está na main continua nela enquanto a main só avança. Sem cache, com a janela
+    alterada ou com development/main reescritas, a janela inteira é recalculada com
+    duas consultas rev-list. Retorna (None, None) se não for possível consultar as branches.
+    """
+    target = target or default_target()
+    if window is None:
+        window = DEV_COMMITS_WINDOW
+
+    snapshot = get_ref_snapshot(target)
+    dev_ref = snapshot.dev_ref
+    if not dev_ref:
+        print("Aviso: Não foi possível obter os commits da branch development")
+        return None, None
+
+    main_ref = snapshot.main_ref
+    if not main_ref:
+        print("Aviso: Não foi possível obter o commit da branch main")
+        return None, None
+
+    state_cache = get_state_cache()
+    merged = state_cache.get(target.name).get("merged")
+    dev_commits, missing = _update_dev_commits_missing(target, window, snapshot, merged)
+    if dev_commits is None:
+        dev_commits, missing = _full_dev_commits_missing(target, window, dev_ref, main_ref)
+    if dev_commits is not None:
+        state_cache.update(target.name, merged={
+            "window": window, "dev": snapshot.dev_tip, "main": snapshot.main_tip,
+            "commits": dev_commits, "missing": missing,
+        })
+    return dev_commits, missing
+
+def _full_dev_commits_missing(target, window, dev_ref, main_ref):
+    """Recalcula a janela inteira (aprofundando o clone de metadados raso se preciso)"""
+    while True:
+        dev_commits, missing = _query_dev_commits_missing(target, window, dev_ref, main_ref)
+        # No clone de metadados raso, a janela pode não caber no histórico disponível
+        if dev_commits is None or not target.metadata_only or not is_shallow_repo(target.git_dir):
+            return dev_commits, missing
+        if len(dev_commits) >= window and (not missing or has_merge_base(target, dev_ref, main_ref)):
+            return dev_commits, missing
+        if not deepen_metadata_clone(target, dev_ref):
+            return dev_commits, missing
+
+def _update_dev_commits_missing(target, window, snapshot, merged):
+    """Atualiza a janela salva com os commits que chegaram desde a última verificação
+
+    Retorna (None, None) quando é preciso recalcular tudo (sem cache, janela alterada,
+    consulta com erro ou development/main reescritas).
+    """
+    dev_tip, main_tip = snapshot.dev_tip, snapshot.main_tip
+    if not merged or merged.get("window") != window or not dev_tip or not main_tip:
+        return None, None
+    old_dev, old_main = merged["dev"], merged["main"]
+    old_missing = set(merged["missing"])
+    if old_dev == dev_tip and old_main == main_tip:
+        return list(merged["commits"]), list(merged["missing"])
+
+    # Com development igual à main, tudo na janela está na main
+    contained = dev_tip == main_tip
+    cwd = target.repo_path
+    queries = {}
+    if old_main != main_tip and not contained:
+        # Só avanços da main preservam o que já foi confirmado
+        queries["main_ff"] = lambda: run_git_command(["merge-base", "--is-ancestor", old_main, main_tip],
+                                                     check=False, cwd=cwd)
+        if old_missing:
+            # Dos commits que faltavam, quais a main ainda não alcança
+            queries["still_missing"] = lambda: run_git_command(["rev-list"] + sorted(old_missing) + ["--not", main_tip],
+                                                               check=False, cwd=cwd)
+    if old_dev != dev_tip:
+        # Um commit anterior à ponta antiga que não estava na janela antiga não entra na
+        # nova (só há mais commits competindo), então os de fora da janela antiga são novos
+        queries["dev_ff"] = lambda: run_git_command(["merge-base", "--is-ancestor", old_dev, dev_tip],
+                                                    check=False, cwd=cwd)
+        queries["window"] = lambda: run_git_command(["rev-list", f"--max-count={window}", dev_tip],
+                                                    check=False, cwd=cwd)
+        if not contained:
+            queries["new_missing"] = lambda: run_git_command(
+                ["rev-list", f"--max-count={window}", dev_tip, "--not", old_dev, main_tip], check=False, cwd=cwd)
+    results = run_git_queries(**queries)
+
+    if "main_ff" in results and results["main_ff"][1] != 0:
+        print("Branch main foi reescrita desde a última verificação - recalculando a janela inteira")
+        return None, None
+    if "dev_ff" in results and results["dev_ff"][1] != 0:
+        print("Branch development foi reescrita desde a última verificação - recalculando a janela inteira")
+        return None, None
+    if any(result[0] is None or result[1] != 0 for key, result in results.items() if key not in ("main_ff", "dev_ff")):
+        return None, None
+
+    def commit_set(key):
+        return {commit for commit in (results[key][0] or "").split() if commit}
+
+    dev_commits = list(merged["commits"])
+    if "window" in results:
+        dev_commits = (results["window"][0] or "").split()
+        if not dev_commits:
+            return None, None
+    old_window = set(merged["commits"])
+    new_commits = [commit for commit in dev_commits if commit not in old_window]
+    if contained:
+        missing = []
+    else:
+        missing_new = commit_set("new_missing") if "new_missing" in results else set()
+        if "still_missing" in results:
+            old_missing &= commit_set("still_missing")
+        missing = [commit for commit in dev_commits if commit in missing_new or commit in old_missing]
+    print(f"Verificação incremental: {len(new_commits)} commit(s) novo(s) de development avaliado(s)"
+          f"{', main avançou' if old_main != main_tip else ''}")
+    return dev_commits, missing
+
+def has_merge_base(target, dev_ref, main_ref):
+    """Indica se development e main têm um ancestral comum no histórico disponível"""
+    _, code, _ = run_git_command(["merge-base", dev_ref, main_ref], check=False, cwd=target.repo_path)
+    return code == 0
+
+def _query_dev_commits_missing(target, window, dev_ref, main_ref):
+    """Consulta a janela de development e os commits dela que main não alcança"""
+    # Janela dos últimos N commits de development (mesma ordem do git log) e commits de
+    # development que main não alcança. Como o rev-list percorre os commits na mesma ordem
+    # da janela, os faltantes da janela estão entre os N primeiros. As consultas são
+    # independentes e rodam em paralelo.
+    results = run_git_queries(
+        window=lambda: run_git_command(["rev-list", f"--max-count={window}", dev_ref],
+                                       check=False, cwd=target.repo_path),
+        missing=lambda: run_git_command(["rev-list", f"--max-count={window}", dev_ref, "--not", main_ref],
+                                        check=False, cwd=target.repo_path),
+    )
+    window_result = results["window"][0]
+    missing_result, missing_code, _ = results["missing"]
+    dev_commits = [commit.strip() for commit in (window_result or "").split('\n') if commit.strip()]
+
+    if not dev_commits:
+        print("Aviso: Nenhum commit encontrado na branch development")
+        return None, None
+
+    if missing_result is None or missing_code != 0:
+        print("Aviso: Não foi possível comparar development com main")
+        return None, None
+
+    not_in_main = {commit.strip() for commit in missing_result.split('\n') if commit.strip()}
+    missing = [commit for commit in dev_commits if commit in not_in_main]
+    return dev_commits, missing
+
+def check_dev_commits_in_main(window=None, target=None):
+    """Verifica se os últimos commits de development estão na main e retorna (bool, commits_faltando)"""
+    target = target or default_target()
     try:
-        # Busca atualizações do remoto
-        run_git_command("git fetch origin", check=False, cwd=REPO_PATH)
-        
-        # Obtém os 15 últimos commits da branch development
-        dev_commits_result, _, _ = run_git_command(
-            f"git log origin/{REFERENCE_BRANCH} -15 --format=%H",
-            check=False,
-            cwd=REPO_PATH
-        )
-        
-        if not dev_commits_result:
-            # Tenta local
-            dev_commits_result, _, _ = run_git_command(
-                f"git log {REFERENCE_BRANCH} -15 --format=%H",
-                check=False,
-                cwd=REPO_PATH
-            )
-        
-        if not dev_commits_result:
-            print("Aviso: Não foi possível obter os commits da branch development")
-            return False
-        
-        # Separa os commits (um por linha)
-        dev_commits = [commit.strip() for commit in dev_commits_result.split('\n') if commit.strip()]
-        
-        if len(dev_commits) == 0:
-            print("Aviso: Nenhum commit encontrado na branch development")
-            return False
-        
+        dev_commits, missing = find_dev_commits_missing_from_main(window, target)
+        if dev_commits is None:
+            return False, []
+
         print(f"Verificando se os {len(dev_commits)} últimos commits de development estão na branch main...")
-        
-        # Verifica se cada commit está presente na branch main
-        main_commit, _, _ = run_git_command("git rev-parse origin/main", check=False, cwd=REPO_PATH)
-        if not main_commit:
-            main_commit, _, _ = run_git_command("git rev-parse main", check=False, cwd=REPO_PATH)
-        
-        if not main_commit:
-            print("Aviso: Não foi possível obter o commit da branch main")
-            return False
-        
-        commits_in_main = 0
-        commits_not_in_main = []
-        
-        for dev_commit in dev_commits:
-            # Verifica se o commit está presente na branch main
-            # Usa git branch --contains para verificar se main contém o commit
-            contains_result, contains_code, _ = run_git_command(
-                f"git branch --contains {dev_commit} origin/main",
-                check=False,
-                cwd=REPO_PATH
-            )
-            
-            # Se não encontrou no remoto, tenta local
-            if contains_code != 0 or not contains_result:
-                contains_result, contains_code, _ = run_git_command(
-                    f"git branch --contains {dev_commit} main",
-                    check=False,
-                    cwd=REPO_PATH
-                )
-            
-            # Alternativa: verifica se o commit é ancestral de main
-            if contains_code != 0 or not contains_result:
-                _, is_ancestor_code, _ = run_git_command(
-                    f"git merge-base --is-ancestor {dev_commit} {main_commit.strip()}",
-                    check=False,
-                    cwd=REPO_PATH
-                )
-                if is_ancestor_code == 0:
-                    commits_in_main += 1
-                    print(f"  ✓ Commit {dev_commit[:8]} está na branch main")
-                else:
-                    commits_not_in_main.append(dev_commit[:8])
-                    print(f"  ✗ Commit {dev_commit[:8]} NÃO está na branch main")
-            else:
-                commits_in_main += 1
-                print(f"  ✓ Commit {dev_commit[:8]} está na branch main")
-        
-        # Se todos os commits estão na main, retorna True
-        if commits_in_main == len(dev_commits):
+
+        commits_in_main = len(dev_commits) - len(missing)
+        if not missing:
             print(f"✓ Todos os {len(dev_commits)} últimos commits de development estão na branch main")
-            return True
-        else:
-            print(f"⚠ Apenas {commits_in_main} de {len(dev_commits)} últimos commits de development estão na branch main")
-            if commits_not_in_main:
-                print(f"  Commits faltando: {', '.join(commits_not_in_main)}")
-            return False
-            
+            return True, []
+
+        print(f"⚠ Apenas {commits_in_main} de {len(dev_commits)} últimos commits de development estão na branch main")
+        print(f"  Commits faltando: {', '.join(commit[:8] for commit in missing)}")
+        counts = get_ref_snapshot(target).ahead_behind()
+        if counts:
+            print(f"  development está {counts[0]} commit(s) à frente e {counts[1]} atrás da main")
+        return False, missing
+
     except Exception as e:
         print(f"Erro ao verificar se os últimos commits de development estão na main: {e}")
-        return False
+        return False, []
+
+def are_last_15_dev_commits_in_main(target=None):
+    """Verifica se os últimos DEV_COMMITS_WINDOW commits da branch development estão presentes na branch main"""
+    # Busca atualizações do remoto (fetch compartilhado e restrito)
+    fetch_monitored_repo(target)
+
+    all_in_main, _ = check_dev_commits_in_main(target=target)
+    return all_in_main
+
+def changed_paths(repo_path, paths, staged_only=False):
+    """Retorna quais de `paths` (relativos a `repo_path`, que pode ser uma subpasta do repositório) diferem de HEAD
+
+    Só as entradas do índice desses caminhos são consultadas (diff-index/diff-files
+    com pathspec literal), sem varrer a árvore: arquivos não rastreados ou modificados
+    em outras pastas não custam nada e um caminho que contém outro não gera falso
+    positivo. Um caminho que existe em disco mas não está no índice conta como novo.
+    Com `staged_only`, considera apenas o que já está no índice (após git add).
+    Os caminhos retornados (relativos a `repo_path`, --relative) usam "/" como separador.
+    """
+    paths = [path.replace('\\', '/') for path in paths]
+    pathspec = ["--"] + paths
+
+    def listed(result):
+        output, code, _ = result
+        return None if output is None or code != 0 else {path for path in output.split('\0') if path}
 
-def commit_fxmanifest_in_repo(version_string):
+    queries = {"staged": lambda: run_git_command(
+        ["--literal-pathspecs", "diff-index", "--cached", "--relative", "--name-only", "-z", "HEAD"] + pathspec,
+        check=False, cwd=repo_path)}
+    if not staged_only:
+        queries["worktree"] = lambda: run_git_command(
+            ["--literal-pathspecs", "diff-files", "--relative", "--name-only", "-z"] + pathspec, check=False, cwd=repo_path)
+        queries["tracked"] = lambda: run_git_command(
+            ["--literal-pathspecs", "ls-files", "--cached", "-z"] + pathspec, check=False, cwd=repo_path)
+    results = {name: listed(result) for name, result in run_git_queries(**queries).items()}
+    if results["staged"] is None:
+        # Sem HEAD (repositório sem commits) tudo que existe é novo
+        return {path for path in paths if os.path.exists(os.path.join(repo_path, path))}
+    changed = results["staged"]
+    if not staged_only:
+        changed |= results["worktree"] or set()
+        tracked = results["tracked"] or set()
+        changed |= {path for path in paths if path not in tracked and os.path.exists(os.path.join(repo_path, path))}
+    return changed & set(paths)
+
+_fast_status_repos = set()
+_fast_status_lock = threading.Lock()
+
+def enable_fast_status(repo_path):
+    """Ativa o untracked cache e o fsmonitor do repositório, se suportados e ainda não configurados
+
+    Acelera o que ainda percorre a árvore inteira (checkout, add, commit). Uma opção
+    já definida pelo usuário (inclusive false) é respeitada; roda uma vez por repositório.
+    """
+    key = os.path.normcase(os.path.abspath(repo_path))
+    with _fast_status_lock:
+        if key in _fast_status_repos:
+            return
+        _fast_status_repos.add(key)
+    _, code, _ = run_git_command(["config", "--get", "core.untrackedCache"], check=False, cwd=repo_path)
+    if code == 1:
+        # Confere se o sistema de arquivos atualiza o mtime das pastas como o cache espera
+        _, code, _ = run_git_command(["update-index", "--test-untracked-cache"], check=False, cwd=repo_path)
+        if code == 0:
+            run_git_command(["config", "core.untrackedCache", "true"], check=False, cwd=repo_path)
+            run_git_command(["update-index", "--untracked-cache"], check=False, cwd=repo_path)
+            print(f"Untracked cache ativado em {repo_path}")
+    _, code, _ = run_git_command(["config", "--get", "core.fsmonitor"], check=False, cwd=repo_path)
+    if code == 1:
+        # O daemon nativo só existe no Windows e no macOS (git 2.36+)
+        _, code, _ = run_git_command(["fsmonitor--daemon", "start"], check=False, cwd=repo_path)
+        if code == 0:
+            run_git_command(["config", "core.fsmonitor", "true"], check=False, cwd=repo_path)
+            print(f"fsmonitor ativado em {repo_path}")
+
+def prepare_fast_status(targets):
+    """Ativa o untracked cache/fsmonitor nos repositórios de versões e do fxmanifest.lua dos alvos"""
+    repos = set()
+    for target in targets:
+        repos.add(find_git_repo_root(os.path.abspath(target.versions_repo)))
+        if target.fxmanifest_path:
+            repos.add(find_git_repo_root(os.path.dirname(os.path.abspath(target.fxmanifest_path))))
+    for repo_path in sorted(repo for repo in repos if repo):
+        enable_fast_status(repo_path)
+
+def commit_fxmanifest_in_repo(version_string, target=None):
     """Faz commit e push do fxmanifest.lua no repositório onde o arquivo está localizado (branch main)"""
+    target = target or default_target()
+    fxmanifest_path = target.fxmanifest_path
     current_branch = None
+    fxmanifest_repo_path = None
     try:
         # Verifica se o fxmanifest.lua existe
-        if not os.path.exists(FXMANIFEST_PATH):
+        if not fxmanifest_path or not os.path.exists(fxmanifest_path):
             print("Aviso: fxmanifest.lua não encontrado, pulando commit")
             return False
         
         # Encontra o repositório Git onde o fxmanifest.lua está localizado
-        fxmanifest_dir = os.path.dirname(FXMANIFEST_PATH)
-        fxmanifest_repo_path = None
-        
-        # Procura pelo diretório .git subindo na hierarquia
-        search_path = fxmanifest_dir
-        while search_path and search_path != os.path.dirname(search_path):
-            git_path = os.path.join(search_path, ".git")
-            if os.path.exists(git_path):
-                fxmanifest_repo_path = search_path
-                break
-            search_path = os.path.dirname(search_path)
+        # (procura pelo diretório .git subindo na hierarquia)
+        fxmanifest_repo_path = find_git_repo_root(os.path.dirname(fxmanifest_path))
         
         if not fxmanifest_repo_path:
-            print(f"Erro: Não foi possível encontrar repositório Git para {FXMANIFEST_PATH}")
+            print(f"Erro: Não foi possível encontrar repositório Git para {fxmanifest_path}")
             return False
         
         print(f"Repositório do fxmanifest.lua encontrado: {fxmanifest_repo_path}")
         
         # Obtém o caminho relativo do fxmanifest.lua em relação ao repositório encontrado
-        fxmanifest_rel_path = os.path.relpath(FXMANIFEST_PATH, fxmanifest_repo_path)
+        fxmanifest_rel_path = os.path.relpath(fxmanifest_path, fxmanifest_repo_path)
+        fxmanifest_session = get_git_session(fxmanifest_repo_path)
         
         print(f"\nFazendo commit do fxmanifest.lua no repositório: {fxmanifest_repo_path} (branch: main)...")
         
         # Salva a branch atual antes de mudar
-        current_branch, _, _ = run_git_command("git branch --show-current", check=False, cwd=fxmanifest_repo_path)
+        current_branch = fxmanifest_session.current_branch()
         if not current_branch:
-            current_branch, _, _ = run_git_command("git rev-parse --abbrev-ref HEAD", check=False, cwd=fxmanifest_repo_path)
+            current_branch, _, _ = run_git_command(["rev-parse", "--abbrev-ref", "HEAD"], check=False, cwd=fxmanifest_repo_path)
         
         # Faz checkout para a branch main
         print("Alterando para a branch main...")
         checkout_result, checkout_code, checkout_stderr = run_git_command(
-            "git checkout main",
+            ["checkout", "main"],
             check=False,
             cwd=fxmanifest_repo_path
         )
@@ -345,7 +2606,7 @@ def commit_fxmanifest_in_repo(version_string):
             # Tenta criar a branch main se não existir
             print("Tentando criar branch main...")
             checkout_result, checkout_code, checkout_stderr = run_git_command(
-                "git checkout -b main",
+                ["checkout", "-b", "main"],
                 check=False,
                 cwd=fxmanifest_repo_path
             )
@@ -355,25 +2616,19 @@ def commit_fxmanifest_in_repo(version_string):
         
         print("Branch main selecionada com sucesso!")
         
-        # Verifica se há mudanças no fxmanifest.lua
-        status_result, _, _ = run_git_command("git status --porcelain", check=False, cwd=fxmanifest_repo_path)
-        normalized_status = status_result.replace('\\', '/') if status_result else ""
+        # Verifica se o arquivo foi modificado (pode estar modificado mesmo que a versão seja a mesma);
+        # o conteúdo em HEAD (main) vem da sessão persistente, sem processo
         normalized_path = fxmanifest_rel_path.replace('\\', '/')
-        
-        # Verifica se o arquivo foi modificado (pode estar modificado mesmo que a versão seja a mesma)
-        has_changes = status_result and normalized_path in normalized_status
+        has_changes = normalized_path in changed_paths(fxmanifest_repo_path, [normalized_path])
+        head_blob = fxmanifest_session.read_file("HEAD", normalized_path)
         
         if not has_changes:
             # Verifica se o arquivo existe e se precisa ser adicionado ao git
             # Mesmo sem mudanças detectadas, se main está na mesma ou acima, fazemos o commit
             print("Verificando se fxmanifest.lua precisa ser commitado na branch main...")
             # Verifica se o arquivo está sendo rastreado pelo git
-            ls_result, _, _ = run_git_command(
-                f"git ls-files --error-unmatch \"{fxmanifest_rel_path}\"",
-                check=False,
-                cwd=fxmanifest_repo_path
-            )
-            if ls_result is None:
+            # Consulta a versão do arquivo em HEAD (main) pela sessão persistente
+            if head_blob is None:
                 # Arquivo não está sendo rastreado, precisa ser adicionado
                 print("fxmanifest.lua não está sendo rastreado, será adicionado ao git")
             else:
@@ -385,47 +2640,33 @@ def commit_fxmanifest_in_repo(version_string):
         old_version = None
         try:
             # Tenta obter a versão antiga do arquivo no HEAD (antes da modificação)
-            show_result, _, _ = run_git_command(
-                f"git show HEAD:\"{fxmanifest_rel_path}\"",
-                check=False,
-                cwd=fxmanifest_repo_path
-            )
+            show_result = head_blob
             if show_result:
                 # Extrai a versão antiga do conteúdo do arquivo no HEAD
-                old_match = re.search(r"version\s+['\"](HYPE-[^'\"]+)['\"]", show_result)
+                old_match = FXMANIFEST_VERSION_PATTERN.search(show_result)
                 if old_match:
-                    old_version = old_match.group(1)
+                    old_version = old_match.group(2)
             
-            # Se não encontrou no HEAD, tenta no diff
+            # Se não encontrou no HEAD, usa a última versão já publicada no fxmanifest.lua (histórico)
             if not old_version:
-                diff_result, _, _ = run_git_command(
-                    f"git diff HEAD -- \"{fxmanifest_rel_path}\"",
-                    check=False,
-                    cwd=fxmanifest_repo_path
-                )
-                if diff_result:
-                    # Extrai a versão antiga do diff (linha com -)
-                    old_match = re.search(r"-\s*version\s+['\"](HYPE-[^'\"]+)['\"]", diff_result)
-                    if old_match:
-                        old_version = old_match.group(1)
+                previous = get_version_history().latest(os.path.basename(target.version_file),
+                                                        manifest_published=True, exclude=version_string)
+                if previous:
+                    old_version = previous["version"]
         except:
             pass
         
         # Adiciona o arquivo (mesmo que não tenha mudanças, adiciona para garantir)
-        add_result, add_code, _ = run_git_command(f"git add \"{fxmanifest_rel_path}\"", check=False, cwd=fxmanifest_repo_path)
+        add_result, add_code, _ = run_git_command(["add", "--", fxmanifest_rel_path], check=False, cwd=fxmanifest_repo_path)
         if add_result is None or add_code != 0:
             print("Aviso: Problema ao adicionar fxmanifest.lua ao staging")
             # Volta para a branch original em caso de erro
             if current_branch and current_branch != "main":
-                run_git_command(f"git checkout {current_branch}", check=False, cwd=fxmanifest_repo_path)
+                run_git_command(["checkout", current_branch], check=False, cwd=fxmanifest_repo_path)
             return False
         
         # Verifica se há algo para commitar após adicionar
-        status_after_add, _, _ = run_git_command("git status --porcelain", check=False, cwd=fxmanifest_repo_path)
-        has_staged_changes = status_after_add and any(
-            line.strip().startswith(('M', 'A', 'D')) and normalized_path in line
-            for line in status_after_add.split('\n')
-        ) if status_after_add else False
+        has_staged_changes = normalized_path in changed_paths(fxmanifest_repo_path, [normalized_path], staged_only=True)
         
         # Cria mensagem de commit com comentário sobre a alteração
         if old_version:
@@ -442,7 +2683,7 @@ def commit_fxmanifest_in_repo(version_string):
         
         # Faz o commit na branch main
         commit_result, commit_code, commit_stderr = run_git_command(
-            f'git commit -m "{commit_message}"',
+            ["commit", "-m", commit_message],
             check=False,
             cwd=fxmanifest_repo_path
         )
@@ -454,7 +2695,7 @@ def commit_fxmanifest_in_repo(version_string):
                 # Mesmo sem commit, consideramos sucesso pois o arquivo já está correto
                 # Volta para a branch original
                 if current_branch and current_branch != "main":
-                    run_git_command(f"git checkout {current_branch}", check=False, cwd=fxmanifest_repo_path)
+                    run_git_command(["checkout", current_branch], check=False, cwd=fxmanifest_repo_path)
                 return True  # Retorna True porque não há erro, apenas não há mudanças
             else:
                 print("Aviso: Problema ao fazer commit do fxmanifest.lua na branch main")
@@ -462,35 +2703,26 @@ def commit_fxmanifest_in_repo(version_string):
                     print(f"Detalhes: {commit_stderr}")
                 # Volta para a branch original em caso de erro
                 if current_branch and current_branch != "main":
-                    run_git_command(f"git checkout {current_branch}", check=False, cwd=fxmanifest_repo_path)
+                    run_git_command(["checkout", current_branch], check=False, cwd=fxmanifest_repo_path)
                 return False
         
         print("Commit do fxmanifest.lua realizado com sucesso na branch main!")
         
-        # Faz o push apenas para a branch main
-        print("Fazendo push do fxmanifest.lua para origin/main (apenas branch main)...")
-        push_result, push_code, push_stderr = run_git_command(
-            "git push origin main",
-            check=False,
-            cwd=fxmanifest_repo_path
-        )
-        
-        if push_result is None or push_code != 0:
-            print(f"Aviso: Problema ao fazer push do fxmanifest.lua (código: {push_code})")
-            if push_stderr:
-                print(f"Erro detalhado: {push_stderr}")
+        # Faz o push apenas para a branch main (pela fila de push, se habilitada)
+        if PUSH_QUEUE_ENABLED:
+            PUSH_QUEUE.enqueue(fxmanifest_repo_path, "main")
+        elif not push_branch(fxmanifest_repo_path, "main"):
             # Volta para a branch original em caso de erro
             if current_branch and current_branch != "main":
-                run_git_command(f"git checkout {current_branch}", check=False, cwd=fxmanifest_repo_path)
+                run_git_command(["checkout", current_branch], check=False, cwd=fxmanifest_repo_path)
             return False
-        
-        print("Push do fxmanifest.lua realizado com sucesso na branch main!")
-        print("✓ Alteração commitada e enviada apenas para a branch main")
+        else:
+            print("✓ Alteração commitada e enviada apenas para a branch main")
         
         # Volta para a branch original se necessário
         if current_branch and current_branch != "main":
             print(f"Voltando para a branch original: {current_branch}")
-            run_git_command(f"git checkout {current_branch}", check=False, cwd=fxmanifest_repo_path)
+            run_git_command(["checkout", current_branch], check=False, cwd=fxmanifest_repo_path)
         
         return True
         
@@ -499,54 +2731,169 @@ def commit_fxmanifest_in_repo(version_string):
         # Tenta voltar para a branch original em caso de erro
         try:
             if current_branch and current_branch != "main":
-                # Tenta encontrar o repositório novamente
-                fxmanifest_dir = os.path.dirname(FXMANIFEST_PATH)
-                search_path = fxmanifest_dir
-                fxmanifest_repo_path = None
-                while search_path and search_path != os.path.dirname(search_path):
-                    git_path = os.path.join(search_path, ".git")
-                    if os.path.exists(git_path):
-                        fxmanifest_repo_path = search_path
-                        break
-                    search_path = os.path.dirname(search_path)
                 if fxmanifest_repo_path:
-                    run_git_command(f"git checkout {current_branch}", check=False, cwd=fxmanifest_repo_path)
+                    run_git_command(["checkout", current_branch], check=False, cwd=fxmanifest_repo_path)
         except:
             pass
         return False
 
-def commit_and_push(version_string):
-    """Faz commit e push das alterações no repositório atual"""
-    # Obtém o diretório atual (onde está o script e o arquivo de versão)
-    current_dir = os.getcwd()
-    
-    # Verifica se há mudanças para commitar
-    status_result, _, _ = run_git_command("git status --porcelain", check=False, cwd=current_dir)
+def commit_fxmanifest_plumbing(version_string, target=None):
+    """Commita a nova versão do fxmanifest.lua direto em refs/heads/main, sem checkout
+
+    Parte do fxmanifest.lua da própria main, grava o novo blob, monta a árvore com um
+    índice temporário, cria o commit com commit-tree e atualiza refs/heads/main
+    (com verificação do valor antigo). O diretório de trabalho e a branch atual não
+    são tocados. Retorna True/False, ou None se o caminho por plumbing não se aplica
+    (sem repositório ou sem branch main), para o chamador usar o fluxo com checkout.
+    """
+    target = target or default_target()
+    fxmanifest_path = target.fxmanifest_path
+    if not fxmanifest_path or not os.path.exists(fxmanifest_path):
+        print("Aviso: fxmanifest.lua não encontrado, pulando commit")
+        return False
+
+    repo_path = find_git_repo_root(os.path.dirname(fxmanifest_path))
+    if not repo_path:
+        return None
+    rel_path = os.path.relpath(fxmanifest_path, repo_path).replace('\\', '/')
+    session = get_git_session(repo_path)
+
+    main_commit = session.resolve("refs/heads/main")
+    if not main_commit:
+        return None
+
+    print(f"\nFazendo commit do fxmanifest.lua em {repo_path} (branch: main, sem checkout)...")
+
+    # Conteúdo atual do fxmanifest.lua na main (ou o arquivo em disco, se ainda não for rastreado)
+    try:
+        content = session.read_object(f"{main_commit}:{rel_path}")
+        if content is None:
+            with open(fxmanifest_path, 'rb') as f:
+                content = f.read()
+        text = content.decode('utf-8')
+    except (OSError, UnicodeDecodeError) as e:
+        print(f"Erro ao ler o fxmanifest.lua da branch main: {e}")
+        return False
+
+    match = FXMANIFEST_VERSION_PATTERN.search(text)
+    if not match:
+        print("Aviso: Não foi possível encontrar a linha 'version' no fxmanifest.lua da branch main")
+        return False
+    old_version = match.group(2)
+
+    if old_version == version_string:
+        print(f"Versão na branch main já está correta: {version_string}")
+    else:
+        new_text = text[:match.start(2)] + version_string + text[match.end(2):]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            blob_file = os.path.join(tmp_dir, "fxmanifest.lua")
+            try:
+                with open(blob_file, 'wb') as f:
+                    f.write(new_text.encode('utf-8'))
+            except OSError as e:
+                print(f"Erro ao gravar o fxmanifest.lua temporário: {e}")
+                return False
+            index_env = {"GIT_INDEX_FILE": os.path.join(tmp_dir, "index")}
+
+            blob, code, stderr = run_git_command(["hash-object", "-w", "--no-filters", blob_file], check=False, cwd=repo_path)
+            if code != 0 or not blob:
+                print(f"Erro ao gravar o blob do fxmanifest.lua: {stderr}")
+                return False
+
+            _, code, stderr = run_git_command(["read-tree", main_commit], check=False, cwd=repo_path, env=index_env)
+            if code == 0:
+                _, code, stderr = run_git_command(
+                    ["update-index", "--add", "--cacheinfo", f"100644,{blob},{rel_path}"],
+                    check=False, cwd=repo_path, env=index_env
+                )
+            tree = None
+            if code == 0:
+                tree, code, stderr = run_git_command(["write-tree"], check=False, cwd=repo_path, env=index_env)
+            if code != 0 or not tree:
+                print(f"Erro ao montar a árvore do commit: {stderr}")
+                return False
+
+        commit_message = f"{old_version} -> {version_string}"
+        new_commit, code, stderr = run_git_command(
+            ["commit-tree", tree, "-p", main_commit, "-m", commit_message],
+            check=False, cwd=repo_path
+        )
+        if code != 0 or not new_commit:
+            print(f"Erro ao criar o commit do fxmanifest.lua: {stderr}")
+            return False
+
+        # Só avança a main se ela ainda estiver no commit usado como base
+        _, code, stderr = run_git_command(
+            ["update-ref", "-m", f"version_updater: {commit_message}", "refs/heads/main", new_commit, main_commit],
+            check=False, cwd=repo_path
+        )
+        if code != 0:
+            print(f"Erro ao atualizar refs/heads/main (a branch mudou durante o commit?): {stderr}")
+            return False
+        mark_cycle(changed=True)
+        print(f"Commit {new_commit[:8]} criado na branch main: {commit_message}")
+
+        # Se a main estiver em checkout, leva a nova versão ao arquivo em disco e ao índice real
+        if session.current_branch() == "main":
+            update_fxmanifest(version_string, target)
+            run_git_command(["reset", "-q", "--", rel_path], check=False, cwd=repo_path)
+
+    # Envia a main se ela estiver à frente de origin/main (inclusive commits de ciclos anteriores sem push)
+    if session.resolve("refs/heads/main") == session.resolve("refs/remotes/origin/main"):
+        return True
+
+    if PUSH_QUEUE_ENABLED:
+        PUSH_QUEUE.enqueue(repo_path, "main")
+        return True
+    return push_branch(repo_path, "main")
+
+def commit_fxmanifest_to_main(version_string, target=None):
+    """Publica a versão no fxmanifest.lua da main, por plumbing (padrão) ou pelo fluxo com checkout"""
+    if FXMANIFEST_PLUMBING_COMMIT:
+        result = commit_fxmanifest_plumbing(version_string, target)
+        if result is not None:
+            return result
+        print("Aviso: Commit sem checkout indisponível (sem branch main local), usando checkout")
     
-    # Verifica se há mudanças no arquivo de versão
-    has_version_file = status_result and VERSION_FILE in status_result
+    # Fluxo com checkout: atualiza o arquivo em disco e commita na branch main
+    if update_fxmanifest(version_string, target):
+        mark_cycle(changed=True)
+        print("✓ fxmanifest.lua atualizado com sucesso!")
+    else:
+        print("Versão no fxmanifest.lua já está correta, mas verificando se precisa commit na branch main...")
+    return commit_fxmanifest_in_repo(version_string, target)
+
+def commit_and_push(version_string, target=None):
+    """Faz commit e push das alterações no repositório do arquivo de versão"""
+    target = target or default_target()
+    version_file = target.version_file
+    fxmanifest_path = target.fxmanifest_path
+    # Repositório onde está o arquivo de versão
+    current_dir = target.versions_repo
     
-    # Verifica se o fxmanifest.lua está no repositório e foi modificado
-    has_fxmanifest = False
-    fxmanifest_rel_path = None
+    # Caminhos que o script controla neste repositório: o arquivo de versão e,
+    # se estiver no mesmo repositório, o fxmanifest.lua
+    normalized_version_file = version_file.replace('\\', '/')
+    owned_paths = [normalized_version_file]
+    normalized_path = None
     
-    if os.path.exists(FXMANIFEST_PATH):
+    if fxmanifest_path and os.path.exists(fxmanifest_path):
         try:
             # Tenta obter o caminho relativo do fxmanifest.lua em relação ao repositório atual
-            fxmanifest_rel_path = os.path.relpath(FXMANIFEST_PATH, current_dir)
+            fxmanifest_rel_path = os.path.relpath(fxmanifest_path, current_dir)
             # Verifica se o arquivo está dentro do repositório atual (não contém ..)
             if not fxmanifest_rel_path.startswith('..') and os.path.exists(os.path.join(current_dir, fxmanifest_rel_path)):
-                # Verifica se o arquivo aparece no status do git
-                if status_result:
-                    # Normaliza os separadores de caminho para comparação
-                    normalized_status = status_result.replace('\\', '/')
-                    normalized_path = fxmanifest_rel_path.replace('\\', '/')
-                    # Verifica se o caminho aparece no status (pode ter M, A, etc. no início)
-                    has_fxmanifest = any(normalized_path in line for line in normalized_status.split('\n'))
+                normalized_path = fxmanifest_rel_path.replace('\\', '/')
+                owned_paths.append(normalized_path)
         except ValueError:
             # Se não conseguir fazer relpath, o arquivo não está no mesmo diretório
             pass
     
+    # Verifica só esses caminhos (sem varrer a árvore inteira do repositório)
+    changed = changed_paths(current_dir, owned_paths)
+    has_version_file = normalized_version_file in changed
+    has_fxmanifest = normalized_path is not None and normalized_path in changed
+    
     if not has_version_file and not has_fxmanifest:
         print("Nenhuma mudança detectada para commitar.")
         return False
@@ -554,24 +2901,24 @@ def commit_and_push(version_string):
     print(f"Fazendo commit com mensagem: {version_string}")
     
     # Obtém o nome da branch atual
-    branch_result, _, _ = run_git_command("git branch --show-current", check=False, cwd=current_dir)
+    branch_result = get_git_session(current_dir).current_branch()
     if not branch_result:
         # Tenta método alternativo
-        branch_result, _, _ = run_git_command("git rev-parse --abbrev-ref HEAD", check=False, cwd=current_dir)
+        branch_result, _, _ = run_git_command(["rev-parse", "--abbrev-ref", "HEAD"], check=False, cwd=current_dir)
     
     branch_name = branch_result if branch_result else "main"
     print(f"Branch atual: {branch_name}")
     
     # Adiciona o arquivo de versão
     if has_version_file:
-        add_result, add_code, _ = run_git_command(f"git add {VERSION_FILE}", check=False, cwd=current_dir)
+        add_result, add_code, _ = run_git_command(["add", "--", version_file], check=False, cwd=current_dir)
         if add_result is None or add_code != 0:
             print("Aviso: Problema ao adicionar arquivo ao staging")
     
     # Adiciona o fxmanifest.lua se estiver no repositório
     if has_fxmanifest:
-        fxmanifest_rel_path = os.path.relpath(FXMANIFEST_PATH, current_dir)
-        add_result, add_code, _ = run_git_command(f"git add \"{fxmanifest_rel_path}\"", check=False, cwd=current_dir)
+        fxmanifest_rel_path = os.path.relpath(fxmanifest_path, current_dir)
+        add_result, add_code, _ = run_git_command(["add", "--", fxmanifest_rel_path], check=False, cwd=current_dir)
         if add_result is None or add_code != 0:
             print(f"Aviso: Problema ao adicionar fxmanifest.lua ao staging")
         else:
@@ -579,7 +2926,7 @@ def commit_and_push(version_string):
     
     # Faz o commit
     commit_result, commit_code, commit_stderr = run_git_command(
-        f'git commit -m "{version_string}"',
+        ["commit", "-m", version_string],
         check=False,
         cwd=current_dir
     )
@@ -596,73 +2943,1073 @@ def commit_and_push(version_string):
     else:
         print("Commit realizado com sucesso!")
     
-    # Faz o push - tenta múltiplas vezes se necessário
-    print("Fazendo push para o repositório remoto...")
-    push_result, push_code, push_stderr = run_git_command(f"git push origin {branch_name}", check=False, cwd=current_dir)
+    # O push vai para a fila de saída (agrupa commits próximos e não bloqueia o ciclo)
+    if PUSH_QUEUE_ENABLED:
+        PUSH_QUEUE.enqueue(current_dir, branch_name)
+        return True
+    return push_branch(current_dir, branch_name)
+
+PUSH_REJECTED_PATTERN = re.compile(r"\[rejected\]|non-fast-forward|fetch first", re.IGNORECASE)
+
+def push_branch(repo_path, branch_name):
+    """Faz push de uma branch para origin e diagnostica falhas de permissão; retorna True se deu certo"""
+    return push_branch_result(repo_path, branch_name)[0]
+
+def push_branch_result(repo_path, branch_name):
+    """Como push_branch(), mas retorna (sucesso, rejeitado): rejeitado indica que o remoto tem commits que o local não tem"""
+    print(f"Fazendo push de {branch_name} para o repositório remoto ({repo_path})...")
+    push_result, push_code, push_stderr = run_git_command(["push", "--progress", "origin", branch_name], check=False, cwd=repo_path)
+    METRICS.record_transfer("push", push_stderr)
     
     if push_result is None or push_code != 0:
-        print(f"Erro ao fazer push (código: {push_code})")
+        print(f"Erro: Não foi possível fazer push (código: {push_code})")
         if push_stderr:
             print(f"Erro detalhado: {push_stderr}")
         if push_result:
             print(f"Saída: {push_result}")
-        print("Tentando push simples...")
-        # Tenta push simples
-        push_result, push_code, push_stderr = run_git_command("git push", check=False, cwd=current_dir)
-        if push_result is None or push_code != 0:
-            print(f"Erro: Não foi possível fazer push (código: {push_code})")
-            if push_stderr:
-                print(f"Erro detalhado: {push_stderr}")
-            if push_result:
-                print(f"Saída: {push_result}")
-            
-            # Se for erro 403 (Permission denied), faz diagnóstico
-            error_text = (push_stderr or "") + " " + (push_result or "")
-            if push_code == 128 and ("403" in error_text or "Permission" in error_text or "denied" in error_text.lower()):
-                print("\n⚠️  ERRO 403 - PERMISSÃO NEGADA")
-                print("O usuário configurado não tem permissão para fazer push neste repositório.")
-                diagnose_auth_issue(current_dir)
-                print("\nSOLUÇÕES POSSÍVEIS:")
-                print("1. Atualizar credenciais do Git:")
-                print("   - Abra: Painel de Controle > Gerenciador de Credenciais")
-                print("   - Procure por 'git:https://github.com'")
-                print("   - Remova e adicione novamente com credenciais corretas")
-                print("\n2. Usar Token de Acesso Pessoal (PAT):")
-                print("   - GitHub > Settings > Developer settings > Personal access tokens")
-                print("   - Crie um token com permissão 'repo'")
-                print("   - Use o token como senha ao fazer push")
-                print("\n3. Configurar SSH (recomendado):")
-                print("   git remote set-url origin git@github.com:dylakkj/versions.git")
-                print("   (Depois configure sua chave SSH no GitHub)")
-            else:
-                print("\nVerifique:")
-                print("  - Conexão com o servidor remoto")
-                print("  - Permissões de acesso")
-                print("  - Configuração do remote (git remote -v)")
-                print("  - Autenticação (credenciais ou SSH)")
+        mark_cycle(remote_error=True)
+        
+        # Se for erro 403 (Permission denied), faz diagnóstico
+        error_text = (push_stderr or "") + " " + (push_result or "")
+        if PUSH_REJECTED_PATTERN.search(error_text):
+            print(f"Push rejeitado: origin/{branch_name} tem commits que não estão no repositório local")
+            return False, True
+        if push_code == 128 and ("403" in error_text or "Permission" in error_text or "denied" in error_text.lower()):
+            print("\n⚠️  ERRO 403 - PERMISSÃO NEGADA")
+            print("O usuário configurado não tem permissão para fazer push neste repositório.")
+            diagnose_auth_issue(repo_path)
+            print("\nSOLUÇÕES POSSÍVEIS:")
+            print("1. Atualizar credenciais do Git:")
+            print("   - Abra: Painel de Controle > Gerenciador de Credenciais")
+            print("   - Procure por 'git:https://github.com'")
+            print("   - Remova e adicione novamente com credenciais corretas")
+            print("\n2. Usar Token de Acesso Pessoal (PAT):")
+            print("   - GitHub > Settings > Developer settings > Personal access tokens")
+            print("   - Crie um token com permissão 'repo'")
+            print("   - Use o token como senha ao fazer push")
+            print("\n3. Configurar SSH (recomendado):")
+            print("   git remote set-url origin git@github.com:dylakkj/versions.git")
+            print("   (Depois configure sua chave SSH no GitHub)")
+        else:
+            print("\nVerifique:")
+            print("  - Conexão com o servidor remoto")
+            print("  - Permissões de acesso")
+            print("  - Configuração do remote (git remote -v)")
+            print("  - Autenticação (credenciais ou SSH)")
+        return False, False
+    
+    print("Push realizado com sucesso!")
+    if push_result:
+        print(f"Saída: {push_result}")
+    return True, False
+
+def recover_rejected_push(repo_path, branch_name):
+    """Tenta resolver um push rejeitado por não ser fast-forward
+
+    Busca origin/<branch> e:
+    - se a branch está em checkout, reaplica os commits locais sobre ela (rebase) -> "retry"
+    - se os commits locais só alteram fxmanifest.lua (commits do próprio script), volta a
+      branch para origin/<branch>; o próximo ciclo refaz o commit sobre ela -> "rebuild"
+    Retorna None quando não há como resolver sem intervenção manual.
+    """
+    print(f"Buscando origin/{branch_name} para refazer os commits locais de {repo_path}...")
+    _, code, stderr = run_git_command(
+        ["fetch", "origin", f"+refs/heads/{branch_name}:refs/remotes/origin/{branch_name}"], check=False, cwd=repo_path)
+    if code != 0:
+        print(f"Erro ao buscar origin/{branch_name}: {stderr}")
+        return None
+    session = get_git_session(repo_path)
+    if session.current_branch() == branch_name:
+        _, code, stderr = run_git_command(["rebase", "--autostash", f"origin/{branch_name}"], check=False, cwd=repo_path)
+        if code == 0:
+            print(f"Commits locais de {branch_name} reaplicados sobre origin/{branch_name}")
+            return "retry"
+        run_git_command(["rebase", "--abort"], check=False, cwd=repo_path)
+        print(f"Erro: Não foi possível reaplicar os commits de {branch_name} sobre origin/{branch_name}: {stderr}")
+        return None
+    files, code, _ = run_git_command(
+        ["log", "--format=", "--name-only", f"refs/remotes/origin/{branch_name}..refs/heads/{branch_name}"],
+        check=False, cwd=repo_path)
+    names = {line.strip() for line in (files or "").splitlines() if line.strip()}
+    if code == 0 and names and all(os.path.basename(name) == "fxmanifest.lua" for name in names):
+        local_tip = session.resolve(f"refs/heads/{branch_name}")
+        _, code, stderr = run_git_command(
+            ["update-ref", "-m", "version_updater: commit do fxmanifest.lua refeito sobre origin",
+             f"refs/heads/{branch_name}", f"refs/remotes/origin/{branch_name}", local_tip],
+            check=False, cwd=repo_path)
+        if code == 0:
+            print(f"Commits do fxmanifest.lua em {branch_name} descartados; serão refeitos sobre origin/{branch_name} no próximo ciclo")
+            return "rebuild"
+    print(f"Erro: {branch_name} em {repo_path} divergiu de origin/{branch_name} com commits que não são do script - resolva manualmente")
+    return None
+
+class PushQueue:
+    """Fila de saída de pushes com agrupamento e retentativas
+
+    Cada (repositório, branch) tem no máximo uma entrada pendente: commits feitos
+    dentro de PUSH_COALESCE_WINDOW segundos viram um único push. Falhas são
+    retentadas com backoff exponencial (PUSH_RETRY_BASE até PUSH_RETRY_MAX). O push
+    roda em uma thread própria, então o próximo ciclo de detecção não espera a rede.
+
+    Um push rejeitado por não ser fast-forward não é retentado às cegas: os commits
+    são refeitos sobre origin (recover_rejected_push) ou a branch fica bloqueada até
+    mudar. Quem precisa saber que seus commits chegaram ao remoto registra um aviso
+    com when_pushed().
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._pending = {}
+        self._in_flight = set()
+        self._seq = 0  # Numeração dos enfileiramentos (diz quais commits um push levou)
+        self._pushed = {}  # (repositório, branch) -> número do último enfileiramento enviado
+        self._waiters = {}  # nome -> (pendências {chave: número}, callback)
+        self._blocked = {}  # (repositório, branch) -> ponta local quando o push foi rejeitado sem solução
+        self._notifying = 0  # Pushes concluídos cujos avisos (when_pushed) ainda estão rodando
+        self._thread = None
+        self.stats = {"pushes": 0, "commits_pushed": 0, "failures": 0, "max_depth": 0,
+                      "last_latency": None, "last_push_duration": None}
+
+    def enqueue(self, repo_path, branch_name):
+        """Agenda o push de branch_name em repo_path (agrupado com pushes pendentes do mesmo destino)"""
+        key = (os.path.abspath(repo_path), branch_name)
+        if self.is_blocked(repo_path, branch_name):
+            print(f"Push de {branch_name} em {repo_path} segue bloqueado (rejeitado pelo remoto) - resolva manualmente")
+            return
+        now = time.monotonic()
+        with self._cond:
+            entry = self._pending.get(key)
+            if entry is None:
+                entry = {"first": now, "count": 0, "attempts": 0, "next_try": now + PUSH_COALESCE_WINDOW}
+                self._pending[key] = entry
+            entry["count"] += 1
+            self._seq += 1
+            entry["seq"] = self._seq
+            self.stats["max_depth"] = max(self.stats["max_depth"], self.depth())
+            print(f"Push de {branch_name} agendado (fila: {self.depth()} commit(s) pendente(s))")
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="push-queue", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def depth(self):
+        """Quantidade de commits aguardando push"""
+        return sum(entry["count"] for entry in self._pending.values())
+
+    def is_blocked(self, repo_path, branch_name):
+        """Indica se o push da branch foi rejeitado sem solução e a branch não mudou desde então"""
+        key = (os.path.abspath(repo_path), branch_name)
+        if key not in self._blocked:
             return False
+        if get_git_session(repo_path).resolve(f"refs/heads/{branch_name}") == self._blocked[key]:
+            return True
+        self._blocked.pop(key, None)
+        return False
+
+    def is_pending(self, repo_path, branch_name):
+        """Indica se há push pendente (ou em andamento) para a branch do repositório"""
+        with self._cond:
+            return (os.path.abspath(repo_path), branch_name) in self._pending
+
+    def when_pushed(self, name, keys, callback):
+        """Chama `callback` quando os commits já enfileirados de `keys` ((repositório, branch)) forem enviados
+
+        Se nada estiver pendente, chama na hora e retorna True. Um novo registro com o
+        mesmo `name` substitui o anterior. Retorna False (sem registrar) se alguma das
+        branches está bloqueada por rejeição.
+        """
+        with self._cond:
+            if any(key in self._blocked for key in keys):
+                return False
+            required = {key: self._pending[key]["seq"] for key in keys if key in self._pending}
+            if required:
+                self._waiters[name] = (required, callback)
+                return False
+            self._waiters.pop(name, None)
+        callback()
+        return True
+
+    def _satisfied_waiters(self, key):
+        """Remove e retorna os callbacks cujas pendências foram todas enviadas (chamar com o lock)"""
+        ready = []
+        for name, (required, callback) in list(self._waiters.items()):
+            if key in required and self._pushed.get(key, 0) >= required[key]:
+                del required[key]
+            if not required:
+                del self._waiters[name]
+                ready.append(callback)
+        return ready
+
+    def is_failing(self, repo_path):
+        """Indica se há push pendente para o repositório que já falhou pelo menos uma vez"""
+        repo_path = os.path.abspath(repo_path)
+        with self._cond:
+            return any(entry["attempts"] > 0 for (repo, _), entry in self._pending.items() if repo == repo_path)
+
+    def _run(self):
+        """Loop da thread de push"""
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                due = [key for key, entry in self._pending.items()
+                       if entry["next_try"] <= now and key not in self._in_flight]
+                if not due:
+                    waits = [entry["next_try"] - now for key, entry in self._pending.items()
+                             if key not in self._in_flight]
+                    self._cond.wait(min(waits) if waits else None)
+                    continue
+                key = min(due, key=lambda k: self._pending[k]["next_try"])
+                entry = self._pending[key]
+                batch = entry["count"]
+                batch_seq = entry["seq"]
+                self._in_flight.add(key)
+
+            repo_path, branch_name = key
+            started = time.monotonic()
+            success, rejected = push_branch_result(repo_path, branch_name)
+            recovery = None
+            if rejected:
+                with repo_lock(repo_path):
+                    recovery = recover_rejected_push(repo_path, branch_name)
+            finished = time.monotonic()
+
+            ready = []
+            with self._cond:
+                self._in_flight.discard(key)
+                entry = self._pending[key]
+                if success:
+                    self._pushed[key] = batch_seq
+                    ready = self._satisfied_waiters(key)
+                    self._notifying += 1
+                    self.stats["pushes"] += 1
+                    self.stats["commits_pushed"] += batch
+                    self.stats["last_latency"] = round(finished - entry["first"], 2)
+                    self.stats["last_push_duration"] = round(finished - started, 2)
+                    print(f"Push de {branch_name} enviou {batch} commit(s) "
+                          f"(latência {self.stats['last_latency']}s, push {self.stats['last_push_duration']}s)")
+                    entry["count"] -= batch
+                    if entry["count"] <= 0:
+                        del self._pending[key]
+                    else:
+                        # Commits que chegaram durante o push seguem para o próximo
+                        entry.update(first=finished, attempts=0, next_try=finished + PUSH_COALESCE_WINDOW)
+                elif rejected:
+                    self.stats["failures"] += 1
+                    entry["attempts"] += 1
+                    if recovery == "retry" and entry["attempts"] <= 3:
+                        # Commits reaplicados sobre origin: tenta de novo já
+                        entry["next_try"] = finished
+                    else:
+                        # Nada a enviar (o próximo ciclo refaz o commit) ou divergência sem solução
+                        del self._pending[key]
+                        if recovery != "rebuild":
+                            self._blocked[key] = get_git_session(repo_path).resolve(f"refs/heads/{branch_name}")
+                            print(f"Push de {branch_name} em {repo_path} bloqueado até a branch mudar")
+                else:
+                    self.stats["failures"] += 1
+                    entry["attempts"] += 1
+                    delay = min(PUSH_RETRY_BASE * 2 ** (entry["attempts"] - 1), PUSH_RETRY_MAX)
+                    entry["next_try"] = finished + delay
+                    print(f"Push de {branch_name} falhou (tentativa {entry['attempts']}), nova tentativa em {delay}s")
+                self._cond.notify_all()
+            if success:
+                for callback in ready:
+                    try:
+                        callback()
+                    except Exception as e:
+                        print(f"Erro inesperado após o push de {branch_name}: {e}")
+                with self._cond:
+                    self._notifying -= 1
+                    self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """Espera a fila esvaziar (ou o timeout expirar); retorna True se esvaziou"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            for entry in self._pending.values():
+                entry["next_try"] = min(entry["next_try"], time.monotonic())
+            self._cond.notify_all()
+            while self._pending or self._notifying:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+PUSH_QUEUE = PushQueue()
+
+def unpushed_branches(repo_path, branch_name=None):
+    """[(repositório, branch)] se a branch (a atual, se None) tem commits locais que não estão em origin"""
+    session = get_git_session(repo_path)
+    branch_name = branch_name or session.current_branch()
+    if not branch_name:
+        return []
+    local_tip = session.resolve(f"refs/heads/{branch_name}")
+    if not local_tip or local_tip == session.resolve(f"refs/remotes/origin/{branch_name}"):
+        return []
+    return [(os.path.abspath(repo_path), branch_name)]
+
+def when_pushed(name, keys, callback):
+    """Chama `callback` quando as branches `keys` estiverem no remoto (já, se estiverem em dia)
+
+    Branches com commits sem push e fora da fila são enfileiradas. Sem a fila de push,
+    o push síncrono já falhou: retorna False e o próximo ciclo tenta de novo.
+    """
+    if not keys:
+        callback()
+        return True
+    if not PUSH_QUEUE_ENABLED:
+        print(f"Aviso: {', '.join(branch for _, branch in keys)} ainda sem push - estado não será guardado")
+        return False
+    for repo_path, branch_name in keys:
+        if not PUSH_QUEUE.is_pending(repo_path, branch_name) and not PUSH_QUEUE.is_blocked(repo_path, branch_name):
+            PUSH_QUEUE.enqueue(repo_path, branch_name)
+    return PUSH_QUEUE.when_pushed(name, keys, callback)
+
+def requeue_unpushed_commits(targets):
+    """Agenda o push de commits que ficaram sem push (ex: script encerrado com a fila cheia)
+
+    Cobre a branch atual dos repositórios de versões e a main dos repositórios do fxmanifest.lua.
+    """
+    branches = {(target.versions_repo, None) for target in targets}
+    for target in targets:
+        if target.fxmanifest_path:
+            root = find_git_repo_root(os.path.dirname(os.path.abspath(target.fxmanifest_path)))
+            if root:
+                branches.add((root, "main"))
+    for repo_path, branch_name in sorted(branches, key=lambda item: (item[0], item[1] or "")):
+        for key in unpushed_branches(repo_path, branch_name):
+            print(f"Commits sem push encontrados em {key[0]} ({key[1]})")
+            PUSH_QUEUE.enqueue(*key)
+
+class RepoMaintenance:
+    """Manutenção dos repositórios em janelas ociosas, em uma thread própria
+
+    Depois de MAINTENANCE_IDLE_SECONDS sem mudanças detectadas, cada repositório usado
+    pelos alvos (monitorado ou clone de metadados, o do fxmanifest.lua e o de versões)
+    recebe, no máximo a cada MAINTENANCE_INTERVAL segundos:
+
+    - commit-graph com números de geração (incremental, --split), usado nas consultas de ancestralidade
+    - empacotamento dos objetos soltos alcançáveis e remoção dos inalcançáveis antigos
+    - multi-pack-index e repack incremental dos packs pequenos (expire + repack em lotes)
+
+    Uma mudança detectada pausa a manutenção antes da próxima etapa (a etapa em
+    andamento termina); ela recomeça dessa etapa na próxima janela ociosa. Os tempos
+    das consultas medidas antes e depois vão para o log, as métricas e o cache de estado.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._repos = {}  # caminho normalizado -> {"path", "git_dir", "worktree"}
+        self._progress = {}  # caminho -> (índice da próxima etapa, medição anterior) de manutenções pausadas
+        self._last_change = time.monotonic()
+        self._paused = threading.Event()
+        self._stopped = False
+        self._thread = None
+
+    def start(self, targets):
+        """Registra os repositórios dos alvos e inicia a thread de manutenção"""
+        for target in targets:
+            self._add(target.repo_path, target.git_dir, worktree=not target.metadata_only)
+            if target.fxmanifest_path:
+                root = find_git_repo_root(os.path.dirname(os.path.abspath(target.fxmanifest_path)))
+                if root:
+                    self._add(root, os.path.join(root, ".git"))
+            root = find_git_repo_root(os.path.abspath(target.versions_repo))
+            if root:
+                # Os commits do arquivo de versão travam o caminho configurado (pode ser uma subpasta)
+                self._add(root, os.path.join(root, ".git"), lock_paths=[target.versions_repo])
+        if self._repos and (self._thread is None or not self._thread.is_alive()):
+            self._thread = threading.Thread(target=self._run, name="manutencao", daemon=True)
+            self._thread.start()
+
+    def _add(self, path, git_dir, worktree=True, lock_paths=()):
+        """Inclui um repositório (uma vez só, mesmo se compartilhado por vários alvos)
+
+        `lock_paths` são os outros caminhos pelos quais commits e pushes travam o
+        mesmo repositório (repo_lock), também travados durante cada etapa.
+        """
+        key = os.path.normcase(os.path.abspath(path))
+        with self._cond:
+            repo = self._repos.setdefault(key, {"path": os.path.abspath(path), "git_dir": git_dir,
+                                                "worktree": worktree, "locks": [path]})
+            repo["locks"] += [lock_path for lock_path in lock_paths if lock_path not in repo["locks"]]
+
+    def _lock_repo(self, repo):
+        """Trava o repositório (todos os repo_lock dele) para uma etapa; retorna os locks ou None se pausada
+
+        Os locks são tentados sem bloquear e liberados se algum estiver ocupado, então a
+        manutenção nunca segura um lock esperando outro (commits e pushes têm prioridade).
+        """
+        locks = [repo_lock(path) for path in repo["locks"]]
+        while not self._paused.is_set():
+            acquired = []
+            for lock in locks:
+                if not lock.acquire(blocking=False):
+                    break
+                acquired.append(lock)
+            if len(acquired) == len(locks):
+                return acquired
+            for lock in reversed(acquired):
+                lock.release()
+            self._paused.wait(1)
+        return None
+
+    def notify_change(self):
+        """Uma mudança foi detectada: pausa a manutenção em andamento e reinicia a contagem ociosa"""
+        with self._cond:
+            self._last_change = time.monotonic()
+            self._paused.set()
+            self._cond.notify_all()
+
+    def stop(self):
+        """Encerra a thread (a etapa em andamento, se houver, termina sozinha)"""
+        with self._cond:
+            self._stopped = True
+            self._paused.set()
+            self._cond.notify_all()
+
+    def _next_due(self):
+        """Retorna (repositório, segundos até ele estar pendente) do repositório mais atrasado"""
+        cache = get_state_cache()
+        now = time.time()
+        best = None
+        for key, repo in self._repos.items():
+            last_run = cache.get(f"manutencao:{repo['path']}").get("last_run", 0)
+            remaining = 0 if key in self._progress else max(0.0, last_run + MAINTENANCE_INTERVAL - now)
+            if best is None or remaining < best[1]:
+                best = (key, remaining)
+        return best
+
+    def _run(self):
+        """Loop da thread de manutenção"""
+        while True:
+            with self._cond:
+                if self._stopped:
+                    return
+                idle_left = self._last_change + MAINTENANCE_IDLE_SECONDS - time.monotonic()
+                key, due_in = self._next_due()
+                wait_for = max(idle_left, due_in)
+                if wait_for > 0:
+                    self._cond.wait(wait_for)
+                    continue
+                self._paused.clear()
+                repo = self._repos[key]
+            try:
+                self.maintain(key, repo)
+            except Exception as e:
+                print(f"Erro inesperado na manutenção de {repo['path']}: {e}")
+                get_state_cache().update(f"manutencao:{repo['path']}", last_run=time.time(), error=str(e))
+
+    def steps(self, repo):
+        """Etapas de manutenção do repositório, na ordem em que são executadas"""
+        steps = []
+        # Repositórios rasos não usam commit-graph
+        if not is_shallow_repo(repo["git_dir"]):
+            steps.append(("commit-graph", ["commit-graph", "write", "--reachable", "--split", "--changed-paths"]))
+        steps += [
+            ("objetos-soltos", ["repack", "-d", "-q"]),
+            ("prune", ["prune", f"--expire={MAINTENANCE_PRUNE_EXPIRE}"]),
+            ("multi-pack-index", ["multi-pack-index", "write"]),
+            ("expire", ["multi-pack-index", "expire"]),
+            # O lote depende dos packs existentes naquele momento (a etapa de objetos soltos cria um)
+            ("repack-incremental", lambda: ["multi-pack-index", "repack", f"--batch-size={self.batch_size(repo)}"]),
+        ]
+        return steps
+
+    @staticmethod
+    def batch_size(repo):
+        """Tamanho do lote do repack incremental
+
+        Sem MAINTENANCE_REPACK_BATCH_SIZE, usa 1 byte a mais que o segundo maior pack
+        (limitado a 2 GiB): o pack grande do clone fica intacto e os pequenos, criados
+        pelos fetches de cada ciclo, são reunidos.
+        """
+        if MAINTENANCE_REPACK_BATCH_SIZE:
+            return MAINTENANCE_REPACK_BATCH_SIZE
+        pack_dir = os.path.join(repo["git_dir"], "objects", "pack")
+        try:
+            sizes = sorted((entry.stat().st_size for entry in os.scandir(pack_dir) if entry.name.endswith(".pack")),
+                           reverse=True)
+        except OSError:
+            sizes = []
+        if len(sizes) < 2:
+            return 0 if not sizes else sizes[0] + 1
+        return min(sizes[1] + 1, 2 * 1024 ** 3)
+
+    def maintain(self, key, repo):
+        """Executa (ou retoma) a manutenção de um repositório; retorna False se ela foi pausada"""
+        path = repo["path"]
+        steps = self.steps(repo)
+        if key in self._progress:
+            first_step, before = self._progress[key]
+            print(f"Manutenção de {path} retomada na etapa {steps[first_step][0]}")
         else:
-            print("Push realizado com sucesso!")
-            if push_result:
-                print(f"Saída: {push_result}")
+            print(f"Manutenção de {path} iniciada (repositório ocioso)")
+            first_step, before = 0, self.measure(repo)
+            METRICS.record_maintenance_timings(path, "antes", before["timings"])
+        for index in range(first_step, len(steps)):
+            if self._paused.is_set():
+                self._progress[key] = (index, before)
+                print(f"Manutenção de {path} pausada antes da etapa {steps[index][0]}: mudança detectada")
+                return False
+            name, args = steps[index]
+            # Como nos commits e pushes, nenhuma escrita no repositório roda junto com a etapa
+            locks = self._lock_repo(repo)
+            if locks is None:
+                self._progress[key] = (index, before)
+                print(f"Manutenção de {path} pausada antes da etapa {name}: mudança detectada")
+                return False
+            try:
+                if callable(args):
+                    args = args()
+                started = time.monotonic()
+                _, code, stderr = run_git_command(args, check=False, cwd=path, timeout=MAINTENANCE_STEP_TIMEOUT)
+                elapsed = time.monotonic() - started
+            finally:
+                for lock in reversed(locks):
+                    lock.release()
+            METRICS.record_maintenance_step(path, name, elapsed)
+            if code != 0:
+                print(f"Aviso: Etapa {name} da manutenção de {path} falhou: {stderr}")
+            else:
+                print(f"Manutenção de {path}: {name} em {elapsed:.2f}s")
+        self._progress.pop(key, None)
+        after = self.measure(repo)
+        METRICS.record_maintenance_timings(path, "depois", after["timings"])
+        comparison = [f"{query} {before['timings'][query]:.3f}s -> {seconds:.3f}s"
+                      for query, seconds in after["timings"].items() if query in before["timings"]]
+        comparison += [f"{name} {before['objects'][name]} -> {count}"
+                       for name, count in after["objects"].items() if name in before["objects"]]
+        print(f"Manutenção de {path} concluída: {', '.join(comparison)}")
+        get_state_cache().update(f"manutencao:{path}", last_run=time.time(), before=before, after=after)
+        return True
+
+    def measure(self, repo):
+        """Mede as consultas que o ciclo faz no repositório (melhor de MAINTENANCE_TIMING_RUNS execuções)
+
+        Retorna {"timings": {consulta: segundos}, "objects": {"soltos": n, "packs": n}}.
+        """
+        path = repo["path"]
+        queries = {"rev-list": ["rev-list", "--count", "--all"]}
+        tips, code, _ = run_git_command(["for-each-ref", "--format=%(objectname)", "refs/heads", "refs/remotes"],
+                                        check=False, cwd=path)
+        tips = sorted(set((tips or "").split())) if code == 0 else []
+        if len(tips) > 1:
+            queries["merge-base"] = ["merge-base", "--independent"] + tips
+        if repo["worktree"]:
+            queries["status"] = ["status", "--porcelain"]
+        timings = {}
+        for query, args in queries.items():
+            best = None
+            for _ in range(MAINTENANCE_TIMING_RUNS):
+                started = time.monotonic()
+                _, code, _ = run_git_command(args, check=False, cwd=path)
+                elapsed = time.monotonic() - started
+                if code != 0:
+                    break
+                best = elapsed if best is None else min(best, elapsed)
+            if best is not None:
+                timings[query] = round(best, 4)
+        objects = {}
+        counts, code, _ = run_git_command(["count-objects", "-v"], check=False, cwd=path)
+        if code == 0:
+            for line in (counts or "").splitlines():
+                field, _, value = line.partition(":")
+                if field in ("count", "packs"):
+                    objects["soltos" if field == "count" else "packs"] = int(value)
+        return {"timings": timings, "objects": objects}
+
+MAINTENANCE = RepoMaintenance()
+
+class VersionRegistry:
+    """Versão atual de cada recurso monitorado, com espera por mudanças (long-poll)"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._versions = {}  # recurso -> {"version": ..., "updated_at": ...}
+
+    def publish(self, name, version):
+        """Registra a versão do recurso e acorda quem está esperando; retorna True se mudou"""
+        with self._cond:
+            current = self._versions.get(name)
+            if current and current["version"] == version:
+                return False
+            self._versions[name] = {"version": version,
+                                    "updated_at": datetime.now(timezone.utc).isoformat(timespec="seconds")}
+            self._cond.notify_all()
             return True
-    else:
-        print("Push realizado com sucesso!")
-        if push_result:
-            print(f"Saída: {push_result}")
+
+    def _snapshot(self, name):
+        """(dados, etag) de um recurso, ou de todos com name=None; (None, None) se não existir"""
+        if name is None:
+            data = {key: dict(value) for key, value in sorted(self._versions.items())}
+            digest = hashlib.sha1(json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+            return data, f'"{digest}"'
+        entry = self._versions.get(name)
+        if entry is None:
+            return None, None
+        return dict(entry), f'"{entry["version"]}"'
+
+    def snapshot(self, name=None):
+        """Versão atual de um recurso (ou de todos) e seu ETag"""
+        with self._cond:
+            return self._snapshot(name)
+
+    def wait_for_change(self, name, etag, timeout):
+        """Espera o ETag do recurso deixar de ser `etag` (ou o timeout) e retorna o estado atual"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                data, current = self._snapshot(name)
+                remaining = deadline - time.monotonic()
+                if data is None or current != etag or remaining <= 0:
+                    return data, current
+                self._cond.wait(remaining)
+
+VERSION_REGISTRY = VersionRegistry()
+
+def etag_matches(if_none_match, etag):
+    """Indica se o cabeçalho If-None-Match contém o ETag atual"""
+    if not if_none_match or not etag:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate in ("*", etag):
+            return True
+    return False
+
+class _VersionRequestHandler(BaseHTTPRequestHandler):
+    """GET /versions (JSON com todos os recursos) e GET /versions/<recurso> (texto, como o arquivo bruto)
+
+    Com If-None-Match igual ao ETag atual a resposta é 304. Acrescentando ?wait=<segundos>,
+    a requisição fica aberta até a versão mudar (200) ou o tempo acabar (304).
+    """
+
+    server_version = "VersionUpdater/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        parts = [unquote(part) for part in url.path.split('/') if part]
+        if not parts or parts[0] != "versions" or len(parts) > 2:
+            return self._send(404, b"recurso desconhecido\n")
+        name = parts[1] if len(parts) == 2 else None
+        if_none_match = self.headers.get("If-None-Match")
+
+        data, etag = VERSION_REGISTRY.snapshot(name)
+        wait = parse_qs(url.query).get("wait")
+        if data is not None and wait and etag_matches(if_none_match, etag):
+            try:
+                timeout = min(max(float(wait[0]), 0.0), VERSION_LONGPOLL_MAX)
+            except ValueError:
+                return self._send(400, b"parametro wait invalido\n")
+            data, etag = VERSION_REGISTRY.wait_for_change(name, etag, timeout)
+        if data is None:
+            return self._send(404, b"recurso desconhecido\n")
+        if etag_matches(if_none_match, etag):
+            return self._send(304, None, etag)
+        if name is None:
+            return self._send(200, json.dumps(data, ensure_ascii=False).encode('utf-8'), etag,
+                              "application/json; charset=utf-8")
+        return self._send(200, data["version"].encode('utf-8'), etag)
+
+    def _send(self, status, body, etag=None, content_type="text/plain; charset=utf-8"):
+        self.send_response(status)
+        if etag:
+            self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")
+        if body is not None:
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+        else:
+            self.send_header("Content-Length", "0")
+        self.end_headers()
+        if body is not None:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Milhares de consultas por minuto não devem poluir o log do script
+        pass
+
+class _VersionHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    """Servidor HTTP com uma thread por conexão (requisições long-poll não bloqueiam as demais)"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+def start_version_server(targets, port, host=VERSION_SERVER_HOST):
+    """Inicia o serviço HTTP de versões em segundo plano, já com as versões atuais dos arquivos"""
+    for target in targets:
+        for published in [target] + [target.channel(branch) for branch in target.channels]:
+            current = get_current_version(published)
+            if current:
+                VERSION_REGISTRY.publish(os.path.basename(published.version_file), current)
+    server = _VersionHTTPServer((host, port), _VersionRequestHandler)
+    threading.Thread(target=server.serve_forever, name="version-http", daemon=True).start()
+    print(f"Serviço de versões em http://{host}:{server.server_address[1]}/versions")
+    return server
+
+class CycleTriggers:
+    """Pedidos de ciclo imediato por alvo (feitos pelo receptor de webhooks)
+
+    O loop de um único alvo espera com wait(); o loop de vários alvos inclui
+    wake_future() no seu wait() de futures para acordar assim que chegar um pedido.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._pending = {}  # alvo -> branches que receberam push
+        self._wake = Future()
+
+    def request(self, name, branch):
+        """Agenda um ciclo imediato do alvo"""
+        with self._cond:
+            self._pending.setdefault(name, set()).add(branch)
+            self._cond.notify_all()
+            wake = self._wake
+        if not wake.done():
+            wake.set_result(True)
+
+    def pending(self):
+        """Alvos com ciclo imediato pendente"""
+        with self._cond:
+            return set(self._pending)
+
+    def take(self, name):
+        """Remove e retorna as branches pendentes do alvo (ou None)"""
+        with self._cond:
+            return self._pending.pop(name, None)
+
+    def wait(self, name, timeout):
+        """Espera um pedido para o alvo (ou o timeout); retorna as branches pedidas ou None"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while name not in self._pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            return self._pending.pop(name)
+
+    def wake_future(self):
+        """Future resolvida no próximo pedido (reaproveitada até ser resolvida)"""
+        with self._cond:
+            if self._wake.done():
+                self._wake = Future()
+            return self._wake
+
+WEBHOOK_TRIGGERS = CycleTriggers()
+
+WEBHOOK_REPO_PATTERN = re.compile(r"[:/]([^/:]+/[^/:]+?)(?:\.git)?/?$")
+
+def webhook_repo_key(url):
+    """Identificador "dono/repositorio" (minúsculo) de uma URL de remoto, ou None"""
+    match = WEBHOOK_REPO_PATTERN.search((url or "").strip())
+    return match.group(1).lower() if match else None
+
+def verify_webhook_signature(secret, body, signature):
+    """Confere o cabeçalho X-Hub-Signature-256 (sha256=<hmac>) do payload"""
+    if not secret or not signature or not signature.startswith("sha256="):
+        return False
+    expected = hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+    # Compara bytes: cabeçalhos chegam decodificados como latin-1 e compare_digest rejeita str não-ASCII
+    received = signature[len("sha256="):].strip().lower().encode('latin-1', 'replace')
+    return hmac.compare_digest(expected.encode('ascii'), received)
+
+def is_webhook_push_payload(payload):
+    """Confere os tipos dos campos de um payload de push usados pelo receptor"""
+    if not isinstance(payload, dict) or not isinstance(payload.get("ref") or "", str):
+        return False
+    repository = payload.get("repository") or {}
+    if not isinstance(repository, dict):
+        return False
+    return all(isinstance(repository.get(key) or "", str)
+               for key in ("clone_url", "ssh_url", "git_url", "html_url", "full_name"))
+
+def webhook_secret():
+    """Segredo dos webhooks: WEBHOOK_SECRET ou a variável de ambiente VERSION_UPDATER_WEBHOOK_SECRET"""
+    return WEBHOOK_SECRET or os.environ.get("VERSION_UPDATER_WEBHOOK_SECRET")
+
+class _WebhookRequestHandler(BaseHTTPRequestHandler):
+    """POST de webhooks do GitHub: confere a assinatura e agenda o ciclo dos alvos da branch
+
+    Eventos push de uma branch monitorada respondem 202 com os alvos acionados; ping
+    responde 200; outros eventos e pushes de tags são ignorados (202).
+    """
+
+    server_version = "VersionUpdater/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = 0
+        if length <= 0 or length > WEBHOOK_MAX_BODY:
+            self.close_connection = True
+            return self._send(413 if length > 0 else 411, {"erro": "tamanho do payload invalido"})
+        body = self.rfile.read(length)
+        if not verify_webhook_signature(self.server.secret, body, self.headers.get("X-Hub-Signature-256")):
+            print("Aviso: Webhook recusado (assinatura inválida)")
+            return self._send(401, {"erro": "assinatura invalida"})
+
+        event = self.headers.get("X-GitHub-Event", "push")
+        if event == "ping":
+            return self._send(200, {"ok": "pong"})
+        if event != "push":
+            return self._send(202, {"ignorado": event})
+        try:
+            payload = json.loads(body.decode('utf-8'))
+        except ValueError:
+            return self._send(400, {"erro": "payload JSON invalido"})
+        if not is_webhook_push_payload(payload):
+            return self._send(400, {"erro": "payload de push invalido"})
+        ref = payload.get("ref") or ""
+        if not ref.startswith("refs/heads/"):
+            return self._send(202, {"ignorado": ref})
+        branch = ref[len("refs/heads/"):]
+        names = self.server.dispatch(branch, payload.get("repository") or {})
+        return self._send(202, {"branch": branch, "alvos": names})
+
+    def _send(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class _WebhookHTTPServer(_VersionHTTPServer):
+    """Receptor de webhooks: sabe quais alvos (e repositórios) cada push aciona"""
+
+    def __init__(self, address, targets, secret):
+        super().__init__(address, _WebhookRequestHandler)
+        self.targets = targets
+        self.secret = secret
+        self.repo_keys = {}
+        for target in targets:
+            url = target.remote_url
+            if not url:
+                url, code, _ = run_git_command(["remote", "get-url", "origin"], check=False, cwd=target.source_path)
+                url = url if code == 0 else None
+            self.repo_keys[target.name] = webhook_repo_key(url)
+
+    def dispatch(self, branch, repository):
+        """Agenda o ciclo imediato dos alvos que buscam `branch` do repositório do payload"""
+        pushed = {webhook_repo_key(repository.get(key)) for key in ("clone_url", "ssh_url", "git_url", "html_url")}
+        if repository.get("full_name"):
+            pushed.add(repository["full_name"].lower())
+        pushed.discard(None)
+        names = []
+        for target in self.targets:
+            if branch not in target.fetch_branches:
+                continue
+            # Sem identificação do repositório (de um lado ou do outro) vale só a branch
+            repo_key = self.repo_keys.get(target.name)
+            if repo_key and pushed and repo_key not in pushed:
+                continue
+            WEBHOOK_TRIGGERS.request(target.name, branch)
+            names.append(target.name)
+        print(f"Webhook: push em {branch} ({repository.get('full_name') or '?'}) -> "
+              f"{', '.join(names) if names else 'nenhum alvo monitorado'}")
+        return names
+
+def start_webhook_server(targets, port, host=WEBHOOK_HOST):
+    """Inicia o receptor de webhooks em segundo plano; retorna None se não houver segredo configurado"""
+    secret = webhook_secret()
+    if not secret:
+        print("Aviso: Receptor de webhooks não iniciado: configure WEBHOOK_SECRET ou VERSION_UPDATER_WEBHOOK_SECRET")
+        return None
+    server = _WebhookHTTPServer((host, port), targets, secret)
+    threading.Thread(target=server.serve_forever, name="webhook-http", daemon=True).start()
+    print(f"Receptor de webhooks em http://{host}:{server.server_address[1]}/ "
+          f"(polling de segurança a cada {WEBHOOK_SAFETY_INTERVAL}s)")
+    return server
+
+def send_test_webhook(payload_path, port, host=WEBHOOK_HOST):
+    """Envia um payload capturado (ex: "Recent Deliveries" do GitHub) ao receptor local, assinado com o segredo"""
+    with open(payload_path, 'rb') as f:
+        body = f.read()
+    secret = webhook_secret() or ""
+    signature = "sha256=" + hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+    request = Request(f"http://{host}:{port}/", data=body, method="POST", headers={
+        "Content-Type": "application/json",
+        "X-GitHub-Event": "push",
+        "X-Hub-Signature-256": signature,
+    })
+    try:
+        with urlopen(request, timeout=10) as response:
+            print(f"{response.status}: {response.read().decode('utf-8')}")
+    except OSError as e:
+        print(f"Erro ao enviar o webhook: {e}")
+
+def run_check(report=None, target=None, pipeline=None):
+    """Executa uma verificação de atualização (eventos do ciclo são registrados em `report`)
+
+    Com `pipeline`, o ciclo faz só a detecção e entrega a versão aos estágios seguintes.
+    """
+    target = target or default_target()
+    _cycle_local.report = report
+    _cycle_local.target = target
+    _cycle_local.stats = new_cycle_stats()
+    cycle_number = METRICS.cycle_count(target.name) + 1
+    profiling = False
+    if PROFILE_CYCLE == cycle_number or target.name in _profile_deferred:
+        # tracemalloc é global ao processo: um alvo perfilado por vez, os demais tentam no próximo ciclo
+        profiling = _profile_lock.acquire(blocking=False)
+        if profiling:
+            _profile_deferred.discard(target.name)
+        else:
+            _profile_deferred.add(target.name)
+            print(f"Perfil do ciclo {cycle_number} de {target.name} adiado: outro alvo está sendo perfilado; "
+                  f"nova tentativa no próximo ciclo")
+    if profiling:
+        profiler = cProfile.Profile()
+        tracemalloc.start()
+        profiler.enable()
+    started = time.monotonic()
+    result = None
+    try:
+        result = _run_check(target, pipeline)
+        return result
+    finally:
+        elapsed = time.monotonic() - started
+        if profiling:
+            profiler.disable()
+            save_cycle_profile(profiler, target, cycle_number)
+            _profile_lock.release()
+        stats = _cycle_local.stats
+        _cycle_local.stats = None
+        _cycle_local.snapshot = None
+        METRICS.observe_cycle(target.name, elapsed)
+        print(f"Ciclo {cycle_number} concluído em {elapsed:.2f}s ({stats['spawns']} processo(s) git)")
+        if METRICS_ENABLED:
+            METRICS.export({
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "target": target.name,
+                "cycle": cycle_number,
+                "seconds": round(elapsed, 4),
+                "result": result,
+                "changed": bool(report and report.changed),
+                "remote_error": bool(report and report.remote_error),
+                "spawns": stats["spawns"],
+                "git_seconds": {k: round(v, 4) for k, v in stats["git_seconds"].items()},
+                "git_calls": stats["git_calls"],
+                "transfer_bytes": stats["transfer_bytes"],
+            })
+        _cycle_local.report = None
+        _cycle_local.target = None
+
+def save_cycle_profile(profiler, target, cycle_number):
+    """Grava o perfil cProfile e o snapshot do tracemalloc de um ciclo em PROFILE_DIR"""
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        base = os.path.join(PROFILE_DIR, f"{re.sub(r'[^A-Za-z0-9_.-]', '_', target.name)}-ciclo{cycle_number}")
+        profiler.dump_stats(base + ".prof")
+        with open(base + ".memoria.txt", 'w', encoding='utf-8') as f:
+            for stat in snapshot.statistics("lineno")[:50]:
+                f.write(f"{stat}\n")
+        print(f"Perfil do ciclo {cycle_number} gravado em {base}.prof e {base}.memoria.txt")
+    except OSError as e:
+        print(f"Aviso: Não foi possível gravar o perfil do ciclo: {e}")
+
+class VersionJob:
+    """Versão detectada de um alvo, levada da detecção aos estágios de versão e publicação
+
+    Guarda o retrato de refs e a impressão digital do momento da detecção, então os
+    estágios seguintes publicam exatamente a versão detectada mesmo que o remoto já
+    tenha avançado. Os instantes de cada etapa medem a latência desde o commit.
+    """
+
+    def __init__(self, target, snapshot, fingerprint, version_string, should_update_fxmanifest):
+        self.target = target
+        self.snapshot = snapshot
+        self.fingerprint = fingerprint
+        self.version_string = version_string
+        self.should_update_fxmanifest = should_update_fxmanifest
+        self.generation = 0  # Ordem de detecção no pipeline (jobs superados são descartados)
+        info = snapshot.dev_commit
+        self.committed_at = info["committer_time"] if info else None
+        self.detected_at = time.time()
+        self.versioned_at = None
+        self.published_at = None
+        self.commit_success = False
+        self.channels_success = True
+        self.fxmanifest_success = True
+
+    def latency(self, moment):
+        """Segundos entre o commit e `moment` (None se algum dos dois for desconhecido)"""
+        if self.committed_at is None or moment is None:
+            return None
+        return max(0.0, moment - self.committed_at)
+
+def _run_check(target, pipeline=None):
+    """Corpo de run_check(): detecção seguida dos estágios de versão e publicação"""
+    # O heartbeat do lease só é renovado enquanto o ciclo não passar de LEASE_TTL
+    token = LEASES.begin_work(target)
+    try:
+        # Só a instância dona do lease do alvo faz fetch, commits e pushes
+        if LEASE_ENABLED:
+            owned, lease = LEASES.acquire(target)
+            if not owned:
+                reuse_lease_result(target, lease)
+                return True
+        if pipeline is not None:
+            return pipeline.detect(target)
+        result, job = detect_version(target)
+        if job is None:
+            return result
+        apply_version_job(job)
+        publish_version_job(job)
         return True
+    finally:
+        LEASES.end_work(target, token)
 
-def run_check():
-    """Executa uma verificação de atualização"""
+def detect_version(target, pending_key=None):
+    """Estágio de detecção: fetch, retrato de refs, ancestralidade e versão a gerar
+
+    Retorna (resultado, job): resultado False em caso de erro; job None quando não há
+    nada a fazer (nada mudou desde o último ciclo concluído ou a mesma mudança já está
+    a caminho no pipeline, `pending_key`, ver pipeline_key()).
+    """
+    # No modo de metadados, cria o clone parcial gerenciado na primeira execução
+    if target.metadata_only and not ensure_metadata_clone(target):
+        return False, None
+    
     # Verifica se o repositório Git existe
-    git_path = os.path.join(REPO_PATH, ".git")
+    git_path = target.git_dir
     if not os.path.exists(git_path):
-        print(f"Erro: O diretório {REPO_PATH} não é um repositório Git!")
-        return False
+        print(f"Erro: O diretório {target.repo_path} não é um repositório Git!")
+        return False, None
+    
+    # Pushes que seguem falhando na fila contam como falha de remoto para o agendador
+    if PUSH_QUEUE.is_failing(target.versions_repo):
+        mark_cycle(remote_error=True)
     
-    # Verifica periodicamente se os 15 últimos commits de development estão na main
-    print("Verificando se os 15 últimos commits de development estão na branch main...")
-    should_update_fxmanifest = are_last_15_dev_commits_in_main()
+    # Busca atualizações do remoto uma única vez por ciclo
+    fetch_monitored_repo(target)
+    
+    # Todas as consultas de refs do ciclo partem deste retrato (montado após o fetch)
+    _cycle_local.snapshot = RefSnapshot(target)
+    
+    # Se nada mudou desde o último ciclo concluído, não há o que fazer
+    state_cache = get_state_cache()
+    cached_state = state_cache.get(target.name)
+    fingerprint = compute_fingerprint(target)
+    if fingerprint["dev_tip"] and cached_state.get("fingerprint") == fingerprint:
+        print(f"Nenhuma mudança desde o último ciclo (development: {fingerprint['dev_tip'][:8]}, "
+              f"main: {(fingerprint['main_tip'] or '')[:8]}) - nada a fazer")
+        return True, None
+    # Verifica periodicamente se os últimos commits de development estão na main
+    print(f"Verificando se os {DEV_COMMITS_WINDOW} últimos commits de development estão na branch main...")
+    should_update_fxmanifest, _ = check_dev_commits_in_main(target=target)
     if should_update_fxmanifest:
         print("✓ Todos os últimos commits de development estão na branch main - fxmanifest será atualizado")
     else:
@@ -670,16 +4017,16 @@ def run_check():
     print("-" * 50)
     
     # Obtém o hash do commit atual do repositório monitorado
-    current_repo_hash = get_commit_hash()
+    current_repo_hash = get_commit_hash(target)
     if not current_repo_hash:
         print("Erro: Não foi possível obter o hash do commit")
-        return False
+        return False, None
     
     # Formata o hash para 7 caracteres em maiúsculas
     current_repo_hash = current_repo_hash[:7].upper()
     
     # Obtém a versão atual do arquivo
-    current_file_version = get_current_version()
+    current_file_version = get_current_version(target)
     
     # Se o arquivo existe, extrai o hash da versão atual
     if current_file_version:
@@ -690,62 +4037,135 @@ def run_check():
             # Se o hash já é o mesmo, não precisa atualizar hype_maps
             # MAS ainda verifica fxmanifest.lua independentemente
             if current_file_hash == current_repo_hash:
-                print(f"Versão no hype_maps já está atualizada. Hash: {current_repo_hash}")
+                print(f"Versão no {target.version_file} já está atualizada. Hash: {current_repo_hash}")
                 print("Continuando para verificar fxmanifest.lua independentemente...")
                 # Não retorna True aqui, continua para verificar fxmanifest.lua
     
     # Verifica atualizações (para log)
-    has_updates, commit_hash = check_git_updates()
+    has_updates, commit_hash = check_git_updates(target)
     
     # Usa o hash atual do repositório
     commit_hash = current_repo_hash
     
-    date_str = get_commit_date()
+    date_str = get_commit_date(target)
     version_string = create_version_string(commit_hash, date_str)
     
-    print(f"\nNova versão gerada: {version_string}")
+    if pending_key is not None and pending_key == pipeline_key(fingerprint, version_string):
+        print(f"Versão {version_string} já está a caminho no pipeline (development: {fingerprint['dev_tip'][:8]}) - nada a fazer")
+        return True, None
     
-    # Inicializa commit_success como False por padrão
+    print(f"\nNova versão gerada: {version_string}")
+    return True, VersionJob(target, get_ref_snapshot(target), fingerprint, version_string, should_update_fxmanifest)
+
+def apply_version_job(job):
+    """Estágio de versão: grava, commita e anuncia o arquivo de versão (e os dos canais)"""
+    target = job.target
+    version_string = job.version_string
     commit_success = False
     
-    # PRIMEIRO: Atualiza o arquivo hype_maps com a hash gerada (se necessário)
-    print("1. Verificando e atualizando arquivo hype_maps com a hash gerada...")
-    file_changed = update_version_file(version_string)
-    
-    if file_changed:
-        print("✓ Arquivo hype_maps atualizado com sucesso!")
-        # Faz commit e push do arquivo hype_maps no repositório atual
-        print("\n2. Fazendo commit e push do hype_maps...")
-        commit_success = commit_and_push(version_string)
-        if not commit_success:
-            print("Aviso: Problema ao fazer commit do hype_maps, mas continuando...")
-    else:
-        print("Arquivo hype_maps não foi alterado (versão já está atualizada).")
+    # PRIMEIRO: Atualiza o arquivo de versão com a hash gerada (se necessário)
+    # O lock serializa alvos que commitam no mesmo repositório de versões
+    print(f"1. Verificando e atualizando arquivo {target.version_file} com a hash gerada...")
+    with repo_lock(target.versions_repo):
+        file_changed = update_version_file(version_string, target)
+        
+        if file_changed:
+            mark_cycle(changed=True)
+            print(f"✓ Arquivo {target.version_file} atualizado com sucesso!")
+            # Faz commit e push do arquivo de versão no repositório de versões
+            print(f"\n2. Fazendo commit e push do {target.version_file}...")
+            commit_success = commit_and_push(version_string, target)
+            if not commit_success:
+                print(f"Aviso: Problema ao fazer commit do {target.version_file}, mas continuando...")
+    
+    # Servidores que aguardam em long-poll recebem a nova versão imediatamente
+    if file_changed or get_current_version(target) == version_string:
+        VERSION_REGISTRY.publish(os.path.basename(target.version_file), version_string)
+        job.versioned_at = time.time()
+        METRICS.observe_version_latency(target.name, "versao", job.latency(job.versioned_at))
+        dev_info = job.snapshot.dev_commit
+        LEASES.record_result(target, os.path.basename(target.version_file), version_string,
+                             dev_info["hash"] if dev_info else None)
+        get_version_history().record(version_string, resource=os.path.basename(target.version_file),
+                                     commit=dev_info["hash"] if dev_info else None,
+                                     committed_at=dev_info["committer_time"] if dev_info else None,
+                                     main=job.fingerprint["main_tip"])
+    
+    if not file_changed:
+        print(f"Arquivo {target.version_file} não foi alterado (versão já está atualizada).")
         print("Continuando para verificar fxmanifest.lua independentemente...")
         # Não houve commit porque não havia mudanças, mas isso é OK
         commit_success = True  # Considera sucesso pois não havia mudanças para commitar
     
+    # Canais extras (outras branches -> outros arquivos de versão) saem do mesmo fetch e retrato
+    if target.channels:
+        print(f"\nGerando versões dos canais: {', '.join(sorted(target.channels))}...")
+        job.channels_success = update_channel_versions(target)
+    job.commit_success = commit_success
+
+def publish_version_job(job, refresh_snapshot=True):
+    """Estágio de publicação: fxmanifest.lua na main, modo em massa e estado final do alvo
+
+    `refresh_snapshot` refaz o retrato de refs antes de guardar a impressão digital; o
+    pipeline guarda a do próprio job, pois a detecção pode já ter buscado refs mais novas.
+    """
+    target = job.target
+    version_string = job.version_string
+    should_update_fxmanifest = job.should_update_fxmanifest
+    state_cache = get_state_cache()
+    fxmanifest_success = True
+    
     # DEPOIS: Atualiza o fxmanifest.lua na branch main independentemente do hype_maps
     # Isso acontece periodicamente se os 5 últimos commits de development estiverem na main
-    if should_update_fxmanifest:
-        print("\n3. Verificando e atualizando fxmanifest.lua na branch main (independente do hype_maps)...")
-        # Atualiza o fxmanifest.lua com a hash e informações da versão (mesma que foi usada no hype_maps)
-        fxmanifest_changed = update_fxmanifest(version_string)
-        if fxmanifest_changed:
-            print("✓ fxmanifest.lua atualizado com sucesso!")
-        else:
-            # Mesmo que a versão já esteja atualizada, verifica se precisa fazer commit na branch main
-            print("Versão no fxmanifest.lua já está correta, mas verificando se precisa commit na branch main...")
-            # Força a verificação e commit na branch main mesmo se a versão já estiver correta
-            fxmanifest_changed = True  # Marca como alterado para forçar o commit
-        
-        # Faz commit do fxmanifest.lua na branch main (independente do hype_maps)
-        print("\n4. Fazendo commit do fxmanifest.lua na branch main...")
-        commit_fxmanifest_in_repo(version_string)
-    else:
+    if should_update_fxmanifest and target.fxmanifest_path:
+        print("\n3. Verificando e atualizando fxmanifest.lua na branch main (independente do arquivo de versão)...")
+        fxmanifest_dir = os.path.dirname(target.fxmanifest_path)
+        # O checkout da main no repositório do fxmanifest não pode ser intercalado com outro alvo
+        with repo_lock(find_git_repo_root(fxmanifest_dir) or fxmanifest_dir):
+            if state_cache.get(target.name).get("manifest_published") == version_string:
+                print("Versão no fxmanifest.lua já foi publicada na branch main")
+            else:
+                # Atualiza o fxmanifest.lua com a hash e informações da versão (mesma usada no arquivo de versão)
+                # e faz commit na branch main (independente do arquivo de versão)
+                print("\n4. Fazendo commit do fxmanifest.lua na branch main...")
+                fxmanifest_success = commit_fxmanifest_to_main(version_string, target)
+                if fxmanifest_success:
+                    def manifest_pushed():
+                        # Só conta como publicada quando o commit da main chega ao remoto
+                        state_cache.update(target.name, manifest_published=version_string)
+                        job.published_at = time.time()
+                        METRICS.observe_version_latency(target.name, "fxmanifest", job.latency(job.published_at))
+                        get_version_history().record(version_string, resource=os.path.basename(target.version_file),
+                                                     manifest_published_at=round(job.published_at, 3))
+                    fxmanifest_repo = find_git_repo_root(fxmanifest_dir) or fxmanifest_dir
+                    if not when_pushed(f"{target.name}:fxmanifest", unpushed_branches(fxmanifest_repo, "main"),
+                                       manifest_pushed):
+                        print("fxmanifest.lua commitado na main; a publicação é confirmada após o push")
+    elif not target.fxmanifest_path and not target.fxmanifest_root:
+        print("fxmanifest.lua não configurado para este alvo")
+    elif not should_update_fxmanifest:
         print("fxmanifest.lua não será atualizado: nem todos os últimos commits de development estão na branch main")
     
-    if commit_success:
+    # Modo em massa: todos os fxmanifest.lua sob fxmanifest_root (apenas em disco)
+    if should_update_fxmanifest and target.fxmanifest_root:
+        if update_fxmanifests_bulk(version_string, target.fxmanifest_root):
+            mark_cycle(changed=True)
+    
+    # Guarda o estado final apenas se o ciclo terminou sem falhas (senão tenta de novo no próximo)
+    job.fxmanifest_success = fxmanifest_success
+    if job.commit_success and fxmanifest_success and job.channels_success:
+        if refresh_snapshot:
+            # O commit do fxmanifest pode ter movido a main: refaz o retrato antes de guardar
+            _cycle_local.snapshot = RefSnapshot(target)
+        fingerprint = compute_fingerprint(target)
+        # Commits ainda sem push: o estado só é guardado quando chegarem ao remoto
+        keys = unpushed_branches(target.versions_repo)
+        if should_update_fxmanifest and target.fxmanifest_path:
+            fxmanifest_dir = os.path.dirname(target.fxmanifest_path)
+            keys += unpushed_branches(find_git_repo_root(fxmanifest_dir) or fxmanifest_dir, "main")
+        when_pushed(f"{target.name}:estado", keys, lambda: state_cache.update(target.name, fingerprint=fingerprint))
+    
+    if job.commit_success:
         print("\n" + "=" * 50)
         print("Processo concluído com sucesso!")
         print("=" * 50)
@@ -753,33 +4173,524 @@ def run_check():
         print("\n" + "=" * 50)
         print("Processo concluído (sem mudanças para commitar)")
         print("=" * 50)
-    
-    return True
+
+class VersionPipeline:
+    """Estágios de detecção, versão e publicação ligados por filas limitadas
+
+    A detecção roda nos ciclos do daemon; a versão (arquivo + commit) e a publicação
+    (fxmanifest.lua na main) rodam cada uma em sua thread, então um commit ou push
+    lento não impede que novos commits sejam notados. Filas cheias seguram a detecção
+    (contrapressão) e um job superado por uma versão mais nova do mesmo alvo antes de
+    chegar a um estágio é descartado.
+    """
+
+    STAGES = ("versao", "publicacao")
+
+    def __init__(self, queue_size=PIPELINE_QUEUE_SIZE):
+        self._lock = threading.Lock()
+        self._generation = {}  # alvo -> geração do último job detectado
+        self._pending = {}  # alvo -> pipeline_key() do último job ainda no pipeline
+        self.stats = {"detected": 0, "dropped": 0, "completed": 0}
+        self._queues = {stage: queue.Queue(maxsize=queue_size) for stage in self.STAGES}
+        self._threads = []
+        for stage in self.STAGES:
+            thread = threading.Thread(target=self._run_stage, args=(stage,), name=f"pipeline-{stage}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def depth(self, stage):
+        """Jobs aguardando no estágio"""
+        return self._queues[stage].qsize()
+
+    def detect(self, target):
+        """Estágio de detecção (no ciclo do daemon): entrega a versão detectada ao estágio de versão"""
+        with self._lock:
+            pending = self._pending.get(target.name)
+        result, job = detect_version(target, pending)
+        if job is None:
+            return result
+        with self._lock:
+            job.generation = self._generation.get(target.name, 0) + 1
+            self._generation[target.name] = job.generation
+            self._pending[target.name] = pipeline_key(job.fingerprint, job.version_string)
+            self.stats["detected"] += 1
+        mark_cycle(changed=True)
+        METRICS.observe_version_latency(target.name, "deteccao", job.latency(job.detected_at))
+        print(f"Versão {job.version_string} enviada ao pipeline (fila de versão: {self.depth('versao')})")
+        self._queues["versao"].put(job)
+        return result
+
+    def is_stale(self, job):
+        """Indica se já foi detectada uma versão mais nova do mesmo alvo"""
+        with self._lock:
+            return job.generation < self._generation.get(job.target.name, 0)
+
+    def _run_stage(self, stage):
+        """Loop da thread de um estágio"""
+        stage_queue = self._queues[stage]
+        next_stage = self.STAGES.index(stage) + 1
+        while True:
+            job = stage_queue.get()
+            if job is None:
+                # Encerramento: repassa o aviso ao próximo estágio depois dos jobs que já estão lá
+                if next_stage < len(self.STAGES):
+                    self._queues[self.STAGES[next_stage]].put(None)
+                return
+            if self.is_stale(job):
+                with self._lock:
+                    self.stats["dropped"] += 1
+                METRICS.record_pipeline_drop(stage)
+                print(f"[{job.target.name}] Versão {job.version_string} superada antes do estágio {stage} - descartada")
+                continue
+            _cycle_local.target = job.target
+            _cycle_local.snapshot = job.snapshot
+            _cycle_local.stats = new_cycle_stats()
+            token = LEASES.begin_work(job.target)
+            try:
+                if stage == "versao":
+                    apply_version_job(job)
+                else:
+                    publish_version_job(job, refresh_snapshot=False)
+            except Exception as e:
+                print(f"Erro inesperado no estágio {stage} de {job.target.name}: {e}")
+                self._finish(job)
+                continue
+            finally:
+                LEASES.end_work(job.target, token)
+                _cycle_local.target = None
+                _cycle_local.snapshot = None
+                _cycle_local.stats = None
+            if next_stage < len(self.STAGES):
+                self._queues[self.STAGES[next_stage]].put(job)
+            else:
+                self._finish(job)
+
+    def _finish(self, job):
+        """Encerra o job; se era o mais recente do alvo, libera a detecção da mesma mudança"""
+        with self._lock:
+            self.stats["completed"] += 1
+            if job.generation == self._generation.get(job.target.name):
+                self._pending.pop(job.target.name, None)
+        parts = [f"detecção {job.latency(job.detected_at):.1f}s"] if job.latency(job.detected_at) is not None else []
+        if job.latency(job.versioned_at) is not None:
+            parts.append(f"versão {job.latency(job.versioned_at):.1f}s")
+        if job.latency(job.published_at) is not None:
+            parts.append(f"fxmanifest {job.latency(job.published_at):.1f}s")
+        if parts:
+            print(f"[{job.target.name}] Latência desde o commit de {job.version_string}: {', '.join(parts)}")
+
+    def close(self, timeout=None):
+        """Processa os jobs já enfileirados e encerra os estágios (espera até `timeout`)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            # Com a fila cheia, o aviso de encerramento também respeita o timeout
+            self._queues[self.STAGES[0]].put(None, timeout=timeout)
+        except queue.Full:
+            return False
+        for thread in self._threads:
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        return not any(thread.is_alive() for thread in self._threads)
+
+class AdaptiveScheduler:
+    """Escolhe o intervalo até o próximo ciclo a partir do resultado do ciclo anterior
+
+    - Logo após uma mudança, usa SCHEDULER_MIN_INTERVAL por SCHEDULER_HOT_CYCLES ciclos
+    - Em períodos ociosos, parte de CHECK_INTERVAL e cresce exponencialmente até SCHEDULER_MAX_IDLE_INTERVAL
+    - Após falhas de remoto/autenticação, cresce exponencialmente até SCHEDULER_MAX_ERROR_INTERVAL
+    - Durante QUIET_HOURS, nunca fica abaixo de QUIET_HOURS_INTERVAL
+    - Com o receptor de webhooks ativo, nunca fica abaixo de `safety_interval` (polling só de segurança)
+    - Aplica jitter de ±SCHEDULER_JITTER para espalhar vários hosts no tempo
+    """
+
+    def __init__(self, safety_interval=None):
+        self.safety_interval = safety_interval
+        self.idle_streak = 0
+        self.error_streak = 0
+        self.hot_cycles_left = 0
+        self.last_interval = CHECK_INTERVAL
+        self.last_reason = "inicial"
+
+    def in_quiet_hours(self, now=None):
+        """Indica se o horário atual está dentro de QUIET_HOURS (suporta virada de meia-noite)"""
+        if not QUIET_HOURS:
+            return False
+        start, end = QUIET_HOURS
+        hour = (now or datetime.now()).hour
+        if start <= end:
+            return start <= hour < end
+        return hour >= start or hour < end
+
+    def next_interval(self, report, now=None):
+        """Retorna o intervalo (em segundos) até o próximo ciclo"""
+        if report.remote_error:
+            self.error_streak += 1
+            self.idle_streak = 0
+            interval = min(CHECK_INTERVAL * SCHEDULER_BACKOFF ** self.error_streak, SCHEDULER_MAX_ERROR_INTERVAL)
+            reason = f"backoff após falha de remoto/autenticação (falhas seguidas: {self.error_streak})"
+        elif report.changed:
+            self.error_streak = 0
+            self.idle_streak = 0
+            self.hot_cycles_left = SCHEDULER_HOT_CYCLES
+            interval = SCHEDULER_MIN_INTERVAL
+            reason = "mudança detectada"
+        elif self.hot_cycles_left > 0:
+            self.error_streak = 0
+            self.hot_cycles_left -= 1
+            interval = SCHEDULER_MIN_INTERVAL
+            reason = "acompanhando mudança recente"
+        else:
+            self.error_streak = 0
+            interval = min(CHECK_INTERVAL * SCHEDULER_BACKOFF ** self.idle_streak, SCHEDULER_MAX_IDLE_INTERVAL)
+            self.idle_streak += 1
+            reason = f"ocioso (ciclos sem mudança: {self.idle_streak})"
+
+        if self.in_quiet_hours(now) and interval < QUIET_HOURS_INTERVAL:
+            interval = QUIET_HOURS_INTERVAL
+            reason += ", horário silencioso"
+
+        if self.safety_interval and interval < self.safety_interval:
+            interval = self.safety_interval
+            reason += ", webhooks ativos"
+
+        interval *= random.uniform(1 - SCHEDULER_JITTER, 1 + SCHEDULER_JITTER)
+        self.last_interval = round(interval, 1)
+        self.last_reason = reason
+        return self.last_interval
+
+class _WatchEventHandler(FileSystemEventHandler):
+    """Repassa eventos do watchdog relevantes para o RefWatcher"""
+
+    def __init__(self, watcher):
+        super().__init__()
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        paths = [getattr(event, "src_path", None), getattr(event, "dest_path", None)]
+        if any(path and self.watcher.is_watched(path) for path in paths):
+            self.watcher.notify()
+
+class RefWatcher:
+    """Observa refs, packed-refs e FETCH_HEAD do repositório monitorado e o arquivo de versão
+
+    Usa o watchdog quando disponível e, caso contrário, compara periodicamente
+    (mtime, tamanho) dos arquivos observados. Rajadas de mudanças são agrupadas
+    em um único disparo (debounce).
+    """
+
+    def __init__(self, target=None):
+        target = target or default_target()
+        self.git_dir = os.path.abspath(target.git_dir)
+        self.refs_dir = os.path.join(self.git_dir, "refs")
+        self.git_files = [os.path.join(self.git_dir, name) for name in ("packed-refs", "FETCH_HEAD")]
+        self.version_file = os.path.abspath(target.version_path)
+        self._changed = threading.Event()
+        self._snapshot = self._take_snapshot()
+        self._observer = None
+        if Observer is not None:
+            try:
+                handler = _WatchEventHandler(self)
+                self._observer = Observer()
+                self._observer.schedule(handler, self.git_dir, recursive=True)
+                self._observer.schedule(handler, os.path.dirname(self.version_file), recursive=False)
+                self._observer.start()
+                print("Modo watch: usando watchdog para observar mudanças")
+            except Exception as e:
+                print(f"Aviso: watchdog indisponível ({e}), usando polling")
+                self._observer = None
+        if self._observer is None:
+            print(f"Modo watch: usando polling a cada {WATCH_POLL_INTERVAL}s")
+
+    def is_watched(self, path):
+        """Indica se o caminho (de um evento) é um dos arquivos observados"""
+        path = os.path.abspath(path)
+        if path.endswith(".lock"):
+            return False
+        if path == self.version_file or path in self.git_files:
+            return True
+        return path.startswith(self.refs_dir + os.sep)
+
+    def notify(self):
+        """Sinaliza que algo mudou"""
+        self._changed.set()
+
+    def _take_snapshot(self):
+        """Retorna {caminho: (mtime, tamanho)} dos arquivos observados"""
+        snapshot = {}
+        paths = list(self.git_files) + [self.version_file]
+        for root, _, files in os.walk(self.refs_dir):
+            paths.extend(os.path.join(root, name) for name in files if not name.endswith(".lock"))
+        for path in paths:
+            try:
+                st = os.stat(path)
+                snapshot[path] = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                pass
+        return snapshot
+
+    def _poll(self):
+        """Compara o estado atual com o último snapshot (modo polling)"""
+        snapshot = self._take_snapshot()
+        if snapshot != self._snapshot:
+            self._snapshot = snapshot
+            self._changed.set()
+
+    def _wait_event(self, timeout):
+        """Espera até `timeout` segundos por uma mudança e retorna True se houve"""
+        if self._observer is not None:
+            return self._changed.wait(timeout)
+        deadline = time.monotonic() + timeout
+        while not self._changed.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(WATCH_POLL_INTERVAL, remaining))
+            self._poll()
+        return True
+
+    def wait_for_change(self, timeout):
+        """Espera por mudanças (com debounce) e retorna True, ou False se o timeout expirar"""
+        if not self._wait_event(timeout):
+            return False
+        # Agrupa a rajada: espera até ficar WATCH_DEBOUNCE segundos sem novas mudanças
+        while True:
+            self._changed.clear()
+            if not self._wait_event(WATCH_DEBOUNCE):
+                return True
+
+    def resync(self):
+        """Descarta mudanças feitas pelo próprio ciclo (fetch, commit) antes de voltar a esperar"""
+        self._snapshot = self._take_snapshot()
+        self._changed.clear()
+
+    def stop(self):
+        """Encerra o observador nativo, se houver"""
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+
+def run_watch_loop(target=None):
+    """Loop do modo watch: executa um ciclo apenas quando algo observado mudar"""
+    watcher = RefWatcher(target)
+    try:
+        while True:
+            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            print(f"\n[{timestamp}] Iniciando verificação...")
+            print("-" * 50)
+            
+            run_check(target=target)
+            watcher.resync()
+            
+            print(f"\nAguardando mudanças (ciclo de segurança em {WATCH_SAFETY_INTERVAL} segundos)...")
+            if watcher.wait_for_change(WATCH_SAFETY_INTERVAL):
+                print("Mudança detectada nas refs ou no arquivo de versão")
+    finally:
+        watcher.stop()
+
+class _TargetPrefixedStdout:
+    """Prefixa cada linha impressa com o nome do alvo em execução na thread atual"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._buffers = threading.local()
+        self._lock = threading.Lock()
+
+    def write(self, text):
+        buffer = getattr(self._buffers, "text", "") + text
+        lines = buffer.split('\n')
+        self._buffers.text = lines.pop()
+        if lines:
+            target = getattr(_cycle_local, "target", None)
+            prefix = f"[{target.name}] " if target else ""
+            with self._lock:
+                self.stream.write("".join(f"{prefix}{line}\n" for line in lines))
+        return len(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+def _run_target_cycle(target, pipeline=None):
+    """Executa um ciclo de um alvo e retorna seu relatório"""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    report = CycleReport()
+    _cycle_local.target = target
+    print(f"\n[{timestamp}] Iniciando verificação de {target.name}...")
+    print("-" * 50)
+    try:
+        run_check(report, target, pipeline)
+    except Exception as e:
+        print(f"Erro inesperado no ciclo de {target.name}: {e}")
+    return report
+
+def run_daemon(targets, max_workers=MAX_WORKERS, safety_interval=None, pipeline=None):
+    """Verifica vários alvos em paralelo, cada um com o próprio agendador
+
+    Cada alvo é reagendado assim que seu ciclo termina, então um repositório
+    lento não atrasa os demais e o tempo de ciclo acompanha o alvo mais lento,
+    não a soma de todos. Um webhook de push antecipa o próximo ciclo do alvo.
+    """
+    schedulers = {target.name: AdaptiveScheduler(safety_interval) for target in targets}
+    next_due = {target.name: 0.0 for target in targets}
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="alvo") as executor:
+        while True:
+            now = time.monotonic()
+            # Alvos acionados por webhook rodam já (os que estão em ciclo, logo em seguida)
+            for name in WEBHOOK_TRIGGERS.pending():
+                if name in next_due and name not in running.values():
+                    WEBHOOK_TRIGGERS.take(name)
+                    next_due[name] = now
+            for target in targets:
+                if target.name not in running.values() and next_due[target.name] <= now:
+                    running[executor.submit(_run_target_cycle, target, pipeline)] = target.name
+
+            idle = [name for name in next_due if name not in running.values()]
+            timeout = max(0.0, min(next_due[name] for name in idle) - now) if idle else None
+            wake = WEBHOOK_TRIGGERS.wake_future()
+            done, _ = wait(list(running) + [wake], timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future is wake:
+                    continue
+                name = running.pop(future)
+                interval = schedulers[name].next_interval(future.result())
+                next_due[name] = time.monotonic() + interval
+                print(f"[{name}] Próxima verificação em {interval} segundos ({schedulers[name].last_reason})")
+
+def format_history_record(record):
+    """Linha legível de um registro do histórico de versões"""
+    published = datetime.fromtimestamp(record["published_at"]).strftime("%Y-%m-%d %H:%M:%S")
+    manifest = " (fxmanifest publicado)" if record.get("manifest_published_at") else ""
+    return (f"{record['version']}  {record.get('resource', '?')}  commit {record.get('commit') or '?'}  "
+            f"main {(record.get('main') or '?')[:8]}  publicada em {published}{manifest}")
+
+def print_version_history(version=None, date_range=None):
+    """Consulta o histórico de versões pela linha de comando"""
+    history = get_version_history()
+    if version:
+        records = history.lookup_all(version)
+        for record in records:
+            print(format_history_record(record))
+        if not records:
+            print(f"Versão {version} não encontrada no histórico")
+    if date_range:
+        start = datetime.strptime(date_range[0], "%Y-%m-%d").timestamp()
+        end = (datetime.strptime(date_range[1], "%Y-%m-%d") + timedelta(days=1)).timestamp()
+        records = history.between(start, end)
+        for record in records:
+            print(format_history_record(record))
+        print(f"{len(records)} versão(ões) entre {date_range[0]} e {date_range[1]}")
+
+def parse_args(argv=None):
+    """Lê as opções de linha de comando"""
+    parser = argparse.ArgumentParser(description="Script de Atualização de Versão")
+    parser.add_argument("--watch", action="store_true", default=WATCH_MODE,
+                        help="executa ciclos apenas quando refs ou o arquivo de versão mudarem")
+    parser.add_argument("--config", default=TARGETS_CONFIG,
+                        help="arquivo JSON com a lista de alvos monitorados")
+    parser.add_argument("--profile-cycle", type=int, default=PROFILE_CYCLE, metavar="N",
+                        help="grava perfil cProfile e snapshot tracemalloc do ciclo N de cada alvo")
+    parser.add_argument("--lookup", metavar="VERSAO",
+                        help="mostra o commit de origem de uma versão HYPE-... (histórico local) e sai")
+    parser.add_argument("--history", nargs=2, metavar=("DE", "ATE"),
+                        help="lista as versões publicadas entre duas datas (AAAA-MM-DD) e sai")
+    parser.add_argument("--http-port", type=int, default=VERSION_SERVER_PORT, metavar="PORTA",
+                        help="serve as versões atuais por HTTP (ETag/304 e long-poll) nesta porta")
+    parser.add_argument("--webhook-port", type=int, default=WEBHOOK_PORT, metavar="PORTA",
+                        help="recebe webhooks de push do GitHub nesta porta e reduz o polling a um ciclo de segurança")
+    parser.add_argument("--send-webhook", metavar="ARQUIVO",
+                        help="envia um payload de push capturado, assinado, ao receptor local (--webhook-port) e sai")
+    return parser.parse_args(argv)
 
 def main():
     """Função principal com loop periódico"""
+    global PROFILE_CYCLE
+    args = parse_args()
+    PROFILE_CYCLE = args.profile_cycle
+    if args.lookup or args.history:
+        print_version_history(args.lookup, args.history)
+        return
+    if args.send_webhook:
+        if args.webhook_port is None:
+            print("Erro: informe a porta do receptor com --webhook-port")
+        else:
+            send_test_webhook(args.send_webhook, args.webhook_port)
+        return
+    targets, max_workers = load_targets(args.config)
     print("=" * 50)
     print("Script de Atualização de Versão")
-    print(f"Verificando a cada {CHECK_INTERVAL} segundos")
+    if len(targets) > 1:
+        print(f"Alvos monitorados: {', '.join(target.name for target in targets)} (até {max_workers} em paralelo)")
+    if args.watch:
+        print("Modo watch: verificando quando refs ou o arquivo de versão mudarem")
+    else:
+        print(f"Verificando a cada {CHECK_INTERVAL} segundos (intervalo adaptativo)")
     print("Pressione Ctrl+C para parar")
     print("=" * 50)
     
+    version_server = None
+    webhook_server = None
+    pipeline = None
     try:
+        if args.http_port is not None:
+            version_server = start_version_server(targets, args.http_port)
+        if args.webhook_port is not None:
+            webhook_server = start_webhook_server(targets, args.webhook_port)
+        safety_interval = WEBHOOK_SAFETY_INTERVAL if webhook_server else None
+        if PIPELINE_ENABLED and not args.watch:
+            pipeline = VersionPipeline()
+        if PUSH_QUEUE_ENABLED:
+            requeue_unpushed_commits(targets)
+        if FAST_STATUS_CONFIG:
+            prepare_fast_status(targets)
+        if MAINTENANCE_ENABLED:
+            MAINTENANCE.start(targets)
+        if len(targets) > 1:
+            sys.stdout = _TargetPrefixedStdout(sys.stdout)
+            if args.watch:
+                # Um observador por alvo, cada um em sua própria thread
+                for target in targets:
+                    threading.Thread(target=run_watch_loop, args=(target,), daemon=True).start()
+                while True:
+                    time.sleep(3600)
+            run_daemon(targets, max_workers, safety_interval, pipeline)
+        target = targets[0]
+        if args.watch:
+            run_watch_loop(target)
+        scheduler = AdaptiveScheduler(safety_interval)
         while True:
             timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             print(f"\n[{timestamp}] Iniciando verificação...")
             print("-" * 50)
             
-            run_check()
+            report = CycleReport()
+            run_check(report, target, pipeline)
             
-            print(f"\nAguardando {CHECK_INTERVAL} segundos até a próxima verificação...")
-            time.sleep(CHECK_INTERVAL)
+            interval = scheduler.next_interval(report)
+            print(f"\nAguardando {interval} segundos até a próxima verificação ({scheduler.last_reason})...")
+            branches = WEBHOOK_TRIGGERS.wait(target.name, interval)
+            if branches:
+                print(f"Webhook de push recebido ({', '.join(sorted(branches))}) - verificando agora")
             
     except KeyboardInterrupt:
         print("\n\n" + "=" * 50)
         print("Script interrompido pelo usuário.")
         print("=" * 50)
         sys.exit(0)
+    finally:
+        if pipeline and not pipeline.close(PUSH_FLUSH_TIMEOUT):
+            print("Aviso: Pipeline encerrado com versões ainda em processamento")
+        if PUSH_QUEUE.depth():
+            print(f"Aguardando {PUSH_QUEUE.depth()} commit(s) na fila de push...")
+            PUSH_QUEUE.flush(PUSH_FLUSH_TIMEOUT)
+        MAINTENANCE.stop()
+        LEASES.release_all()
+        for server in (version_server, webhook_server):
+            if server:
+                server.shutdown()
+                server.server_close()
+        close_git_sessions()
 
 if __name__ == "__main__":
     main()